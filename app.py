@@ -1,5 +1,6 @@
 import os
 import logging
+from contextlib import asynccontextmanager
 from datetime import datetime
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request, UploadFile
 from fastapi.staticfiles import StaticFiles
@@ -9,7 +10,7 @@ from pathlib import Path
 from modules.config import global_config, setup_runtime_config
 from modules.read_tool import read_structured_paragraphs
 from modules.count_tool import count_structured_paragraphs
-from modules.csv_process_tool import validate_csv_file, load_terms_dict, find_matching_terms
+from modules.csv_process_tool import validate_csv_file, load_glossary_matcher, TermRegistry, shutdown_match_pool
 from modules.api_tool import LLMService
 from modules.write_out_tool import write_to_markdown
 from modules.markitdown_tool import markitdown_tool
@@ -47,7 +48,13 @@ def log_error(error, details=None):
 load_dotenv(dotenv_path="data/.env")
 log_action("应用启动", "初始化环境变量")
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # 服务关闭时一并关闭术语匹配进程池（CSV_MATCH_WORKERS>0 时）
+    shutdown_match_pool()
+
+app = FastAPI(lifespan=lifespan)
 log_action("FastAPI应用创建成功")
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -144,7 +151,8 @@ async def process_files(input_md_file: str, csv_file: str, llm_provider: str) ->
     log_action("处理文件开始", f"MD文件: {input_md_file}, CSV文件: {csv_file}, LLM提供商: {llm_provider}")
     try:
         log_action("LLM服务初始化", f"提供商: {llm_provider}")
-        llm_service = LLMService()
+        # provider 客户端由进程级注册表复用，直接按目标平台构建，避免先建默认平台再切换
+        llm_service = LLMService(provider=llm_provider)
         log_action("LLM服务初始化成功")
     except Exception as e:
         log_error("LLM服务初始化失败", str(e))
@@ -154,7 +162,6 @@ async def process_files(input_md_file: str, csv_file: str, llm_provider: str) ->
             "error": str(e),
             "test_results": None
         }
-    llm_service.provider = llm_provider
     log_action("LLM提供商设置", f"提供商: {llm_provider}")
     
     # 初始化 Core
@@ -171,11 +178,12 @@ async def process_files(input_md_file: str, csv_file: str, llm_provider: str) ->
     output_md_file = os.path.join(input_dir, f"{output_base_filename}{extension}")
     log_action("输出文件路径生成", f"路径: {output_md_file}")
     log_action("术语字典加载", f"CSV文件: {csv_file}")
-    terms_dict = load_terms_dict(csv_file)
-    log_action("术语字典加载完成", f"术语数量: {len(terms_dict) if terms_dict else 0}")
+    # /validate-file 已在术语表旁生成索引，这里直接加载；按指纹共享，同一术语表的多个任务只构建一次
+    glossary = load_glossary_matcher(csv_file)
+    log_action("术语字典加载完成", f"术语数量: {len(glossary)}")
     
-    # 简单的聚合新术语字典（WebUI 目前没有持久化这些，但可以用于复写）
-    aggregated_new_terms = {} 
+    # 分层术语表：基础层共享预构建索引，新术语进入增量层（WebUI 目前没有持久化这些，但可以用于复写）
+    term_registry = TermRegistry(glossary)
     
     counter = 1
     while os.path.exists(output_md_file):
@@ -221,23 +229,26 @@ async def process_files(input_md_file: str, csv_file: str, llm_provider: str) ->
 
         try:
             log_action(f"段落[{idx+1}]调用核心", "TranslationCore.execute_translation_step")
+
+            def show_partial(text, task_id=task_id):
+                # STREAM_OUTPUT 开启时，生成中的译文经 /translation-progress 推给编辑器
+                if task_id in translation_tasks:
+                    translation_tasks[task_id]["partial_translation"] = text
             
             result = await translation_core.execute_translation_step(
                 segment_data, 
-                terms_dict, 
-                aggregated_new_terms,
-                terminology_policy=TerminologyPolicy.MERGE_ON_CONFLICT
+                term_registry, 
+                term_registry.delta,
+                terminology_policy=TerminologyPolicy.MERGE_ON_CONFLICT,
+                on_partial=show_partial
             )
+            show_partial("")
             
             if not result.success:
                 raise Exception(result.error)
 
-            # 更新 aggregated_new_terms
-            for nt in result.new_terms_delta:
-                k = str(nt.get('term', '')).strip()
-                v = str(nt.get('translation', '')).strip()
-                if k:
-                    aggregated_new_terms[k] = v
+            # 新术语只合并进增量层
+            term_registry.add_terms(result.new_terms_delta)
 
             response = result.content
             # WebUI 之前的逻辑没有拼接 notes，这里我们加上 notes 拼接逻辑以保持一致性
@@ -592,7 +603,8 @@ async def translation_progress(task_id: str = None, output_file: str = None):
             "progress": progress,
             "current_paragraph": task_info["current_paragraph"],
             "total_paragraphs": task_info["total_paragraphs"],
-            "content": content
+            "content": content,
+            "partial_translation": task_info.get("partial_translation", "")
         }
         if task_info["status"] == "error":
             response["message"] = task_info["error"]
@@ -692,7 +704,7 @@ async def test_api_endpoint(
         log_action("API测试端点调用", f"提供商: {llm_provider}")
         llm_service = LLMService(provider=llm_provider)
         log_action("API测试开始", "执行连接测试")
-        test_results = llm_service.test_api()
+        test_results = await asyncio.to_thread(llm_service.test_api)
         log_action("API测试完成", f"结果: {test_results}")
         return JSONResponse({
             "status": "success",
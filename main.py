@@ -8,13 +8,17 @@ from typing import List, Optional, Any, Dict
 
 from modules.config import global_config
 from modules.read_tool import read_structured_paragraphs, read_and_process_structured_paragraphs_to_json
-from modules.csv_process_tool import get_valid_path, validate_csv_file, load_terms_dict
+from modules.csv_process_tool import get_valid_path, validate_csv_file, load_glossary_matcher, GlossaryMatcher, TermRegistry, shutdown_match_pool
 from modules.terminology_tool import load_glossary_df, save_terms_result
-from modules.api_tool import LLMService
-from modules.write_out_tool import write_to_markdown, write_to_markdown_through_json
+from modules.api_tool import LLMService, close_async_clients
+from modules.write_out_tool import write_to_markdown, write_to_markdown_through_json, update_json_metadata
 from modules.markitdown_tool import markitdown_tool
-from modules.count_tool import count_md_words, count_structured_paragraphs
-from modules.translation_core import TranslationCore, TranslationResult, TerminologyPolicy
+from modules.count_tool import count_md_words, count_structured_paragraphs, append_counting_row
+from modules.translation_core import TranslationCore, TranslationResult, TerminologyPolicy, pack_segments
+from modules.concurrency_tool import AdaptiveConcurrencyController, RequestHedger
+from modules.batch_tool import build_batch_adapter, run_batch_translation
+from modules.cache_tool import PromptCacheStats
+from modules.usage_tool import HEDGE, LLM_REPAIR, LOCAL_REPAIR, RETRY, REWRITE, STAGES, TRANSLATE, usage_totals
 from services.diagnostics import global_diagnostics
 
 @dataclass
@@ -34,6 +38,7 @@ class UserConfig:
     json_path: Optional[str] = None
     paragraphs: List[Any] = field(default_factory=list)
     total_paragraphs: int = 0
+    glossary: Optional[GlossaryMatcher] = None
 
 def get_user_config() -> UserConfig:
     config = UserConfig()
@@ -169,11 +174,14 @@ def get_user_config() -> UserConfig:
     print(f"开始翻译文档...")
     if config.enable_concurrency:
         print("已启用并发模式。正在预处理文档...")
+        # 预处理时整篇批量匹配术语，翻译阶段的 worker 不再做基础术语表匹配
+        config.glossary = load_glossary_matcher(config.csv_file)
         config.json_path = read_and_process_structured_paragraphs_to_json(
             config.input_md_file, 
             max_chunk_size=config.chunk_size, 
             min_chunk_size=int(config.chunk_size*0.5),
-            preserve_structure=config.preserve_structure
+            preserve_structure=config.preserve_structure,
+            glossary=config.glossary
         )
         print(f"文档预处理完成，中间文件已保存至: {config.json_path}")
         with open(config.json_path, 'r', encoding='utf-8') as f:
@@ -181,6 +189,10 @@ def get_user_config() -> UserConfig:
         config.paragraphs = json_data['text_info']
         config.total_paragraphs = len(config.paragraphs)
         print(f"文档总段落数为【{config.total_paragraphs}】（已合并短段落）")
+        coverage = json_data.get('glossary_coverage')
+        if coverage:
+            print(f"术语覆盖：{coverage['segments_with_terms']}/{coverage['segments']} 个段落命中术语，"
+                  f"共命中 {coverage['distinct_terms']}/{coverage['glossary_terms']} 个术语")
     else:
         config.total_paragraphs = count_structured_paragraphs(config.input_md_file, max_chunk_size=config.chunk_size, preserve_structure=config.preserve_structure)
         print(f"文档总段落数为【{config.total_paragraphs}】")
@@ -189,26 +201,111 @@ def get_user_config() -> UserConfig:
 
     return config
 
+def build_concurrency_controller() -> AdaptiveConcurrencyController:
+    # 初始并发取 Currency_Limit，设置了 Requests_Per_Minute 时不超过它；RPM 为 0 表示不限速，不再导致 0 个 Worker
+    rpm = int(os.getenv('Requests_Per_Minute', 10))
+    initial = int(os.getenv('Currency_Limit', 5))
+    if rpm > 0:
+        initial = min(initial, rpm)
+    initial = max(1, initial)
+    if os.getenv('ADAPTIVE_CONCURRENCY', '1') != '1':
+        return AdaptiveConcurrencyController(initial, max_limit=initial, enabled=False)
+    max_limit = int(os.getenv('Max_Currency_Limit', '0') or 0) or initial * 2
+    if rpm > 0:
+        max_limit = min(max_limit, rpm)
+    return AdaptiveConcurrencyController(initial, max_limit=max(initial, max_limit))
+
+def build_request_hedger(llm_service: LLMService):
+    # 请求对冲只在有序写出（JSON 中间文件）模式下有意义：一个慢段落会阻塞其后所有已完成段落的写出
+    if os.getenv('HEDGE_REQUESTS', 'False').lower() not in ('1', 'true', 'yes'):
+        return None, None
+    hedger = RequestHedger(
+        percentile=float(os.getenv('HEDGE_PERCENTILE', '95')),
+        budget=float(os.getenv('HEDGE_BUDGET', '0.05')),
+        min_samples=int(os.getenv('HEDGE_MIN_SAMPLES', '20')),
+    )
+    hedge_provider = os.getenv('HEDGE_PROVIDER', '').strip().lower()
+    if not hedge_provider or hedge_provider == getattr(llm_service, 'provider_name', None):
+        return hedger, None
+    return hedger, LLMService(provider=hedge_provider)
+
 async def run_translation_loop(paragraphs, translation_core: TranslationCore, terms_dict, aggregated_new_terms, output_md_file, PS, json_path=None):
+    # CLI 整个并发流程跑在一个 asyncio.run 里，结束时关闭该事件循环上缓存的异步客户端
+    try:
+        return await _run_translation_loop(paragraphs, translation_core, terms_dict, aggregated_new_terms, output_md_file, PS, json_path)
+    finally:
+        await close_async_clients()
+
+async def _run_translation_loop(paragraphs, translation_core: TranslationCore, terms_dict, aggregated_new_terms, output_md_file, PS, json_path=None):
     # Ensure paragraphs are sorted
     paragraphs.sort(key=lambda x: x['paragraph_number'] if isinstance(x, dict) and 'paragraph_number' in x else 0)
     
+    # 批量模式：连续的短段落按 token 预算打包，一包一次请求；关闭或平台不支持时每段单独成包
+    batch_budget = int(os.getenv('BATCH_TOKEN_BUDGET', '0'))
+    if batch_budget > 0 and getattr(translation_core.llm_service, 'supports_batch', False):
+        packs = pack_segments(paragraphs, batch_budget, int(os.getenv('BATCH_MAX_SEGMENTS', '20')))
+        print(f"[System] 批量模式：{len(paragraphs)} 个段落打包为 {len(packs)} 个请求")
+    else:
+        packs = [[p] for p in paragraphs]
+
     queue = asyncio.Queue()
-    for p in paragraphs:
-        queue.put_nowait(p)
+    for pack in packs:
+        queue.put_nowait(pack)
         
     file_lock = asyncio.Lock()
     tracker_state = {'next_id': 1} if json_path else None
-    stats = {'total_tokens': 0}
-    aggregated_new_terms_dict = {}
-    for nt in list(aggregated_new_terms):
-        k = str(nt.get('term', '')).strip()
-        v = str(nt.get('translation', '')).strip()
-        if k:
-            aggregated_new_terms_dict[k] = v
+    stats = {'total_tokens': 0, 'providers': {}}
+    # 分层术语表：基础层共享预构建索引，新术语只进入增量层
+    term_registry = TermRegistry(terms_dict, list(aggregated_new_terms))
     
     consecutive_failures = 0
+    controller = build_concurrency_controller()
+    previous_controller = translation_core.concurrency_controller
+    translation_core.concurrency_controller = controller
+    hedger, hedge_service = build_request_hedger(translation_core.llm_service) if json_path else (None, None)
+    previous_hedging = (translation_core.request_hedger, translation_core.hedge_service)
+    translation_core.request_hedger, translation_core.hedge_service = hedger, hedge_service
     
+    async def handle_result(worker_id, segment, p_id, result: TranslationResult):
+        nonlocal consecutive_failures
+        # 失败的段落同样消耗了 token
+        stats['total_tokens'] += result.tokens
+        if not result.success:
+            consecutive_failures += 1
+            print(f"[System] Worker-{worker_id} 段落 {p_id} 失败: {result.error}")
+            # 触发诊断
+            asyncio.create_task(safe_api_diagnostics(translation_core.llm_service))
+            return
+
+        # 成功则重置连续失败计数
+        consecutive_failures = 0
+        if result.provider:
+            stats['providers'][result.provider] = stats['providers'].get(result.provider, 0) + 1
+
+        # 写入
+        async with file_lock:
+            aggregated_new_terms.extend(result.new_terms_delta)
+            term_registry.add_terms(result.new_terms_delta)
+
+            response_text = result.content
+            if result.notes:
+                response_text += f"\n\n---\n\n{result.notes}\n"
+
+            mode = 'structured' if PS else 'flat'
+            if json_path and tracker_state:
+                content_info = {
+                    'translation': result.content,
+                    'notes': result.notes,
+                    'new_terms': result.new_terms_delta,
+                    'provider': result.provider,
+                    'usage': result.usage
+                }
+                await asyncio.to_thread(write_to_markdown_through_json, json_path, output_md_file, p_id, content_info, tracker_state, mode) # type: ignore
+            else:
+                await asyncio.to_thread(write_to_markdown, output_md_file, (response_text, segment.get('meta_data')), mode) # type: ignore
+
+        print(f"[System] Worker-{worker_id} 完成段落 {p_id}")
+
     async def worker(worker_id):
         nonlocal consecutive_failures
         print(f"[System] Worker-{worker_id} 启动")
@@ -222,61 +319,34 @@ async def run_translation_loop(paragraphs, translation_core: TranslationCore, te
                 break
 
             try:
-                segment = queue.get_nowait()
+                pack = queue.get_nowait()
             except asyncio.QueueEmpty:
                 print(f"[System] Worker-{worker_id} 队列为空，准备退出")
                 break
             
             try:
-                p_id = segment.get('paragraph_number', '?') if isinstance(segment, dict) else '?'
-                print(f"[System] Worker-{worker_id} 取出段落 {p_id} (队列剩余: {queue.qsize()})")
+                p_ids = [segment.get('paragraph_number', '?') if isinstance(segment, dict) else '?' for segment in pack]
+                print(f"[System] Worker-{worker_id} 取出段落 {', '.join(map(str, p_ids))} (队列剩余: {queue.qsize()})")
                 
-                # 调用核心
-                result = await translation_core.execute_translation_step(
-                    segment, terms_dict, aggregated_new_terms_dict, 
-                    tracker_state=tracker_state,
-                    terminology_policy=TerminologyPolicy.MERGE_ON_CONFLICT
-                )
-                
-                if not result.success:
-                    consecutive_failures += 1
-                    print(f"[System] Worker-{worker_id} 段落 {p_id} 失败: {result.error}")
-                    # 触发诊断
-                    asyncio.create_task(safe_api_diagnostics(translation_core.llm_service))
-                    # 注意：这里不要调用 queue.task_done()，统一由 finally 处理
-                    continue
-
-                # 成功则重置连续失败计数
-                consecutive_failures = 0
-                stats['total_tokens'] += result.tokens
-                
-                
-                
-                # 写入
-                async with file_lock:
-                    aggregated_new_terms.extend(result.new_terms_delta)
-                    for nt in result.new_terms_delta:
-                        k = str(nt.get('term', '')).strip()
-                        v = str(nt.get('translation', '')).strip()
-                        if k:
-                            aggregated_new_terms_dict[k] = v
-                    
-                    response_text = result.content
-                    if result.notes:
-                        response_text += f"\n\n---\n\n{result.notes}\n"
-                    
-                    mode = 'structured' if PS else 'flat'
-                    if json_path and tracker_state:
-                        content_info = {
-                            'translation': result.content,
-                            'notes': result.notes,
-                            'new_terms': result.new_terms_delta
-                        }
-                        await asyncio.to_thread(write_to_markdown_through_json, json_path, output_md_file, p_id, content_info, tracker_state, mode) # type: ignore
+                # 调用核心：Worker 数按并发上限预先创建，实际同时在途的请求数由控制器名额决定
+                limit_before = controller.limit
+                async with controller.slot():
+                    if len(pack) == 1:
+                        results = [await translation_core.execute_translation_step(
+                            pack[0], term_registry, term_registry.delta, 
+                            tracker_state=tracker_state,
+                            terminology_policy=TerminologyPolicy.MERGE_ON_CONFLICT
+                        )]
                     else:
-                        await asyncio.to_thread(write_to_markdown, output_md_file, (response_text, segment.get('meta_data')), mode) # type: ignore
-                
-                print(f"[System] Worker-{worker_id} 完成段落 {p_id}")
+                        results = await translation_core.execute_translation_batch(
+                            pack, term_registry, term_registry.delta,
+                            terminology_policy=TerminologyPolicy.MERGE_ON_CONFLICT
+                        )
+                if controller.limit != limit_before:
+                    print(f"[System] 并发调整：{limit_before} -> {controller.limit}")
+
+                for segment, p_id, result in zip(pack, p_ids, results):
+                    await handle_result(worker_id, segment, p_id, result)
 
             except Exception as e:
                 consecutive_failures += 1
@@ -285,10 +355,60 @@ async def run_translation_loop(paragraphs, translation_core: TranslationCore, te
             finally:
                 queue.task_done()
 
-    concurrency_limit = min(int(os.getenv('Currency_Limit', 5)), int(os.getenv('Requests_Per_Minute', 10)))
-    print(f"[System] 初始化并发工作池，Worker数量: {concurrency_limit}")
-    workers = [asyncio.create_task(worker(i+1)) for i in range(concurrency_limit)]
-    await asyncio.gather(*workers)
+    print(f"[System] 初始化并发工作池，Worker数量: {controller.max_limit}，初始并发: {controller.limit}")
+    workers = [asyncio.create_task(worker(i+1)) for i in range(controller.max_limit)]
+    try:
+        await asyncio.gather(*workers)
+    finally:
+        translation_core.concurrency_controller = previous_controller
+        translation_core.request_hedger, translation_core.hedge_service = previous_hedging
+
+    report = controller.report()
+    stats['concurrency'] = report
+    if controller.enabled:
+        print(f"[System] 并发调整汇总：最终 {report['final_limit']}，区间 {report['min_limit_reached']}-{report['max_limit_reached']}，"
+              f"上调 {report['increases']} 次，下调 {report['decreases']} 次")
+    if json_path and os.path.exists(json_path):
+        await asyncio.to_thread(update_json_metadata, json_path, 'concurrency', report)
+    if hedger is not None:
+        # 对冲中落败或被取消的请求已计入各段的用量账本
+        hedge_report = hedger.report()
+        stats['hedging'] = hedge_report
+        print(f"[System] 请求对冲：{hedge_report['hedged']}/{hedge_report['requests']} 次（对冲胜出 {hedge_report['hedge_wins']} 次），"
+              f"额外消耗约 {hedge_report['extra_tokens']} token，触发阈值 {hedge_report['threshold_s']} 秒")
+        if json_path and os.path.exists(json_path):
+            await asyncio.to_thread(update_json_metadata, json_path, 'hedging', hedge_report)
+    if len(stats['providers']) > 1:
+        print(f"[System] 各平台完成段落数：{stats['providers']}")
+    repair_stats = translation_core.repair_stats
+    if repair_stats['local'] or repair_stats['remote'] or repair_stats['failed']:
+        stats['repair'] = dict(repair_stats)
+        print(f"[System] JSON 修复：本地 {repair_stats['local']} 次（约节省 {repair_stats['tokens_saved']} token），"
+              f"LLM {repair_stats['remote']} 次（消耗 {repair_stats['remote_tokens']} token），失败 {repair_stats['failed']} 次")
+    prompt_cache = getattr(translation_core.llm_service, 'prompt_cache', None)
+    if isinstance(prompt_cache, PromptCacheStats) and prompt_cache.requests:
+        prompt_cache_report = prompt_cache.report()
+        stats['prompt_cache'] = prompt_cache_report
+        if prompt_cache_report['unreported'] < prompt_cache_report['requests']:
+            print(f"[System] 平台前缀缓存：命中 {prompt_cache_report['cached_tokens']}/{prompt_cache_report['prompt_tokens']} 输入 token"
+                  f"（{prompt_cache_report['hit_rate']:.1%}），约节省计费 {prompt_cache_report['billable_tokens_saved']} token，"
+                  f"平均延迟 命中 {prompt_cache_report['mean_latency_hit_s']} 秒 / 未命中 {prompt_cache_report['mean_latency_miss_s']} 秒")
+        if json_path and os.path.exists(json_path):
+            await asyncio.to_thread(update_json_metadata, json_path, 'prompt_cache', prompt_cache_report)
+    if translation_core.run_usage:
+        usage_report = {'stages': translation_core.run_usage, 'totals': usage_totals(translation_core.run_usage)}
+        stats['usage'] = usage_report
+        print("[System] 分阶段用量：" + "，".join(
+            f"{stage} {entry['total_tokens']} token / {entry['calls']} 次"
+            for stage, entry in sorted(translation_core.run_usage.items(), key=lambda item: STAGES.index(item[0]))
+        ))
+        if json_path and os.path.exists(json_path):
+            await asyncio.to_thread(update_json_metadata, json_path, 'usage', usage_report)
+    if translation_core.translation_cache is not None:
+        cache_stats = translation_core.translation_cache.stats()
+        stats['cache'] = cache_stats
+        print(f"[System] 翻译缓存：命中 {cache_stats['hits']}，未命中 {cache_stats['misses']}，"
+              f"节省 token {cache_stats['tokens_saved']}，条目 {cache_stats['entries']}")
 
     # 熔断后尝试保存未翻译部分
     is_err, _ = global_diagnostics.get_global_error_state()
@@ -347,6 +467,27 @@ async def run_translation_loop(paragraphs, translation_core: TranslationCore, te
 
     return stats['total_tokens']
 
+def run_batch_mode(config: UserConfig, llm_service: LLMService, glossary, aggregated_new_terms, batch_api: str) -> int:
+    # 离线批处理：不追求交互延迟，按平台批处理接口的价格与配额翻译整个中间 JSON
+    adapter, local_server = build_batch_adapter(llm_service, batch_api)
+    try:
+        stats = run_batch_translation(
+            config.json_path,
+            config.output_md_file,
+            llm_service,
+            adapter,
+            glossary=glossary,
+            mode='structured' if config.preserve_structure else 'flat',
+            poll_interval=float(os.getenv('BATCH_POLL_INTERVAL', '30')),
+            max_resubmits=int(os.getenv('BATCH_MAX_RESUBMITS', '2')),
+            aggregated_new_terms=aggregated_new_terms,
+        )
+    finally:
+        if local_server is not None:
+            local_server.stop()
+    print(f"[Batch] 共 {stats['rounds']} 轮，完成 {stats['completed']} 个段落，消耗 {stats['total_tokens']} token")
+    return stats['total_tokens']
+
 async def safe_api_diagnostics(llm_service: LLMService):
     try:
         # 检查是否已有全局错误
@@ -374,112 +515,104 @@ def run_sync_translation_loop(config: UserConfig, translation_core: TranslationC
     current_paragraph = 0
     concurrency_api_failures = 0
     
-    # 转换 aggregated_new_terms (list) 到 dict 供 Core 使用
-    # 在同步循环中，我们可以维护一个 persistent dict 以提高效率
-    # 因为是串行的，所以是安全的
-    
-    # 初始化 persistent dict
-    persistent_new_terms_dict = {}
+    # 分层术语表：基础层共享预构建索引，新术语只进入增量层
+    # 每段成功后增量合并 new_terms，不再从 aggregated_new_terms 全量重建
+    term_registry = TermRegistry(terms_dict, aggregated_new_terms)
     
     iterator = config.paragraphs
     # 如果是 generator (read_structured_paragraphs 返回 generator)，需要小心
     # config.paragraphs 在非并发模式下是 generator
     
-    for segment in iterator:
-        current_paragraph += 1
-        print(f"开始翻译段落【{current_paragraph}】/【{config.total_paragraphs}】")
+    # 整个同步循环共用一个事件循环：异步客户端按事件循环缓存，逐段 asyncio.run 会为每段新建连接池
+    runner = asyncio.Runner()
+    try:
+        for segment in iterator:
+            current_paragraph += 1
+            print(f"开始翻译段落【{current_paragraph}】/【{config.total_paragraphs}】")
         
-        # 适配 segment
-        if isinstance(segment, dict) and 'content' in segment:
-            paragraph_text = segment['content']
-            meta_data = segment['meta_data']
-        elif config.preserve_structure:
-            paragraph_text, meta_data = segment
-        else:
-            paragraph_text = segment
-            meta_data = None
+            # 适配 segment
+            if isinstance(segment, dict) and 'content' in segment:
+                paragraph_text = segment['content']
+                meta_data = segment['meta_data']
+            elif config.preserve_structure:
+                paragraph_text, meta_data = segment
+            else:
+                paragraph_text = segment
+                meta_data = None
             
-        # 构造临时的 segment dict 供 Core 使用
-        segment_data = {
-            "content": paragraph_text,
-            "meta_data": meta_data
-        }
+            # 构造临时的 segment dict 供 Core 使用
+            segment_data = {
+                "content": paragraph_text,
+                "meta_data": meta_data
+            }
         
-        while True: # Retry loop for interactive recovery
-            # 更新 persistent_new_terms_dict
-            for nt in aggregated_new_terms:
-                k = str(nt.get('term', '')).strip()
-                v = str(nt.get('translation', '')).strip()
-                if k:
-                    persistent_new_terms_dict[k] = v
-            
-            try:
-                # 同步循环调用异步方法，需要 asyncio.run 或者在新事件循环中运行
-                # 但 main 已经是 sync 的。为了复用 Core (Async)，我们需要 wrap 一下
-                # 或者 TranslationCore 可以提供同步入口？
-                # 由于 Core 内部用了 asyncio.to_thread，它是 async 的。
-                # 我们可以在这里用 asyncio.run 单次运行
-                
-                result = asyncio.run(translation_core.execute_translation_step(
-                    segment_data, 
-                    terms_dict, 
-                    persistent_new_terms_dict,
-                    terminology_policy=TerminologyPolicy.MERGE_ON_CONFLICT
-                ))
+            while True: # Retry loop for interactive recovery
+                try:
+                    # 同步循环复用同一个事件循环运行异步的 Core，异步客户端的连接池在各段之间保持
+                    result = runner.run(translation_core.execute_translation_step(
+                        segment_data, 
+                        term_registry, 
+                        term_registry.delta,
+                        terminology_policy=TerminologyPolicy.MERGE_ON_CONFLICT
+                    ))
                 
-                if not result.success:
-                    # 失败处理
-                    raise Exception(result.error)
+                    total_token += result.tokens
+                    if not result.success:
+                        # 失败处理
+                        raise Exception(result.error)
                 
-                # 成功
-                aggregated_new_terms.extend(result.new_terms_delta)
-                total_token += result.tokens
+                    # 成功
+                    aggregated_new_terms.extend(result.new_terms_delta)
+                    term_registry.add_terms(result.new_terms_delta)
                 
-                response_text = result.content
-                if result.notes:
-                    response_text += f"\n\n---\n\n{result.notes}\n"
-                print(response_text)
+                    response_text = result.content
+                    if result.notes:
+                        response_text += f"\n\n---\n\n{result.notes}\n"
+                    print(response_text)
                 
-                # 写出
-                mode = 'structured' if config.preserve_structure else 'flat'
-                write_to_markdown(config.output_md_file, (response_text, meta_data), mode) # type: ignore
+                    # 写出
+                    mode = 'structured' if config.preserve_structure else 'flat'
+                    write_to_markdown(config.output_md_file, (response_text, meta_data), mode) # type: ignore
                 
-                print(f"已处理第{current_paragraph}段内容，输出已保存到：")
-                print(config.output_md_file)
-                concurrency_api_failures = 0
-                break # Next paragraph
+                    print(f"已处理第{current_paragraph}段内容，输出已保存到：")
+                    print(config.output_md_file)
+                    concurrency_api_failures = 0
+                    break # Next paragraph
                 
-            except KeyboardInterrupt:
-                raise # Let outer handler catch it
-            except Exception as e:
-                concurrency_api_failures += 1
-                print(f"\nAPI调用失败：{str(e)}")
-                print(f"连续翻译失败次数: {concurrency_api_failures}/{os.getenv('MAX_RETRIES', 3)}")
+                except KeyboardInterrupt:
+                    raise # Let outer handler catch it
+                except Exception as e:
+                    concurrency_api_failures += 1
+                    print(f"\nAPI调用失败：{str(e)}")
+                    print(f"连续翻译失败次数: {concurrency_api_failures}/{os.getenv('MAX_RETRIES', 3)}")
                 
-                if concurrency_api_failures >= int(os.getenv('MAX_RETRIES', 3)):
-                    # 交互式恢复
-                    print(f"\n连续失败，开始API测试...")
-                    # 这里的 test_api 是 sync 的 (in LLMService)，但 TranslationCore 里没暴露 sync 的 test_api
-                    # 直接用 llm_service
-                    try:
-                        test_results = translation_core.llm_service.test_api()
-                        print(f"测试结果: {test_results}")
-                        if isinstance(test_results, dict) and test_results.get("success"):
-                            choice = input("API测试通过。是否重试当前段落？(y/n): ").strip().lower()
-                            if choice == 'y':
-                                concurrency_api_failures = 0
-                                continue
+                    if concurrency_api_failures >= int(os.getenv('MAX_RETRIES', 3)):
+                        # 交互式恢复
+                        print(f"\n连续失败，开始API测试...")
+                        # 这里的 test_api 是 sync 的 (in LLMService)，但 TranslationCore 里没暴露 sync 的 test_api
+                        # 直接用 llm_service
+                        try:
+                            test_results = translation_core.llm_service.test_api()
+                            print(f"测试结果: {test_results}")
+                            if isinstance(test_results, dict) and test_results.get("success"):
+                                choice = input("API测试通过。是否重试当前段落？(y/n): ").strip().lower()
+                                if choice == 'y':
+                                    concurrency_api_failures = 0
+                                    continue
+                                else:
+                                    raise KeyboardInterrupt # Trigger save and exit
                             else:
-                                raise KeyboardInterrupt # Trigger save and exit
-                        else:
-                            print("API测试失败。")
+                                print("API测试失败。")
+                                raise KeyboardInterrupt
+                        except Exception as test_e:
+                            print(f"测试出错: {test_e}")
                             raise KeyboardInterrupt
-                    except Exception as test_e:
-                        print(f"测试出错: {test_e}")
-                        raise KeyboardInterrupt
-                else:
-                    print("正在重试当前段落...")
-                    time.sleep(1) # Backoff
+                    else:
+                        print("正在重试当前段落...")
+                        time.sleep(1) # Backoff
+    finally:
+        runner.run(close_async_clients())
+        runner.close()
 
     return total_token
 
@@ -500,13 +633,19 @@ def save_untranslated(input_md_file, input_dir, base_name, last_text=None):
     except Exception as e:
         print(f"保存未翻译部分失败: {e}")
 
-def finalize_process(config: UserConfig, total_token, start_time, glossary_df, aggregated_new_terms):
+def save_session_terms(config: UserConfig, glossary_df, aggregated_new_terms) -> str:
+    if glossary_df is None and config.merge_in_place:
+        glossary_df = load_glossary_df(config.csv_file)
+    return save_terms_result(config.merge_in_place, glossary_df, aggregated_new_terms, config.csv_file, config.blank_csv_path)
+
+def finalize_process(config: UserConfig, total_token, start_time, glossary_df, aggregated_new_terms, glossary_tokens_saved: int = 0,
+                     usage: Optional[Dict[str, Dict[str, Any]]] = None):
     end_time = perf_counter()
     time_taken = end_time - start_time
     print(time.strftime('共耗时：%H时%M分%S秒', time.gmtime(int(time_taken))))
     
     # Save terms
-    new_glossary_path = save_terms_result(config.merge_in_place, glossary_df, aggregated_new_terms, config.csv_file, config.blank_csv_path)
+    new_glossary_path = save_session_terms(config, glossary_df, aggregated_new_terms)
     print("新的术语表已保存：")
     print(new_glossary_path)
     print("译文文件已保存：")
@@ -529,13 +668,30 @@ def finalize_process(config: UserConfig, total_token, start_time, glossary_df, a
     if os.path.exists(config.output_md_file):
         raw_len = count_md_words(config.input_md_file)
         processed_len = count_md_words(config.output_md_file)
-        new_row = [str(config.input_md_file), raw_len, str(config.output_md_file), processed_len, total_token, time_taken]
-        file_exists = os.path.isfile('counting_table.csv') and os.path.getsize('counting_table.csv') > 0
-        with open('counting_table.csv','a',newline='',encoding='utf-8') as csvfile:
-            writer = csv.writer(csvfile)
-            if not file_exists:
-                writer.writerow(['Input file','Input len','Output file','Output len','Tokens','Taken time'])
-            writer.writerow(new_row)
+        usage = usage or {}
+        totals = usage_totals(usage)
+
+        def stage_tokens(stage):
+            return usage.get(stage, {}).get('total_tokens', 0)
+
+        append_counting_row('counting_table.csv', {
+            'Input file': str(config.input_md_file),
+            'Input len': raw_len,
+            'Output file': str(config.output_md_file),
+            'Output len': processed_len,
+            'Tokens': total_token,
+            'Taken time': time_taken,
+            'Glossary tokens saved': glossary_tokens_saved,
+            'Prompt tokens': totals['prompt_tokens'],
+            'Completion tokens': totals['completion_tokens'],
+            'Cached prompt tokens': totals['cached_tokens'],
+            'Translate tokens': stage_tokens(TRANSLATE),
+            'Retry tokens': stage_tokens(RETRY),
+            'Local repairs': usage.get(LOCAL_REPAIR, {}).get('calls', 0),
+            'LLM repair tokens': stage_tokens(LLM_REPAIR),
+            'Rewrite tokens': stage_tokens(REWRITE),
+            'Hedge tokens': stage_tokens(HEDGE),
+        })
 
 def main():
     try:
@@ -545,8 +701,10 @@ def main():
         return
 
     start_time = perf_counter()
-    terms_dict = load_terms_dict(config.csv_file)
-    glossary_df = load_glossary_df(config.csv_file)
+    # 术语索引优先从术语表旁的磁盘缓存加载，每次运行只构建一次，由各段落共享
+    glossary = config.glossary if config.glossary is not None else load_glossary_matcher(config.csv_file)
+    # 术语表 DataFrame 仅在保存合并结果时才需要，延迟到保存时加载
+    glossary_df = None
     aggregated_new_terms = []
     
     llm_service = LLMService(provider=config.provider)
@@ -555,11 +713,14 @@ def main():
     total_token = 0
     
     try:
-        if config.enable_concurrency:
+        batch_api = os.getenv('BATCH_API', '').strip().lower()
+        if config.enable_concurrency and batch_api:
+            total_token = run_batch_mode(config, llm_service, glossary, aggregated_new_terms, batch_api)
+        elif config.enable_concurrency:
             total_token = asyncio.run(run_translation_loop(
                 config.paragraphs, 
                 translation_core, 
-                terms_dict, 
+                glossary, 
                 aggregated_new_terms, 
                 config.output_md_file, 
                 config.preserve_structure, 
@@ -569,21 +730,26 @@ def main():
             total_token = run_sync_translation_loop(
                 config, 
                 translation_core, 
-                terms_dict, 
+                glossary, 
                 aggregated_new_terms, 
                 glossary_df
             )
             
-        finalize_process(config, total_token, start_time, glossary_df, aggregated_new_terms)
+        finalize_process(config, total_token, start_time, glossary_df, aggregated_new_terms,
+                         getattr(llm_service, 'glossary_tokens_saved', 0),
+                         translation_core.run_usage)
         
     except KeyboardInterrupt:
         print("\n任务已中断，开始保存累积的术语表……")
-        new_glossary_path = save_terms_result(config.merge_in_place, glossary_df, aggregated_new_terms, config.csv_file, config.blank_csv_path)
+        new_glossary_path = save_session_terms(config, glossary_df, aggregated_new_terms)
         print(f"新的术语表已保存：{new_glossary_path}")
         # 保存未翻译部分 (仅针对同步模式或能获取最后位置的情况，这里做个简单尝试)
         # 这里的 save_untranslated 需要 last_text，但 main 里拿不到。
         # 可以在 run_sync_translation_loop 里处理了，这里只是兜底。
         return
+    finally:
+        # CSV_MATCH_WORKERS>0 时关闭术语匹配进程池
+        shutdown_match_pool()
 
 if __name__ == "__main__":
     main()
@@ -2,28 +2,267 @@ from typing import Tuple
 import os
 import json
 import time
+import hashlib
+import inspect
+import asyncio
 import threading
-from typing import Dict, Any, List, Union
+import weakref
+from contextvars import ContextVar
+from typing import Callable, Dict, Any, List, Optional, Union
 from abc import ABC, abstractmethod
-from openai import OpenAI
+import importlib.util
+from openai import OpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient
+from openai.types.chat import ChatCompletion
+import httpx
 from google import genai
 from google.genai import types
 from pydantic import BaseModel, ValidationError, field_validator
 
+from modules.rate_limit_tool import DEFAULT_BURST, get_rate_limiter
+from modules.json_stream_tool import IncrementalTranslationParser, StreamBreakageError
+from modules.json_repair_tool import repair_json_object
+from modules.cache_tool import PromptCacheStats
+from modules.usage_tool import UsageRecord, current_stage, record_call
+
+def _http_client_kwargs() -> Dict[str, Any]:
+    """
+    长连接 HTTP 客户端参数：连接池上限、保活连接数与保活时长，装有 h2 时默认启用 HTTP/2。
+    """
+    http2_env = os.getenv('HTTP2', 'auto').lower()
+    if http2_env == 'auto':
+        http2 = importlib.util.find_spec('h2') is not None
+    else:
+        http2 = http2_env in ('1', 'true', 'yes')
+    return {
+        'limits': httpx.Limits(
+            max_connections=int(os.getenv('HTTP_MAX_CONNECTIONS', '100')),
+            max_keepalive_connections=int(os.getenv('HTTP_KEEPALIVE_CONNECTIONS', '20')),
+            keepalive_expiry=float(os.getenv('HTTP_KEEPALIVE_EXPIRY', '60')),
+        ),
+        'http2': http2,
+    }
+
+def _http_timeout() -> httpx.Timeout:
+    """
+    客户端默认超时：HTTP_TIMEOUT 为连接建立后单次读写的等待上限（流式时即两段输出之间的间隔），
+    HTTP_CONNECT_TIMEOUT 为建立连接的上限；卡死的连接不会无限期占住 worker。
+    """
+    return httpx.Timeout(float(os.getenv('HTTP_TIMEOUT', '120')), connect=float(os.getenv('HTTP_CONNECT_TIMEOUT', '10')))
+
+# 当前调用的截止时间（time.monotonic() 时刻）：TranslationCore 按段落与阶段设置，provider 据此限制单次请求的超时
+current_deadline: ContextVar[Optional[float]] = ContextVar('current_deadline', default=None)
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+def request_timeout() -> Optional[float]:
+    """
+    距当前截止时间的剩余秒数；未设置截止时间时返回 None，已过期时抛出 DeadlineExceeded。
+    """
+    deadline = current_deadline.get()
+    if deadline is None:
+        return None
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise DeadlineExceeded('已超过截止时间')
+    return remaining
+
+def _timeout_kwargs() -> Dict[str, Any]:
+    # OpenAI SDK 的单次请求超时：有截止时间时取剩余时长（不超过客户端默认的读写超时），否则沿用客户端设置
+    remaining = request_timeout()
+    if remaining is None:
+        return {}
+    return {'timeout': min(remaining, _http_timeout().read or remaining)}
+
+def provider_rate_limiter(name: str):
+    """
+    平台级 RPM/TPM 限流器：<平台>_RPM / <平台>_TPM（如 KIMI_RPM）优先，否则取全局
+    Requests_Per_Minute / Tokens_Per_Minute。每个平台各自一份配额，在进程内共享。
+    RATE_LIMIT_BURST 为可立即放行的突发量占配额的比例。
+    """
+    prefix = name.upper()
+    return get_rate_limiter(
+        name,
+        int(os.getenv(f'{prefix}_RPM') or os.getenv('Requests_Per_Minute', '0')),
+        int(os.getenv(f'{prefix}_TPM') or os.getenv('Tokens_Per_Minute', '0')),
+        float(os.getenv('RATE_LIMIT_BURST') or DEFAULT_BURST),
+    )
+
+# 当前段落的路由记录：TranslationCore 每段放入一个字典，路由 provider 把实际使用的平台写进去
+current_route: ContextVar[Optional[Dict[str, str]]] = ContextVar('current_route', default=None)
+
+def prompt_cache_key(system_prompt: str) -> str:
+    # 同一份不变前缀（系统提示词）对应同一个缓存键，用于平台侧的前缀缓存路由与显式缓存句柄
+    return hashlib.sha256((system_prompt or '').encode('utf-8')).hexdigest()[:32]
+
+def record_route(name: str) -> None:
+    route = current_route.get()
+    if route is not None:
+        route['provider'] = name
+
+# 单次调用的用量明细：LLMService 每次调用放入一个字典，provider 把平台返回的输入、输出与缓存命中 token 数写进去
+current_usage: ContextVar[Optional[Dict[str, int]]] = ContextVar('current_usage', default=None)
+
+def record_usage(prompt_tokens: Optional[int], completion_tokens: Optional[int], cached_tokens: Optional[int] = None) -> None:
+    usage = current_usage.get()
+    if usage is not None:
+        usage['prompt_tokens'] = int(prompt_tokens or 0)
+        usage['completion_tokens'] = int(completion_tokens or 0)
+        if cached_tokens is not None:
+            usage['cached_tokens'] = int(cached_tokens)
+
+def _field(obj: Any, name: str) -> Any:
+    return obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+
+def record_openai_usage(usage: Any) -> None:
+    """
+    记录 chat.completions 的 usage。各平台的缓存命中字段不同：OpenAI 与硅基流动为 prompt_tokens_details.cached_tokens，
+    DeepSeek 为 prompt_cache_hit_tokens，Kimi 为顶层 cached_tokens；都没有时视为平台不报告缓存命中。
+    """
+    if not usage:
+        return
+    details = _field(usage, 'prompt_tokens_details')
+    cached = _field(details, 'cached_tokens') if details else None
+    if cached is None:
+        cached = _field(usage, 'prompt_cache_hit_tokens')
+    if cached is None:
+        cached = _field(usage, 'cached_tokens')
+    record_usage(_field(usage, 'prompt_tokens'), _field(usage, 'completion_tokens'), cached)
+
 class LLMProvider(ABC):
+    # 子类声明各自的环境变量名与默认值，settings() 据此解析出 (base_url, api_key, model)
+    BASE_URL_ENV: Optional[str] = None
+    DEFAULT_BASE_URL: Optional[str] = None
+    API_KEY_ENV: Optional[str] = None
+    MODEL_ENV: Optional[str] = None
+    DEFAULT_MODEL: Optional[str] = None
+    # 能否使用批量模式（多段合并为一次请求）；结构化输出 schema 固定为单段模型的平台需关闭
+    SUPPORTS_BATCH = True
+    # 能否使用离线 Batch API（/v1/batches，请求体为 chat.completions 格式）
+    SUPPORTS_BATCH_API = False
+    # 自行按成员平台限流的 provider（如路由），LLMService 不再套一层限流
+    MANAGES_RATE_LIMIT = False
+
+    @classmethod
+    def settings(cls) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+        base_url = (os.getenv(cls.BASE_URL_ENV) if cls.BASE_URL_ENV else None) or cls.DEFAULT_BASE_URL
+        api_key = os.getenv(cls.API_KEY_ENV) if cls.API_KEY_ENV else None
+        model = os.getenv(cls.MODEL_ENV, cls.DEFAULT_MODEL) if cls.MODEL_ENV else cls.DEFAULT_MODEL
+        return base_url, api_key, model
+
     @abstractmethod
     def generate_completion(self, prompt: str, system_prompt: str):
         pass
 
-class KimiProvider(LLMProvider):
+    async def generate_completion_async(self, prompt: str, system_prompt: str):
+        # 未提供原生异步实现的 provider 退回线程执行
+        return await asyncio.to_thread(self.generate_completion, prompt, system_prompt)
+
+    async def generate_completion_stream_async(self, prompt: str, system_prompt: str, on_delta: Callable[[str], None]):
+        """
+        流式生成：每收到一段文本就调用 on_delta；on_delta 抛出异常时中止流。
+        返回 (完整文本, total_tokens)，流被中止或平台未返回用量时 total_tokens 为 None。
+        不支持流式的 provider 整段生成后一次性回调。
+        """
+        content, total_tokens = await self.generate_completion_async(prompt, system_prompt)
+        on_delta(content or '')
+        return content, total_tokens
+
+    def _create_async_client(self):
+        raise NotImplementedError
+
+    def _get_async_client(self):
+        # 异步客户端的连接池绑定事件循环，因此按事件循环分别缓存；长期使用的事件循环关闭前用 close_async_clients 释放
+        loop = asyncio.get_running_loop()
+        with _async_client_lock:
+            clients = self.__dict__.get('_async_clients')
+            if clients is None:
+                clients = self._async_clients = weakref.WeakKeyDictionary()
+            client = clients.get(loop)
+            if client is None:
+                client = clients[loop] = self._create_async_client()
+            return client
+
+_async_client_lock = threading.Lock()
+
+class OpenAICompatibleProvider(LLMProvider):
+    """
+    OpenAI 兼容接口（chat.completions）的公共实现：子类给出请求参数，同步与异步调用共用。
+    """
+    SUPPORTS_BATCH_API = True
+
     def __init__(self):
-        base_url = os.getenv('KIMI_BASE_URL') or 'https://api.moonshot.cn/v1'
-        api_key = os.getenv('KIMI_API_KEY')
-        self.client = OpenAI(api_key=api_key, base_url=base_url)
-        self.model = os.getenv('KIMI_MODEL', 'kimi-k2-turbo-preview')
+        base_url, api_key, self.model = self.settings()
+        self.client = OpenAI(api_key=api_key, base_url=base_url, timeout=_http_timeout(),
+                             http_client=DefaultHttpxClient(**_http_client_kwargs()))
+
+    def _request(self, prompt: str, system_prompt: str) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def _parse(self, completion):
+        record_openai_usage(completion.usage)
+        return completion.choices[0].message.content, completion.usage.total_tokens # type: ignore
 
     def generate_completion(self, prompt: str, system_prompt: str):
-        completion = self.client.chat.completions.create(
+        completion = self.client.chat.completions.create(**self._request(prompt, system_prompt), **_timeout_kwargs())
+        return self._parse(completion)
+
+    async def generate_completion_async(self, prompt: str, system_prompt: str):
+        completion = await self._get_async_client().chat.completions.create(**self._request(prompt, system_prompt), **_timeout_kwargs())
+        return self._parse(completion)
+
+    # 流式输出前补在开头的内容（如 Kimi 的 partial 前缀）
+    STREAM_PREFIX = ''
+
+    async def generate_completion_stream_async(self, prompt: str, system_prompt: str, on_delta: Callable[[str], None]):
+        request = dict(self._request(prompt, system_prompt), stream=True, stream_options={"include_usage": True}, **_timeout_kwargs())
+        stream = await self._get_async_client().chat.completions.create(**request)
+        parts = []
+        total_tokens = None
+        try:
+            if self.STREAM_PREFIX:
+                parts.append(self.STREAM_PREFIX)
+                on_delta(self.STREAM_PREFIX)
+            async for chunk in stream:
+                # 用量在最后一个 chunk：标准位置为 chunk.usage，部分平台放在 choices[0].usage
+                usage = getattr(chunk, 'usage', None) or (getattr(chunk.choices[0], 'usage', None) if chunk.choices else None)
+                if usage:
+                    total_tokens = _field(usage, 'total_tokens')
+                    record_openai_usage(usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    delta = chunk.choices[0].delta.content
+                    parts.append(delta)
+                    on_delta(delta)
+        finally:
+            # 正常结束或被 on_delta 中止时都释放连接，中止后不再接收剩余输出
+            await stream.close()
+        return ''.join(parts), total_tokens
+
+    # Batch API（/v1/batches）的请求体与交互式调用一致（extra_body 与 SDK 一样并入请求体）；结果行里的 body 按各平台的 _parse 还原
+    def batch_request_body(self, prompt: str, system_prompt: str) -> Dict[str, Any]:
+        body = dict(self._request(prompt, system_prompt))
+        body.update(body.pop('extra_body', None) or {})
+        return body
+
+    def parse_batch_response_body(self, body: Dict[str, Any]):
+        return self._parse(ChatCompletion.model_validate(body))
+
+    def _create_async_client(self):
+        return AsyncOpenAI(
+            api_key=self.client.api_key,
+            base_url=self.client.base_url,
+            timeout=_http_timeout(),
+            http_client=DefaultAsyncHttpxClient(**_http_client_kwargs()),
+        )
+
+class KimiProvider(OpenAICompatibleProvider):
+    BASE_URL_ENV, DEFAULT_BASE_URL = 'KIMI_BASE_URL', 'https://api.moonshot.cn/v1'
+    API_KEY_ENV = 'KIMI_API_KEY'
+    MODEL_ENV, DEFAULT_MODEL = 'KIMI_MODEL', 'kimi-k2-turbo-preview'
+    STREAM_PREFIX = '{'
+
+    def _request(self, prompt: str, system_prompt: str) -> Dict[str, Any]:
+        return dict(
             model=self.model,
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -32,37 +271,38 @@ class KimiProvider(LLMProvider):
             ],
             temperature=0.7,
         )
+
+    def _parse(self, completion):
+        record_openai_usage(completion.usage)
         content = "{" + (completion.choices[0].message.content or "")
         return content, completion.usage.total_tokens # type: ignore
 
-class GPTProvider(LLMProvider):
-    def __init__(self):
-        base_url = os.getenv('OPENAI_BASE_URL') or 'https://api.openai.com/v1'
-        api_key = os.getenv('OPENAI_API_KEY')
-        self.client = OpenAI(api_key=api_key, base_url=base_url)
-        self.model = os.getenv('GPT_MODEL', 'gpt-realtime')
+class GPTProvider(OpenAICompatibleProvider):
+    BASE_URL_ENV, DEFAULT_BASE_URL = 'OPENAI_BASE_URL', 'https://api.openai.com/v1'
+    API_KEY_ENV = 'OPENAI_API_KEY'
+    MODEL_ENV, DEFAULT_MODEL = 'GPT_MODEL', 'gpt-realtime'
 
-    def generate_completion(self, prompt: str, system_prompt: str):
-        completion = self.client.chat.completions.create(
+    def _request(self, prompt: str, system_prompt: str) -> Dict[str, Any]:
+        return dict(
             model=self.model,
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": prompt}
             ],
             temperature=1.0,
-            response_format={"type": "json_object"}
+            response_format={"type": "json_object"},
+            # 同一系统提示词的请求带相同的缓存键，让 OpenAI 把它们路由到已缓存该前缀的机器；
+            # 锁定的 openai SDK 版本没有该参数，经 extra_body 写入请求体
+            extra_body={"prompt_cache_key": prompt_cache_key(system_prompt)},
         )
-        return completion.choices[0].message.content, completion.usage.total_tokens # type: ignore
 
-class DeepseekProvider(LLMProvider):
-    def __init__(self):
-        base_url = os.getenv('DEEPSEEK_BASE_URL')
-        api_key = os.getenv('DEEPSEEK_API_KEY')
-        self.client = OpenAI(api_key=api_key, base_url=base_url)
-        self.model = os.getenv('DEEPSEEK_MODEL', 'deepseek-chat')
+class DeepseekProvider(OpenAICompatibleProvider):
+    BASE_URL_ENV = 'DEEPSEEK_BASE_URL'
+    API_KEY_ENV = 'DEEPSEEK_API_KEY'
+    MODEL_ENV, DEFAULT_MODEL = 'DEEPSEEK_MODEL', 'deepseek-chat'
 
-    def generate_completion(self, prompt: str, system_prompt: str):
-        completion = self.client.chat.completions.create(
+    def _request(self, prompt: str, system_prompt: str) -> Dict[str, Any]:
+        return dict(
             model=self.model,
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -71,17 +311,14 @@ class DeepseekProvider(LLMProvider):
             temperature=0.6,
             response_format={"type": "json_object"}
         )
-        return completion.choices[0].message.content, completion.usage.total_tokens # type: ignore
 
-class SiliconProvider(LLMProvider):
-    def __init__(self):
-        base_url = os.getenv('SILICON_JSON_URL') or 'https://api.siliconflow.com/v1'
-        api_key = os.getenv('SILICON_API_KEY')
-        self.client = OpenAI(api_key=api_key, base_url=base_url)
-        self.model = os.getenv('SILICON_JSON_MODEL', 'deepseek-ai/DeepSeek-V2.5')
+class SiliconProvider(OpenAICompatibleProvider):
+    BASE_URL_ENV, DEFAULT_BASE_URL = 'SILICON_JSON_URL', 'https://api.siliconflow.com/v1'
+    API_KEY_ENV = 'SILICON_API_KEY'
+    MODEL_ENV, DEFAULT_MODEL = 'SILICON_JSON_MODEL', 'deepseek-ai/DeepSeek-V2.5'
 
-    def generate_completion(self, prompt: str, system_prompt: str):
-        completion = self.client.chat.completions.create(
+    def _request(self, prompt: str, system_prompt: str) -> Dict[str, Any]:
+        return dict(
             model=self.model,
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -89,38 +326,150 @@ class SiliconProvider(LLMProvider):
             ],
             response_format={"type": "json_object"}
         )
-        return completion.choices[0].message.content, completion.usage.total_tokens # type: ignore
 
 class GeminiProvider(LLMProvider):
+    """
+    谷歌 Gemini。GEMINI_CONTEXT_CACHE 开启时为每个系统提示词创建一份显式上下文缓存（caches.create），
+    请求通过 cached_content 引用；缓存过期前 1 分钟重建，创建失败（如未达平台最小缓存长度）时
+    在一个 TTL 内退回普通请求。未开启时依赖平台的隐式前缀缓存。
+    """
+    BASE_URL_ENV = 'GEMINI_BASE_URL'
+    API_KEY_ENV = 'GEMINI_API_KEY'
+    MODEL_ENV, DEFAULT_MODEL = 'GEMINI_MODEL', 'gemini-2.5-flash'
+    SUPPORTS_BATCH = False
+
     def __init__(self):
-        base_url = os.getenv('GEMINI_BASE_URL') or None
-        api_key = os.getenv('GEMINI_API_KEY')
-        self.client = genai.Client(api_key=api_key, http_options=types.HttpOptions(api_version='v1beta', base_url=base_url) or None)
-        self.model = os.getenv('GEMINI_MODEL', 'gemini-2.5-flash')
+        base_url, api_key, self.model = self.settings()
+        http_kwargs = _http_client_kwargs()
+        self._client_kwargs = dict(api_key=api_key, http_options=types.HttpOptions(
+            api_version='v1beta', base_url=base_url, client_args=http_kwargs, async_client_args=http_kwargs,
+            timeout=int(_http_timeout().read * 1000), # type: ignore[operator]
+        ))
+        self.client = genai.Client(**self._client_kwargs)
+        self.context_cache = os.getenv('GEMINI_CONTEXT_CACHE', 'False').lower() in ('1', 'true', 'yes')
+        self.cache_ttl = max(120, int(os.getenv('GEMINI_CACHE_TTL', '3600')))
+        # 系统提示词哈希 -> (缓存名称或 None, 失效时间)；名称为 None 表示创建失败，到期前不再尝试
+        self._context_caches: Dict[str, Tuple[Optional[str], float]] = {}
+        self._cache_lock = threading.Lock()
+
+    def _context_cache_name(self, system_prompt: str) -> Optional[str]:
+        if not self.context_cache or not system_prompt:
+            return None
+        key = prompt_cache_key(system_prompt)
+        with self._cache_lock:
+            name, expires = self._context_caches.get(key, (None, 0.0))
+            now = time.time()
+            if name is not None and expires - 60 > now:
+                return name
+            if name is None and expires > now:
+                return None
+            try:
+                cache = self.client.caches.create(model=self.model, config=types.CreateCachedContentConfig(
+                    system_instruction=system_prompt,
+                    ttl=f'{self.cache_ttl}s',
+                    display_name=f'translator-{key}',
+                ))
+                name = cache.name
+            except Exception as e:
+                print(f"[Gemini] 上下文缓存创建失败，改用普通请求：{e}")
+                name = None
+            self._context_caches[key] = (name, now + self.cache_ttl)
+            return name
+
+    def _forget_context_cache(self, system_prompt: str, error: BaseException) -> None:
+        # 缓存被删除或过期时平台返回 400/403/404，丢弃句柄，重试时重建
+        if getattr(error, 'code', None) in (400, 403, 404):
+            with self._cache_lock:
+                self._context_caches.pop(prompt_cache_key(system_prompt or ''), None)
+
+    def _config(self, system_prompt: str, cache_name: Optional[str] = None):
+        # 引用上下文缓存时系统提示词已在缓存中，请求里不能再带 system_instruction
+        remaining = request_timeout()
+        return types.GenerateContentConfig(
+            http_options=types.HttpOptions(timeout=max(1, int(remaining * 1000))) if remaining is not None else None,
+            response_mime_type="application/json",
+            response_json_schema=TranslationResponseModel.model_json_schema(),
+            system_instruction=None if cache_name else system_prompt,
+            cached_content=cache_name,
+            thinking_config=types.ThinkingConfig(thinking_budget=0),
+            temperature=1.0,
+        )
+
+    @staticmethod
+    def _record_usage(usage_metadata) -> None:
+        if usage_metadata:
+            record_usage(usage_metadata.prompt_token_count, usage_metadata.candidates_token_count,
+                         usage_metadata.cached_content_token_count or 0)
 
     def generate_completion(self, prompt: str, system_prompt: str):
-        response = self.client.models.generate_content(
-            model=self.model,
-            contents=[prompt],
-            config=types.GenerateContentConfig(
-                response_mime_type="application/json",
-                response_json_schema=TranslationResponseModel.model_json_schema(),
-                system_instruction=system_prompt,
-                thinking_config=types.ThinkingConfig(thinking_budget=0),
-                temperature=1.0,
+        cache_name = self._context_cache_name(system_prompt)
+        try:
+            response = self.client.models.generate_content(
+                model=self.model,
+                contents=[prompt],
+                config=self._config(system_prompt, cache_name)
             )
-        )
+        except Exception as e:
+            if cache_name:
+                self._forget_context_cache(system_prompt, e)
+            raise
+        self._record_usage(response.usage_metadata)
         return response.text, response.usage_metadata.total_token_count # type: ignore
 
-class DoubaoProvider(LLMProvider):
-    def __init__(self):
-        base_url = os.getenv('DOUBAO_BASE_URL')
-        api_key = os.getenv('DOUBAO_API_KEY')
-        self.client = OpenAI(api_key=api_key, base_url=base_url)
-        self.model = os.getenv('DOUBAO_MODEL', 'doubao-seed-1-6-251015')
+    async def generate_completion_async(self, prompt: str, system_prompt: str):
+        cache_name = await asyncio.to_thread(self._context_cache_name, system_prompt) if self.context_cache else None
+        try:
+            response = await self._get_async_client().aio.models.generate_content(
+                model=self.model,
+                contents=[prompt],
+                config=self._config(system_prompt, cache_name)
+            )
+        except Exception as e:
+            if cache_name:
+                self._forget_context_cache(system_prompt, e)
+            raise
+        self._record_usage(response.usage_metadata)
+        return response.text, response.usage_metadata.total_token_count # type: ignore
 
-    def generate_completion(self, prompt: str, system_prompt: str):
-        response = self.client.responses.parse(
+    async def generate_completion_stream_async(self, prompt: str, system_prompt: str, on_delta: Callable[[str], None]):
+        cache_name = await asyncio.to_thread(self._context_cache_name, system_prompt) if self.context_cache else None
+        try:
+            stream = await self._get_async_client().aio.models.generate_content_stream(
+                model=self.model,
+                contents=[prompt],
+                config=self._config(system_prompt, cache_name)
+            )
+        except Exception as e:
+            if cache_name:
+                self._forget_context_cache(system_prompt, e)
+            raise
+        parts = []
+        total_tokens = None
+        try:
+            async for chunk in stream:
+                if chunk.usage_metadata and chunk.usage_metadata.total_token_count:
+                    total_tokens = chunk.usage_metadata.total_token_count
+                    self._record_usage(chunk.usage_metadata)
+                if chunk.text:
+                    parts.append(chunk.text)
+                    on_delta(chunk.text)
+        finally:
+            await stream.aclose()
+        return ''.join(parts), total_tokens
+
+    def _create_async_client(self):
+        return genai.Client(**self._client_kwargs)
+
+class DoubaoProvider(OpenAICompatibleProvider):
+    BASE_URL_ENV = 'DOUBAO_BASE_URL'
+    API_KEY_ENV = 'DOUBAO_API_KEY'
+    MODEL_ENV, DEFAULT_MODEL = 'DOUBAO_MODEL', 'doubao-seed-1-6-251015'
+    SUPPORTS_BATCH = False
+    # 走 responses.parse（请求体含 pydantic 模型），无法渲染为 /v1/chat/completions 批处理请求
+    SUPPORTS_BATCH_API = False
+
+    def _request(self, prompt: str, system_prompt: str) -> Dict[str, Any]:
+        return dict(
             model=self.model,
             input=[
                 {"role": "system", "content": system_prompt},
@@ -132,7 +481,266 @@ class DoubaoProvider(LLMProvider):
                 "thinking": {"type": "disabled"} # 不使用深度思考能力
             }
         )
-        return response.output_text, response.usage.total_tokens # type: ignore
+
+    def _parse(self, response):
+        usage = response.usage
+        details = getattr(usage, 'input_tokens_details', None)
+        record_usage(usage.input_tokens, usage.output_tokens, getattr(details, 'cached_tokens', None))
+        return response.output_text, usage.total_tokens # type: ignore
+
+    def generate_completion(self, prompt: str, system_prompt: str):
+        return self._parse(self.client.responses.parse(**self._request(prompt, system_prompt), **_timeout_kwargs()))
+
+    async def generate_completion_async(self, prompt: str, system_prompt: str):
+        return self._parse(await self._get_async_client().responses.parse(**self._request(prompt, system_prompt), **_timeout_kwargs()))
+
+    # responses.parse 不走 chat.completions 流式接口，整段生成后一次性回调
+    generate_completion_stream_async = LLMProvider.generate_completion_stream_async
+
+class _RouteStats:
+    def __init__(self):
+        self.latency: Optional[float] = None
+        self.in_flight = 0
+        self.failures = 0
+        self.cooldown_until = 0.0
+        self.requests = 0
+        self.errors = 0
+
+class RouterProvider(LLMProvider):
+    """
+    多平台路由：按 ROUTER_PROVIDERS（如 "kimi:2,deepseek,gemini"，冒号后为权重）在多个平台间分配请求。
+    打分 = 权重 × 剩余配额占比 / (延迟 EWMA × (1 + 在途请求数))，优先选分高者；
+    调用出错时立即换下一个平台重试，出错的平台按连续失败次数指数冷却（最长 60 秒），冷却中的平台排在最后。
+    """
+    MODEL_ENV, DEFAULT_MODEL = 'ROUTER_PROVIDERS', 'kimi,deepseek'
+    MANAGES_RATE_LIMIT = True
+
+    def __init__(self):
+        _, _, self.model = self.settings()
+        self.members: List[Tuple[str, float]] = []
+        for part in (self.model or '').split(','):
+            name, _, weight = part.strip().lower().partition(':')
+            if not name:
+                continue
+            if name not in PROVIDERS or name == 'router':
+                raise ValueError(f"ROUTER_PROVIDERS 中包含未知的API平台：{name}")
+            self.members.append((name, float(weight) if weight else 1.0))
+        if not self.members:
+            raise ValueError("ROUTER_PROVIDERS 未配置任何平台")
+        self.SUPPORTS_BATCH = all(PROVIDERS[name].SUPPORTS_BATCH for name, _ in self.members)
+        self._stats = {name: _RouteStats() for name, _ in self.members}
+        self._lock = threading.Lock()
+
+    def _ranked(self) -> List[str]:
+        now = time.monotonic()
+        with self._lock:
+            known = [st.latency for st in self._stats.values() if st.latency]
+            default_latency = sum(known) / len(known) if known else 1.0
+            ranked = []
+            for order, (name, weight) in enumerate(self.members):
+                st = self._stats[name]
+                headroom = max(provider_rate_limiter(name).headroom(), 0.01)
+                score = weight * headroom / ((st.latency or default_latency) * (1 + st.in_flight))
+                ranked.append((st.cooldown_until > now, -score, order, name))
+        ranked.sort()
+        return [name for *_, name in ranked]
+
+    def _begin(self, name: str) -> float:
+        with self._lock:
+            st = self._stats[name]
+            st.in_flight += 1
+            st.requests += 1
+        return time.monotonic()
+
+    def _end(self, name: str, started: float, error: Optional[BaseException] = None, cancelled: bool = False) -> None:
+        # cancelled：调用被取消（对冲落败、阶段超时），只释放在途计数，不计入延迟与失败
+        with self._lock:
+            st = self._stats[name]
+            st.in_flight -= 1
+            if cancelled:
+                return
+            if error is None:
+                latency = time.monotonic() - started
+                st.latency = latency if st.latency is None else 0.7 * st.latency + 0.3 * latency
+                st.failures = 0
+            else:
+                st.errors += 1
+                st.failures += 1
+                st.cooldown_until = time.monotonic() + min(60.0, 2.0 ** st.failures)
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                name: {
+                    'requests': st.requests,
+                    'errors': st.errors,
+                    'latency_ewma_s': round(st.latency, 3) if st.latency is not None else None,
+                }
+                for name, st in self._stats.items()
+            }
+
+    def generate_completion(self, prompt: str, system_prompt: str):
+        estimate = LLMService._estimate_request_tokens(prompt, system_prompt)
+        last_error: Optional[BaseException] = None
+        for name in self._ranked():
+            limiter = provider_rate_limiter(name)
+            reservation = limiter.acquire_sync(estimate) if limiter.enabled else None
+            started = self._begin(name)
+            error: Optional[BaseException] = None
+            finished = False
+            try:
+                content, total_tokens = get_provider(name).generate_completion(prompt, system_prompt)
+                finished = True
+            except Exception as e:
+                error, finished = e, True
+                last_error = e
+                continue
+            finally:
+                self._end(name, started, error, cancelled=not finished)
+                if reservation is not None and (error is not None or not finished):
+                    reservation.cancel()
+            if reservation is not None:
+                reservation.settle(total_tokens)
+            record_route(name)
+            return content, total_tokens
+        raise last_error # type: ignore
+
+    async def _route_async(self, prompt: str, system_prompt: str, invoke):
+        estimate = LLMService._estimate_request_tokens(prompt, system_prompt)
+        last_error: Optional[BaseException] = None
+        for name in self._ranked():
+            limiter = provider_rate_limiter(name)
+            reservation = await limiter.acquire(estimate) if limiter.enabled else None
+            started = self._begin(name)
+            error: Optional[BaseException] = None
+            finished = False
+            try:
+                content, total_tokens = await invoke(get_provider(name))
+                finished = True
+            except _StreamStarted as e:
+                # 已向调用方输出过部分流式内容，换平台会与已输出内容错位，交给上层整段重试
+                error, finished = e.__cause__, True
+                raise error # type: ignore
+            except Exception as e:
+                error, finished = e, True
+                last_error = e
+                continue
+            finally:
+                # 失败或被取消（CancelledError 不是 Exception）时同样释放在途计数并退还限流预约
+                self._end(name, started, error, cancelled=not finished)
+                if reservation is not None and (error is not None or not finished):
+                    reservation.cancel()
+            if reservation is not None:
+                reservation.settle(total_tokens)
+            record_route(name)
+            return content, total_tokens
+        raise last_error # type: ignore
+
+    async def generate_completion_async(self, prompt: str, system_prompt: str):
+        return await self._route_async(
+            prompt, system_prompt, lambda provider: provider.generate_completion_async(prompt, system_prompt)
+        )
+
+    async def generate_completion_stream_async(self, prompt: str, system_prompt: str, on_delta: Callable[[str], None]):
+        async def invoke(provider):
+            started = False
+
+            def forward(chunk: str):
+                nonlocal started
+                started = True
+                on_delta(chunk)
+
+            try:
+                return await provider.generate_completion_stream_async(prompt, system_prompt, forward)
+            except Exception as e:
+                if started:
+                    raise _StreamStarted() from e
+                raise
+
+        return await self._route_async(prompt, system_prompt, invoke)
+
+class _StreamStarted(Exception):
+    pass
+
+class MockProvider(LLMProvider):
+    """
+    模拟平台：不发网络请求，按 MOCK_* 环境变量模拟延迟分布、吞吐上限、429/5xx、JSON 损坏与截断，
+    token 数按提示词与输出长度估算；用于压测与故障注入，MOCK_SEED 固定时结果可复现。
+    """
+    MODEL_ENV, DEFAULT_MODEL = 'MOCK_MODEL', 'mock-translator'
+
+    def __init__(self):
+        from modules.simulation_tool import SimulationProfile, TranslationSimulator
+        _, _, self.model = self.settings()
+        self.simulator = TranslationSimulator(SimulationProfile.from_env())
+
+    @staticmethod
+    def _finish(reply):
+        record_usage(reply.prompt_tokens, reply.completion_tokens, reply.cached_tokens)
+        return reply.content, reply.total_tokens
+
+    def generate_completion(self, prompt: str, system_prompt: str):
+        return self._finish(self.simulator.complete(system_prompt, prompt, request_timeout()))
+
+    async def generate_completion_async(self, prompt: str, system_prompt: str):
+        return self._finish(await self.simulator.complete_async(system_prompt, prompt))
+
+    async def generate_completion_stream_async(self, prompt: str, system_prompt: str, on_delta: Callable[[str], None]):
+        return self._finish(await self.simulator.complete_async(system_prompt, prompt, on_delta))
+
+PROVIDERS = {
+    "kimi": KimiProvider,
+    "gpt": GPTProvider,
+    "deepseek": DeepseekProvider,
+    "silicon": SiliconProvider,
+    "gemini": GeminiProvider,
+    "doubao": DoubaoProvider,
+    "router": RouterProvider,
+    "mock": MockProvider,
+}
+
+_provider_registry: Dict[tuple, LLMProvider] = {}
+_provider_registry_lock = threading.Lock()
+
+def get_provider(name: str) -> LLMProvider:
+    """
+    进程级 provider 注册表：按 (平台, base_url, api_key, model) 复用长连接客户端，
+    CLI、WebUI 与仿真脚本中的多个 LLMService 共享同一连接池。
+    """
+    name = name.lower()
+    provider_cls = PROVIDERS.get(name)
+    if provider_cls is None:
+        raise ValueError(f"未知的API平台：{name}")
+    key = (name,) + provider_cls.settings()
+    provider = _provider_registry.get(key)
+    if provider is None:
+        with _provider_registry_lock:
+            provider = _provider_registry.get(key)
+            if provider is None:
+                provider = _provider_registry[key] = provider_cls()
+    return provider
+
+async def close_async_clients() -> None:
+    """
+    关闭各平台缓存在当前事件循环上的异步客户端，释放连接池。
+    """
+    loop = asyncio.get_running_loop()
+    with _async_client_lock:
+        clients = [
+            provider.__dict__['_async_clients'].pop(loop, None)
+            for provider in list(_provider_registry.values()) if '_async_clients' in provider.__dict__
+        ]
+    for client in clients:
+        if client is None:
+            continue
+        # genai.Client 的 close() 只关闭同步客户端，异步连接池需要 aio.aclose()
+        aio = getattr(client, 'aio', None)
+        close = getattr(aio, 'aclose', None) if aio is not None else getattr(client, 'close', None)
+        if close is None:
+            continue
+        result = close()
+        if inspect.isawaitable(result):
+            await result
 
 def translation_json_schema() -> Dict[str, Any]:
     return {
@@ -166,6 +774,12 @@ class TranslationResponseModel(BaseModel):
     translation: str
     new_terms: List[NewTerm]
 
+class BatchTranslationItem(TranslationResponseModel):
+    id: int
+
+class BatchTranslationResponseModel(BaseModel):
+    items: List[BatchTranslationItem]
+
 class StructuredParseError(Exception):
     pass
 
@@ -195,7 +809,9 @@ def parse_translation_response(text: str) -> Dict[str, Any]:
         except Exception:
             raise StructuredParseError('Non-structured or invalid JSON output')
     data = model.model_dump() if hasattr(model, 'model_dump') else model.dict()
-    
+    return _normalize_translation_data(data)
+
+def _normalize_translation_data(data: Dict[str, Any]) -> Dict[str, Any]:
     new_terms = data.get("new_terms", [])
     notes_list = []
     for nt in new_terms:
@@ -222,23 +838,75 @@ def parse_translation_response(text: str) -> Dict[str, Any]:
         ],
     }
 
+def repair_translation_response(text: str) -> Optional[Dict[str, Any]]:
+    """
+    本地修复无效的结构化输出；translation 缺失时返回 None。截断或残缺的 new_terms 项直接丢弃。
+    """
+    data = repair_json_object(text)
+    if data is None or not isinstance(data.get('translation'), str):
+        return None
+    new_terms = data.get('new_terms')
+    valid_terms = []
+    for item in new_terms if isinstance(new_terms, list) else []:
+        try:
+            valid_terms.append(NewTerm.model_validate(item).model_dump())
+        except ValidationError:
+            continue
+    return _normalize_translation_data({'translation': data['translation'], 'new_terms': valid_terms})
+
+def parse_batch_translation_response(text: str, expected_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    """
+    解析批量响应 {"items": [{"id", "translation", "new_terms"}]}，逐项校验。
+    返回通过校验的 {段落id: 单段结果}；缺失、重复或校验失败的项不出现在结果中，由调用方拆分重试。
+    """
+    text = (text or '').strip()
+    if text.startswith('```'):
+        text = text.split('\n', 1)[1] if '\n' in text else ''
+        text = text.rsplit('```', 1)[0]
+    try:
+        data = json.loads(text)
+    except Exception:
+        data = repair_json_object(text)
+        if data is None:
+            return {}
+    items = data.get('items') if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        return {}
+    expected = set(expected_ids)
+    results: Dict[int, Dict[str, Any]] = {}
+    for raw in items:
+        try:
+            item = BatchTranslationItem.model_validate(raw)
+        except ValidationError:
+            continue
+        if item.id in expected and item.id not in results:
+            results[item.id] = _normalize_translation_data(item.model_dump())
+    return results
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估算 token 数：中日韩字符按 1 字 1 token，其余按约 4 字符 1 token。
+    仅用于预算控制与统计，不依赖具体模型的分词器。
+    """
+    if not text:
+        return 0
+    cjk = sum(1 for c in text if '\u3000' <= c <= '\u9fff' or '\uac00' <= c <= '\ud7af' or '\uff00' <= c <= '\uffef')
+    return cjk + (len(text) - cjk + 3) // 4
+
 class LLMService:
     def __init__(self, provider: str = "kimi"):
-        self.providers = {
-            "kimi": KimiProvider,
-            "gpt": GPTProvider,
-            "deepseek": DeepseekProvider,
-            "silicon": SiliconProvider,
-            "gemini": GeminiProvider,
-            "doubao": DoubaoProvider,
-        }
+        self.providers = PROVIDERS
         self.provider_name = provider.lower()
-        self.Linkedprovider = self.providers.get(self.provider_name)() # type: ignore
+        self.Linkedprovider = get_provider(self.provider_name)
         self.system_prompt = os.getenv('SYSTEM_PROMPT')
         self.structured = os.getenv('STRUCTURED_OUTPUT', 'True').lower() in ('1', 'true', 'yes')
-        self._rpm_limit = int(os.getenv('Requests_Per_Minute', '0'))
-        self._req_ts: List[float] = []
         self._lock = threading.Lock()
+        # 每个提示词中术语表部分的 token 预算，0 表示不限制；超出时按匹配结果的排序截断（设置预算时匹配阶段按出现次数排序）
+        self.glossary_token_budget = int(os.getenv('GLOSSARY_TOKEN_BUDGET', '0'))
+        self.glossary_tokens_saved = 0
+        # cache：不变的指令在前、术语表与原文在后，使平台侧前缀缓存能覆盖系统提示词与 BASE_PROMPT；legacy 为旧顺序
+        self.prompt_layout = os.getenv('PROMPT_LAYOUT', 'cache').lower()
+        self.prompt_cache = PromptCacheStats()
 
     @property
     def provider(self):
@@ -247,38 +915,227 @@ class LLMService:
     @provider.setter
     def provider(self, value: str):
         self.provider_name = value.lower()
-        self.Linkedprovider = self.providers.get(self.provider_name)() # type: ignore
+        self.Linkedprovider = get_provider(self.provider_name)
 
     def create_prompt(self, paragraph: str, terms_dict: Dict[str, str]) -> str:
-        base_prompt = (
-            f"\n原文段落：\n{paragraph}{os.getenv('BASE_PROMPT')}"
-        )
-        if terms_dict:
-            terms_info = '\n'.join([f"{eng} -> {chi}" for eng, chi in terms_dict.items()])
-            return f"术语表：{terms_info}\n{base_prompt}"
-        return base_prompt
+        if self.prompt_layout == 'legacy':
+            base_prompt = (
+                f"\n原文段落：\n{paragraph}{os.getenv('BASE_PROMPT')}"
+            )
+            return self._glossary_section(terms_dict) + base_prompt
+        return f"{self._instructions_section()}{self._glossary_section(terms_dict)}\n原文段落：\n{paragraph}"
+
+    @staticmethod
+    def _instructions_section() -> str:
+        base_prompt = os.getenv('BASE_PROMPT') or ''
+        return f"{base_prompt}\n" if base_prompt else ''
+
+    def _glossary_section(self, terms_dict: Dict[str, str]) -> str:
+        if not terms_dict:
+            return ''
+        lines = [f"{eng} -> {chi}" for eng, chi in terms_dict.items()]
+        if self.glossary_token_budget > 0:
+            lines = self._apply_glossary_budget(lines)
+        terms_info = '\n'.join(lines)
+        return f"术语表：{terms_info}\n"
+
+    _BATCH_SYSTEM_SUFFIX = (
+        "\n批量模式：本次输入包含多个以 <segment id=\"…\"> 标记的段落，请逐段独立翻译，"
+        "输出 JSON {'items':[{'id':段落id,'translation':'…','new_terms':[…]}]}，每个段落对应一项且 id 与输入一致；"
+        "单段模板中关于 translation 与 new_terms 的规则适用于每一项。"
+    )
+
+    @property
+    def supports_batch(self) -> bool:
+        return self.structured and getattr(self.Linkedprovider, 'SUPPORTS_BATCH', False)
+
+    def create_batch_prompt(self, segments: List[Tuple[int, str]], terms_dict: Dict[str, str]) -> str:
+        """
+        多段合并为一个提示词：术语表与 BASE_PROMPT 只出现一次，各段用带 id 的标签包裹。
+        """
+        body = '\n'.join(f'<segment id="{sid}">\n{text}\n</segment>' for sid, text in segments)
+        if self.prompt_layout == 'legacy':
+            return f"{self._glossary_section(terms_dict)}\n原文段落（共 {len(segments)} 段）：\n{body}{os.getenv('BASE_PROMPT')}"
+        return f"{self._instructions_section()}{self._glossary_section(terms_dict)}\n原文段落（共 {len(segments)} 段）：\n{body}"
+
+    def call_ai_model_api_batch(self, prompt: str, segment_ids: List[int]):
+        content, total_tokens = self._generate(prompt, (self.system_prompt or '') + self._BATCH_SYSTEM_SUFFIX)
+        return parse_batch_translation_response(content, segment_ids), total_tokens
+
+    async def call_ai_model_api_batch_async(self, prompt: str, segment_ids: List[int]):
+        content, total_tokens = await self._generate_limited_async(prompt, (self.system_prompt or '') + self._BATCH_SYSTEM_SUFFIX)
+        return parse_batch_translation_response(content, segment_ids), total_tokens
+
+    def _apply_glossary_budget(self, lines: List[str]) -> List[str]:
+        # lines 已按匹配阶段的排序（出现次数降序）排列，保留预算内的前缀，其余计入节省量
+        kept = []
+        used = 0
+        for i, line in enumerate(lines):
+            cost = estimate_tokens(line) + 1
+            if used + cost > self.glossary_token_budget:
+                saved = sum(estimate_tokens(rest) + 1 for rest in lines[i:])
+                with self._lock:
+                    self.glossary_tokens_saved += saved
+                break
+            kept.append(line)
+            used += cost
+        return kept
+
+    @property
+    def rate_limiter(self):
+        # RPM/TPM 配额按平台在进程内共享；每次取用时读取环境变量，便于运行中调整
+        if getattr(self.Linkedprovider, 'MANAGES_RATE_LIMIT', False):
+            return get_rate_limiter(self.provider_name, 0, 0)
+        return provider_rate_limiter(self.provider_name)
+
+    @staticmethod
+    def _estimate_request_tokens(prompt: str, system_prompt: str) -> int:
+        # 预约额度：输入按长度估算，输出按与输入段落相当估算；调用结束后按实际 usage 对账
+        prompt_tokens = estimate_tokens(prompt)
+        return estimate_tokens(system_prompt or '') + prompt_tokens * 2
+
+    def _generate(self, prompt: str, system_prompt: str):
+        limiter = self.rate_limiter
+        reservation = limiter.acquire_sync(self._estimate_request_tokens(prompt, system_prompt)) if limiter.enabled else None
+        usage: Dict[str, int] = {}
+        token = current_usage.set(usage)
+        started = time.monotonic()
+        try:
+            content, total_tokens = self.Linkedprovider.generate_completion(prompt, system_prompt)
+        finally:
+            current_usage.reset(token)
+        self._record_call(usage, time.monotonic() - started, prompt, system_prompt, content, total_tokens)
+        if reservation is not None:
+            reservation.settle(total_tokens)
+        return content, total_tokens
+
+    async def _generate_limited_async(self, prompt: str, system_prompt: str, on_delta: Optional[Callable[[str], None]] = None):
+        limiter = self.rate_limiter
+        reservation = await limiter.acquire(self._estimate_request_tokens(prompt, system_prompt)) if limiter.enabled else None
+        # 在本任务的上下文中放入用量字典；并发的其他请求（含对冲请求）各有自己的一份
+        usage: Dict[str, int] = {}
+        token = current_usage.set(usage)
+        started = time.monotonic()
+        try:
+            content, total_tokens = await self._generate_async(prompt, system_prompt, on_delta)
+        finally:
+            current_usage.reset(token)
+        self._record_call(usage, time.monotonic() - started, prompt, system_prompt, content, total_tokens)
+        if reservation is not None:
+            reservation.settle(total_tokens)
+        return content, total_tokens
+
+    def _record_call(self, usage: Dict[str, int], latency: float, prompt: str, system_prompt: str, content, total_tokens) -> None:
+        """
+        记录一次调用的用量：计入前缀缓存统计，并按 current_stage 写入当前段落的用量账本。
+        平台未返回输入/输出明细时按文本长度估算，总量仍以平台返回的 total_tokens 为准。
+        """
+        self.prompt_cache.record(usage, latency)
+        estimated = 'prompt_tokens' not in usage
+        if estimated:
+            prompt_tokens = estimate_tokens(system_prompt or '') + estimate_tokens(prompt)
+            completion_tokens = max(0, total_tokens - prompt_tokens) if total_tokens else estimate_tokens(content or '')
+        else:
+            prompt_tokens, completion_tokens = usage['prompt_tokens'], usage['completion_tokens']
+        record_call(UsageRecord(
+            stage=current_stage.get(),
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            cached_tokens=usage.get('cached_tokens', 0),
+            total_tokens=int(total_tokens or prompt_tokens + completion_tokens),
+            latency=round(latency, 3),
+            estimated=estimated,
+        ))
 
     def call_ai_model_api(self, prompt: str):
-        self._enforce_rate_limit()
-        content, total_tokens = self.Linkedprovider.generate_completion(prompt, self.system_prompt)
+        content, total_tokens = self._generate(prompt, self.system_prompt)
+        return self._wrap_response(content), total_tokens
+
+    async def call_ai_model_api_async(self, prompt: str):
+        content, total_tokens = await self._generate_limited_async(prompt, self.system_prompt)
+        return self._wrap_response(content), total_tokens
+
+    async def call_ai_model_api_stream_async(self, prompt: str, on_translation: Optional[Callable[[str], None]] = None):
+        """
+        流式调用：结构化输出时用增量解析器边收边校验，translation 字段的新增文本实时交给 on_translation。
+        结构损坏（如译文里未转义的引号、多余的逗号）时停止实时输出但继续读完整段，
+        完整文本照常解析，失败时由调用方先做本地修复，修复不了才重试。
+        """
+        parser = IncrementalTranslationParser() if self.structured else None
+
+        def on_delta(chunk: str):
+            nonlocal parser
+            if parser is None:
+                text = '' if self.structured else chunk
+            else:
+                try:
+                    text = parser.feed(chunk)
+                except StreamBreakageError:
+                    parser = None
+                    text = ''
+            if text and on_translation is not None:
+                on_translation(text)
+
+        content, total_tokens = await self._generate_limited_async(prompt, self.system_prompt, on_delta)
+        return self._wrap_response(content), total_tokens
+
+    @property
+    def supports_batch_api(self) -> bool:
+        # 只有使用 chat.completions 的 OpenAI 兼容平台能渲染 /v1/chat/completions 请求体
+        return getattr(self.Linkedprovider, 'SUPPORTS_BATCH_API', False)
+
+    def batch_api_request_body(self, prompt: str) -> Dict[str, Any]:
+        return self.Linkedprovider.batch_request_body(prompt, self.system_prompt)
+
+    def parse_batch_api_response(self, body: Dict[str, Any]):
+        content, total_tokens = self.Linkedprovider.parse_batch_response_body(body)
+        return self._wrap_response(content), total_tokens
+
+    def _wrap_response(self, content):
         if self.structured:
-            parsed = parse_translation_response(content)
-            return parsed, total_tokens
-        return {"translation": content, "notes": "", "new_terms": []}, total_tokens
+            return parse_translation_response(content)
+        return {"translation": content, "notes": "", "new_terms": []}
 
-    def repair_json(self, origin_text: str) -> Tuple[Dict[str, Any], int]:
+    async def _generate_async(self, prompt: str, system_prompt: str, on_delta: Optional[Callable[[str], None]] = None):
+        if on_delta is not None:
+            generate_stream = getattr(self.Linkedprovider, 'generate_completion_stream_async', None)
+            if generate_stream is None:
+                content, total_tokens = await self._generate_async(prompt, system_prompt)
+                on_delta(content or '')
+                return content, total_tokens
+            content, total_tokens = await generate_stream(prompt, system_prompt, on_delta)
+            if total_tokens is None:
+                # 平台未在流中返回用量时按文本长度估算
+                total_tokens = estimate_tokens(system_prompt or '') + estimate_tokens(prompt) + estimate_tokens(content)
+            return content, total_tokens
+        # 测试中替换的 provider 可能只实现了同步接口
+        generate_async = getattr(self.Linkedprovider, 'generate_completion_async', None)
+        if generate_async is None:
+            return await asyncio.to_thread(self.Linkedprovider.generate_completion, prompt, system_prompt)
+        return await generate_async(prompt, system_prompt)
+
+    _REPAIR_SYSTEM_PROMPT = '你是一个专业的JSON修复助手，只能修复JSON字符串，不能返回其他内容。'
+
+    @staticmethod
+    def _repair_prompt(origin_text: str) -> str:
         format = r"{'translation':'...','new_terms':[{'term': '...','translation':'...','reason':'...'}]}"
-        repair_prompt = "".join([f"请修复以下无效的JSON字符串，只返回修复后的JSON字符串，不要包含任何其他内容。\nInvalid json:{origin_text}\nJson format example:{format}。"])
-        self._enforce_rate_limit()
-        response_obj, total_tokens = self.Linkedprovider.generate_completion(repair_prompt, '你是一个专业的JSON修复助手，只能修复JSON字符串，不能返回其他内容。')
+        # 固定的说明与格式示例在前，待修复文本在后，便于命中平台侧前缀缓存
+        return "".join([f"请修复以下无效的JSON字符串，只返回修复后的JSON字符串，不要包含任何其他内容。\nJson format example:{format}。\nInvalid json:{origin_text}"])
+
+    def repair_json(self, origin_text: str) -> Tuple[Dict[str, Any], int]:
+        response_obj, total_tokens = self._generate(self._repair_prompt(origin_text), self._REPAIR_SYSTEM_PROMPT)
         parsed = parse_translation_response(response_obj)
         return parsed, total_tokens
 
-    def rewrite_with_glossary(self, translation: str, notes: str, corrections: Dict[str, str]) -> Tuple[Dict[str, Any], int]:
-        if not corrections:
-            return {"translation": translation, "notes": notes, "new_terms": []}, 0
+    async def repair_json_async(self, origin_text: str) -> Tuple[Dict[str, Any], int]:
+        response_obj, total_tokens = await self._generate_limited_async(self._repair_prompt(origin_text), self._REPAIR_SYSTEM_PROMPT)
+        parsed = parse_translation_response(response_obj)
+        return parsed, total_tokens
+
+    @staticmethod
+    def _rewrite_prompt(translation: str, notes: str, corrections: Dict[str, str]) -> str:
         terms_info = '\n'.join([f"{eng} -> {chi}" for eng, chi in corrections.items()])
-        prompt = (
+        return (
             "请根据以下术语映射，复写现有译文，使其中的术语全部采用映射中的译名；"
             "保持语义与行文不变，只进行术语规范化。"
             "仅输出JSON，包含translation和new_terms（请根据现有注释还原，并移除已在术语映射中修正的项）。\n"
@@ -286,8 +1143,20 @@ class LLMService:
             f"现有译文：\n{translation}\n"
             f"现有注释：\n{notes}"
         )
-        self._enforce_rate_limit()
-        content, total_tokens = self.Linkedprovider.generate_completion(prompt, self.system_prompt or "你是术语一致性编辑助手")
+
+    def rewrite_with_glossary(self, translation: str, notes: str, corrections: Dict[str, str]) -> Tuple[Dict[str, Any], int]:
+        if not corrections:
+            return {"translation": translation, "notes": notes, "new_terms": []}, 0
+        prompt = self._rewrite_prompt(translation, notes, corrections)
+        content, total_tokens = self._generate(prompt, self.system_prompt or "你是术语一致性编辑助手")
+        parsed = parse_translation_response(content)
+        return parsed, total_tokens
+
+    async def rewrite_with_glossary_async(self, translation: str, notes: str, corrections: Dict[str, str]) -> Tuple[Dict[str, Any], int]:
+        if not corrections:
+            return {"translation": translation, "notes": notes, "new_terms": []}, 0
+        prompt = self._rewrite_prompt(translation, notes, corrections)
+        content, total_tokens = await self._generate_limited_async(prompt, self.system_prompt or "你是术语一致性编辑助手")
         parsed = parse_translation_response(content)
         return parsed, total_tokens
 
@@ -323,25 +1192,3 @@ class LLMService:
                     "error": str(e),
                 })
         return results
-
-    def _enforce_rate_limit(self) -> None:
-        if self._rpm_limit <= 0:
-            return
-            
-        while True:
-            with self._lock:
-                now = time.time()
-                # Clean up expired timestamps
-                self._req_ts = [t for t in self._req_ts if now - t < 60.0]
-                
-                if len(self._req_ts) < self._rpm_limit:
-                    self._req_ts.append(now)
-                    return # Slot acquired
-                
-                # Calculate wait time
-                wait = 60.0 - (now - self._req_ts[0])
-            
-            # Sleep outside the lock to avoid blocking other threads
-            # (though they will likely hit the limit too)
-            if wait > 0:
-                time.sleep(wait)
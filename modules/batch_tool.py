@@ -0,0 +1,453 @@
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from openai import OpenAI
+from openai.types.chat import ChatCompletion
+
+from modules.api_tool import LLMService, StructuredParseError, repair_translation_response
+from modules.csv_process_tool import GlossaryMatcher, TermRegistry
+from modules.write_out_tool import update_json_metadata, write_to_markdown_through_json
+
+BATCH_ENDPOINT = '/v1/chat/completions'
+# Batch API 的终止状态；其余（validating、in_progress、finalizing、cancelling）继续轮询
+TERMINAL_STATES = ('completed', 'failed', 'expired', 'cancelled')
+
+
+class BatchAdapter:
+    """
+    平台批处理接口的最小抽象：提交请求文件、查询状态、取回结果行。
+    结果行格式与 OpenAI Batch API 输出一致：{"custom_id", "response": {"status_code", "body"}, "error"}。
+    """
+
+    def submit(self, requests_path: str) -> str:
+        raise NotImplementedError
+
+    def retrieve(self, batch_id: str) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def results(self, batch_id: str) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+
+class OpenAIBatchAdapter(BatchAdapter):
+    """
+    OpenAI 兼容的 /v1/files + /v1/batches 接口（OpenAI、Kimi、硅基流动等）。
+    """
+
+    def __init__(self, client: OpenAI, completion_window: str = '24h'):
+        self.client = client
+        self.completion_window = completion_window
+
+    def submit(self, requests_path: str) -> str:
+        with open(requests_path, 'rb') as f:
+            uploaded = self.client.files.create(file=f, purpose='batch')
+        batch = self.client.batches.create(
+            input_file_id=uploaded.id,
+            endpoint=BATCH_ENDPOINT,  # type: ignore[arg-type]
+            completion_window=self.completion_window,  # type: ignore[arg-type]
+        )
+        return batch.id
+
+    def retrieve(self, batch_id: str) -> Dict[str, Any]:
+        return self.client.batches.retrieve(batch_id).model_dump()
+
+    def results(self, batch_id: str) -> List[Dict[str, Any]]:
+        batch = self.client.batches.retrieve(batch_id)
+        lines: List[Dict[str, Any]] = []
+        # 成功的请求在 output_file，失败的在 error_file，两者都要读
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                lines.extend(_read_jsonl(self.client.files.content(file_id).text))
+        return lines
+
+
+def _read_jsonl(text: str) -> List[Dict[str, Any]]:
+    lines = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line:
+            lines.append(json.loads(line))
+    return lines
+
+
+def completion_body(model: str, content: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> Dict[str, Any]:
+    return {
+        'id': f'chatcmpl-{uuid.uuid4().hex[:12]}',
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': model,
+        'choices': [{'index': 0, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': content}}],
+        'usage': {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens,
+            'prompt_tokens_details': {'cached_tokens': cached_tokens},
+        },
+    }
+
+
+def _forward_chat_completion(upstream: OpenAI, body: Dict[str, Any]) -> Dict[str, Any]:
+    # 原样转发请求体：批处理请求体里可能有 SDK 的 create() 不认识的字段（如 prompt_cache_key）
+    return upstream.post('/chat/completions', cast_to=ChatCompletion, body=body).model_dump()
+
+
+class LocalBatchServer:
+    """
+    本地替身批处理服务：在 127.0.0.1 上提供 /v1/files 与 /v1/batches，供离线测试，
+    或为没有批处理接口的平台逐条转发到交互式接口。
+    responder(body) 返回一条 chat.completion 响应体；未提供时用 upstream（OpenAI 客户端）逐条请求。
+    responder 抛出异常的请求写入 error_file（status_code 500），用于验证失败重提交。
+    """
+
+    def __init__(
+        self,
+        responder: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None,
+        upstream: Optional[OpenAI] = None,
+        processing_delay: float = 0.0,
+        port: int = 0,
+    ):
+        if responder is None and upstream is None:
+            raise ValueError('LocalBatchServer 需要 responder 或 upstream')
+        self.responder = responder or (lambda body: _forward_chat_completion(upstream, body))  # type: ignore[arg-type]
+        self.processing_delay = processing_delay
+        self.port = port
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.batches: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread: Optional[threading.Thread] = None
+        self.app = self._build_app()
+
+    @property
+    def base_url(self) -> str:
+        return f'http://127.0.0.1:{self.port}/v1'
+
+    def client(self) -> OpenAI:
+        return OpenAI(api_key='local-batch', base_url=self.base_url)
+
+    def _store_file(self, content: bytes, filename: str, purpose: str) -> Dict[str, Any]:
+        file_id = f'file-{uuid.uuid4().hex[:12]}'
+        record = {
+            'id': file_id, 'object': 'file', 'bytes': len(content), 'created_at': int(time.time()),
+            'filename': filename, 'purpose': purpose, 'status': 'processed',
+        }
+        with self._lock:
+            self.files[file_id] = dict(record, content=content)
+        return record
+
+    def _process(self, batch_id: str) -> None:
+        batch = self.batches[batch_id]
+        batch['status'] = 'in_progress'
+        batch['in_progress_at'] = int(time.time())
+        if self.processing_delay:
+            time.sleep(self.processing_delay)
+        outputs, errors = [], []
+        requests = _read_jsonl(self.files[batch['input_file_id']]['content'].decode('utf-8'))
+        for request in requests:
+            line = {'id': f'batch_req_{uuid.uuid4().hex[:12]}', 'custom_id': request.get('custom_id'), 'error': None}
+            try:
+                body = self.responder(request['body'])
+                line['response'] = {'status_code': 200, 'request_id': uuid.uuid4().hex, 'body': body}
+                outputs.append(line)
+            except Exception as e:
+                line['response'] = {'status_code': 500, 'request_id': uuid.uuid4().hex,
+                                    'body': {'error': {'message': str(e), 'type': 'server_error'}}}
+                errors.append(line)
+        for key, lines in (('output_file_id', outputs), ('error_file_id', errors)):
+            if lines:
+                payload = '\n'.join(json.dumps(l, ensure_ascii=False) for l in lines).encode('utf-8')
+                batch[key] = self._store_file(payload, f'{batch_id}_{key}.jsonl', 'batch_output')['id']
+        batch['request_counts'] = {'total': len(requests), 'completed': len(outputs), 'failed': len(errors)}
+        batch['completed_at'] = int(time.time())
+        batch['status'] = 'completed'
+
+    def _build_app(self):
+        from fastapi import FastAPI, File, Form, HTTPException, UploadFile
+        from fastapi.responses import Response
+
+        app = FastAPI()
+
+        @app.post('/v1/files')
+        async def create_file(file: UploadFile = File(...), purpose: str = Form(...)):
+            return self._store_file(await file.read(), file.filename or 'batch.jsonl', purpose)
+
+        @app.get('/v1/files/{file_id}/content')
+        async def file_content(file_id: str):
+            record = self.files.get(file_id)
+            if record is None:
+                raise HTTPException(status_code=404, detail='file not found')
+            return Response(content=record['content'], media_type='application/jsonl')
+
+        @app.post('/v1/batches')
+        async def create_batch(payload: Dict[str, Any]):
+            if payload.get('input_file_id') not in self.files:
+                raise HTTPException(status_code=400, detail='input file not found')
+            batch_id = f'batch_{uuid.uuid4().hex[:12]}'
+            self.batches[batch_id] = {
+                'id': batch_id, 'object': 'batch', 'endpoint': payload.get('endpoint', BATCH_ENDPOINT),
+                'input_file_id': payload['input_file_id'], 'completion_window': payload.get('completion_window', '24h'),
+                'status': 'validating', 'created_at': int(time.time()),
+                'output_file_id': None, 'error_file_id': None,
+                'request_counts': {'total': 0, 'completed': 0, 'failed': 0},
+            }
+            threading.Thread(target=self._process, args=(batch_id,), daemon=True).start()
+            return dict(self.batches[batch_id])
+
+        @app.get('/v1/batches/{batch_id}')
+        async def retrieve_batch(batch_id: str):
+            batch = self.batches.get(batch_id)
+            if batch is None:
+                raise HTTPException(status_code=404, detail='batch not found')
+            return dict(batch)
+
+        return app
+
+    def start(self) -> 'LocalBatchServer':
+        import uvicorn
+
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(('127.0.0.1', self.port))
+        self.port = sock.getsockname()[1]
+        self._server = uvicorn.Server(uvicorn.Config(self.app, log_level='warning'))
+        self._thread = threading.Thread(target=self._server.run, kwargs={'sockets': [sock]}, daemon=True)
+        self._thread.start()
+        deadline = time.monotonic() + 10
+        while not self._server.started and time.monotonic() < deadline:
+            time.sleep(0.02)
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            # 本地替身无需等待仍在处理的连接（如模拟的慢请求）优雅结束
+            self._server.should_exit = True
+            self._server.force_exit = True
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+
+def source_paragraph(prompt: str) -> str:
+    """
+    从 create_prompt 生成的提示词中取回原文段落（去掉前面的指令与术语表），供替身服务模拟译文。
+    """
+    marker = '原文段落：\n'
+    text = prompt.split(marker, 1)[1] if marker in prompt else prompt
+    if os.getenv('PROMPT_LAYOUT', 'cache').lower() == 'legacy':
+        # 旧顺序在原文后直接拼接 BASE_PROMPT（未设置时为 "None"）
+        base_prompt = str(os.getenv('BASE_PROMPT'))
+        if text.endswith(base_prompt):
+            text = text[:-len(base_prompt)]
+    return text
+
+
+def echo_responder(body: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    离线替身的默认应答：把 user 消息中的原文段落原样作为译文返回，token 按字符数粗估。
+    """
+    prompt = next((m['content'] for m in reversed(body.get('messages', [])) if m.get('role') == 'user'), '')
+    content = json.dumps({'translation': source_paragraph(prompt), 'new_terms': []}, ensure_ascii=False)
+    # Kimi 的 partial 模式由调用方补回开头的 {
+    if body.get('messages') and body['messages'][-1].get('partial'):
+        content = content[1:]
+    return completion_body(body.get('model', 'local'), content, len(prompt) // 2, len(content) // 2)
+
+
+def _custom_id(p_id: int) -> str:
+    return f'paragraph-{p_id}'
+
+
+def _paragraph_of(custom_id: str) -> Optional[int]:
+    try:
+        return int(str(custom_id).rsplit('-', 1)[1])
+    except (IndexError, ValueError):
+        return None
+
+
+def render_batch_requests(
+    items: List[Dict[str, Any]],
+    llm_service: LLMService,
+    glossary: Optional[Union[Dict[str, str], GlossaryMatcher]],
+    requests_path: str,
+) -> int:
+    """
+    把待翻译段落渲染为 Batch API 请求文件（JSONL），每行一个 /v1/chat/completions 请求，
+    custom_id 为 paragraph-<段落号>。返回写入的请求数。
+    """
+    registry = TermRegistry(glossary) if glossary else None
+    count = 0
+    with open(requests_path, 'w', encoding='utf-8') as f:
+        for item in items:
+            content = item.get('content', '')
+            if registry is not None:
+                terms = registry.match(content, item.get('matched_terms'))
+            else:
+                terms = item.get('matched_terms') or {}
+            prompt = llm_service.create_prompt(content, terms)
+            line = {
+                'custom_id': _custom_id(item['paragraph_number']),
+                'method': 'POST',
+                'url': BATCH_ENDPOINT,
+                'body': llm_service.batch_api_request_body(prompt),
+            }
+            f.write(json.dumps(line, ensure_ascii=False) + '\n')
+            count += 1
+    return count
+
+
+def parse_batch_result_line(line: Dict[str, Any], llm_service: LLMService) -> Tuple[Optional[Dict[str, Any]], int, Optional[str]]:
+    """
+    解析一条结果行，返回 (译文数据, token, 错误信息)。JSON 损坏时先做本地修复，仍失败则记为失败待重提交。
+    """
+    response = line.get('response') or {}
+    if line.get('error') or response.get('status_code') != 200:
+        error = line.get('error') or (response.get('body') or {}).get('error') or f"status {response.get('status_code')}"
+        return None, 0, str(error)
+    try:
+        data, tokens = llm_service.parse_batch_api_response(response.get('body') or {})
+    except (StructuredParseError, ValueError) as e:
+        return None, 0, str(e)
+    tokens = tokens or 0
+    if 'error' in data:
+        repaired = repair_translation_response(data.get('origin_text', ''))
+        if repaired is None:
+            return None, tokens, data['error']
+        data = repaired
+    return data, tokens, None
+
+
+def run_batch_translation(
+    json_path: str,
+    output_md_file: str,
+    llm_service: LLMService,
+    adapter: BatchAdapter,
+    glossary: Optional[Union[Dict[str, str], GlossaryMatcher]] = None,
+    mode: str = 'structured',
+    poll_interval: float = 30.0,
+    max_resubmits: int = 2,
+    aggregated_new_terms: Optional[List[Dict[str, str]]] = None,
+    on_status: Optional[Callable[[str], None]] = print,
+) -> Dict[str, Any]:
+    """
+    离线批处理翻译：以 read_and_process_structured_paragraphs_to_json 生成的中间 JSON 为输入，
+    渲染所有未完成段落的请求文件并提交，轮询到终止状态后取回结果，经 parse_translation_response
+    （必要时本地修复）写回 JSON，并由有序写出器按段落顺序写入 Markdown。
+    失败或缺失的段落最多重提交 max_resubmits 轮；仍失败的段落保持 pending。
+    提交后批次号写入 JSON 顶层的 batch，中断后重跑同一 JSON 会继续轮询该批次而不重复提交。
+    """
+    log = on_status or (lambda message: None)
+    with open(json_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    items = data.get('text_info', [])
+    state = data.get('batch') or {}
+    stats = {
+        'batch_ids': list(state.get('batch_ids', [])),
+        'rounds': state.get('rounds', 0),
+        'submitted': state.get('submitted', 0),
+        'completed': 0,
+        'failed': [],
+        'total_tokens': state.get('total_tokens', 0),
+    }
+    tracker_state = {'next_id': 1}
+    written = []
+
+    def write(p_id: int, content_info: Dict[str, Any]) -> None:
+        write_to_markdown_through_json(json_path, output_md_file, p_id, content_info, tracker_state, mode)
+        written.append(p_id)
+
+    # 图片等非文本段落不提交，直接原样完成
+    for item in items:
+        meta = item.get('meta_data') or {}
+        if item.get('status') != 'completed' and meta.get('is_image'):
+            write(item['paragraph_number'], {'translation': item.get('content', ''), 'notes': '', 'new_terms': []})
+
+    base, _ = os.path.splitext(json_path)
+    resume_id = state.get('active_batch_id')
+    while True:
+        pending = [item for item in items if item.get('status') != 'completed' and not (item.get('meta_data') or {}).get('is_image')]
+        if not pending and not resume_id:
+            break
+        if resume_id:
+            batch_id = resume_id
+            resume_id = None
+            log(f"[Batch] 继续轮询未完成的批次 {batch_id}")
+        else:
+            if stats['rounds'] >= max_resubmits + 1:
+                break
+            stats['rounds'] += 1
+            requests_path = f"{base}_batch_{stats['rounds']}.jsonl"
+            count = render_batch_requests(pending, llm_service, glossary, requests_path)
+            batch_id = adapter.submit(requests_path)
+            stats['submitted'] += count
+            stats['batch_ids'].append(batch_id)
+            log(f"[Batch] 第 {stats['rounds']} 轮提交 {count} 个段落，批次 {batch_id}，请求文件 {requests_path}")
+        update_json_metadata(json_path, 'batch', dict(stats, active_batch_id=batch_id))
+
+        status = adapter.retrieve(batch_id)
+        while status.get('status') not in TERMINAL_STATES:
+            time.sleep(poll_interval)
+            status = adapter.retrieve(batch_id)
+        counts = status.get('request_counts') or {}
+        log(f"[Batch] 批次 {batch_id} 状态 {status.get('status')}，完成 {counts.get('completed', 0)}，失败 {counts.get('failed', 0)}")
+
+        results = {}
+        if status.get('status') != 'failed':
+            for line in adapter.results(batch_id):
+                p_id = _paragraph_of(line.get('custom_id'))
+                if p_id is not None:
+                    results[p_id] = line
+        for p_id in sorted(results):
+            translated, tokens, error = parse_batch_result_line(results[p_id], llm_service)
+            stats['total_tokens'] += tokens
+            if translated is None:
+                log(f"[Batch] 段落 {p_id} 失败：{error}")
+                continue
+            write(p_id, {
+                'translation': translated.get('translation', ''),
+                'notes': translated.get('notes', ''),
+                'new_terms': translated.get('new_terms', []),
+                'provider': getattr(llm_service, 'provider_name', None),
+            })
+            if aggregated_new_terms is not None:
+                aggregated_new_terms.extend(translated.get('new_terms', []))
+            stats['completed'] += 1
+
+        with open(json_path, 'r', encoding='utf-8') as f:
+            items = json.load(f).get('text_info', [])
+        update_json_metadata(json_path, 'batch', stats)
+
+    if not written and items and items[0].get('status') == 'completed':
+        # 所有段落在之前的运行中已完成：重写首段以触发有序写出
+        first = items[0]
+        write(first['paragraph_number'], {key: first.get(key) for key in ('translation', 'notes', 'new_terms', 'provider')})
+    stats['failed'] = [item['paragraph_number'] for item in items if item.get('status') != 'completed']
+    update_json_metadata(json_path, 'batch', stats)
+    if stats['failed']:
+        log(f"[Batch] {len(stats['failed'])} 个段落在 {stats['rounds']} 轮后仍失败：{stats['failed']}")
+    return stats
+
+
+def build_batch_adapter(llm_service: LLMService, kind: str) -> Tuple[BatchAdapter, Optional[LocalBatchServer]]:
+    """
+    BATCH_API=provider 使用平台自身的批处理接口；BATCH_API=local 启动本地替身服务，
+    逐条转发到平台的交互式接口（用于没有批处理接口的平台或联调）。返回 (适配器, 需要关闭的本地服务)。
+    """
+    if not llm_service.supports_batch_api:
+        raise ValueError(f"{llm_service.provider_name} 不支持 Batch API（需要 OpenAI 兼容接口）")
+    window = os.getenv('BATCH_COMPLETION_WINDOW', '24h')
+    client = llm_service.Linkedprovider.client  # type: ignore[attr-defined]
+    if kind == 'local':
+        server = LocalBatchServer(upstream=client).start()
+        return OpenAIBatchAdapter(server.client(), window), server
+    return OpenAIBatchAdapter(client, window), None
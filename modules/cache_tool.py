@@ -0,0 +1,183 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+CACHE_SCHEMA_VERSION = 1
+DEFAULT_CACHE_PATH = os.path.join('data', 'translation_cache.sqlite3')
+
+
+def make_cache_key(provider: str, model: str, system_prompt: str, base_prompt: str, prompt: str, structured: bool = True) -> str:
+    """
+    按内容寻址：平台、模型、系统提示词、BASE_PROMPT 与最终提示词（含术语表部分）任一变化都会得到新键。
+    """
+    h = hashlib.sha256()
+    for part in (str(CACHE_SCHEMA_VERSION), provider, model, system_prompt, base_prompt, prompt, str(bool(structured))):
+        data = (part or '').encode('utf-8')
+        # 带长度前缀，避免字段拼接产生歧义
+        h.update(len(data).to_bytes(8, 'big'))
+        h.update(data)
+    return h.hexdigest()
+
+
+class TranslationCache:
+    """
+    基于 SQLite 的翻译响应缓存：保存解析后的 translation / notes / new_terms 与原始 token 消耗。
+    超过 max_entries 时按最近访问时间淘汰（LRU）。连接在线程间共享，读写由锁串行化。
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = 50000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.tokens_saved = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'key TEXT PRIMARY KEY, translation TEXT, notes TEXT, new_terms TEXT, '
+            'tokens INTEGER, repair_tokens INTEGER, created REAL, last_access REAL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses(last_access)')
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT translation, notes, new_terms, tokens, repair_tokens FROM responses WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute('UPDATE responses SET last_access = ? WHERE key = ?', (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+            self.tokens_saved += (row[3] or 0) + (row[4] or 0)
+        return {
+            'response': {'translation': row[0], 'notes': row[1], 'new_terms': json.loads(row[2] or '[]')},
+            'tokens': row[3] or 0,
+            'repair_tokens': row[4] or 0,
+        }
+
+    def put(self, key: str, response_data: Dict[str, Any], tokens: int, repair_tokens: int = 0) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (
+                    key,
+                    response_data.get('translation', ''),
+                    response_data.get('notes', ''),
+                    json.dumps(response_data.get('new_terms', []), ensure_ascii=False),
+                    int(tokens or 0),
+                    int(repair_tokens or 0),
+                    now,
+                    now,
+                ),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        if self.max_entries <= 0:
+            return
+        count = self._conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                'DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_access ASC LIMIT ?)',
+                (overflow,),
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'tokens_saved': self.tokens_saved,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class PromptCacheStats:
+    """
+    平台侧前缀缓存的命中统计：按平台返回的 usage 累计输入 token 与缓存命中 token，
+    分别统计命中与未命中请求的平均延迟；平台未报告缓存字段的请求只计入 unreported。
+    缓存命中部分按 PROMPT_CACHE_PRICE_RATIO（命中价 / 原价）折算节省的输入计费量。
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.unreported = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.hit_requests = 0
+        self._latency = {'hit': 0.0, 'miss': 0.0}
+        self._lock = threading.Lock()
+
+    def record(self, usage: Dict[str, int], latency: float) -> None:
+        with self._lock:
+            self.requests += 1
+            if 'cached_tokens' not in usage:
+                self.unreported += 1
+                return
+            cached = usage['cached_tokens']
+            self.prompt_tokens += usage.get('prompt_tokens', 0)
+            self.cached_tokens += cached
+            if cached > 0:
+                self.hit_requests += 1
+            self._latency['hit' if cached > 0 else 'miss'] += latency
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            reported = self.requests - self.unreported
+            misses = reported - self.hit_requests
+            price_ratio = float(os.getenv('PROMPT_CACHE_PRICE_RATIO', '0.1'))
+            return {
+                'requests': self.requests,
+                'unreported': self.unreported,
+                'prompt_tokens': self.prompt_tokens,
+                'cached_tokens': self.cached_tokens,
+                'hit_rate': round(self.cached_tokens / self.prompt_tokens, 4) if self.prompt_tokens else 0.0,
+                'hit_requests': self.hit_requests,
+                'billable_tokens_saved': int(self.cached_tokens * (1 - price_ratio)),
+                'mean_latency_hit_s': round(self._latency['hit'] / self.hit_requests, 3) if self.hit_requests else None,
+                'mean_latency_miss_s': round(self._latency['miss'] / misses, 3) if misses else None,
+            }
+
+
+_cache: Optional[TranslationCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_translation_cache() -> Optional[TranslationCache]:
+    """
+    进程内共享的缓存实例；TRANSLATION_CACHE 未开启时返回 None。
+    """
+    global _cache
+    if os.getenv('TRANSLATION_CACHE', 'False').lower() not in ('1', 'true', 'yes'):
+        return None
+    path = os.getenv('TRANSLATION_CACHE_PATH') or DEFAULT_CACHE_PATH
+    max_entries = int(os.getenv('TRANSLATION_CACHE_MAX_ENTRIES', '50000'))
+    with _cache_lock:
+        if _cache is None or _cache.path != path:
+            _cache = TranslationCache(path, max_entries)
+        _cache.max_entries = max_entries
+        return _cache
@@ -0,0 +1,348 @@
+import asyncio
+import re
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+# 过载信号分类：只有这三类会触发并发减半
+THROTTLED = "throttled"
+TIMEOUT = "timeout"
+SERVER_ERROR = "server_error"
+OTHER = "other"
+
+_DURATION_PART_RE = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+
+
+def _parse_duration(value: str) -> Optional[float]:
+    """
+    解析限流头中的时长：纯秒数（"2"、"0.5"）、Go 风格时长（"1m30s"、"250ms"）或 HTTP 日期。
+    """
+    value = str(value).strip()
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parts = _DURATION_PART_RE.findall(value)
+    if parts and ''.join(n + u for n, u in parts) == value:
+        scale = {'ms': 0.001, 's': 1.0, 'm': 60.0, 'h': 3600.0}
+        return sum(float(n) * scale[u] for n, u in parts)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except Exception:
+        return None
+
+
+def retry_after_from_headers(headers: Any) -> Optional[float]:
+    """
+    从响应头中取建议等待时长：优先 Retry-After / retry-after-ms，其次 OpenAI 风格的
+    x-ratelimit-reset-requests / x-ratelimit-reset-tokens（余量为 0 时才采用）。
+    """
+    if not headers:
+        return None
+    get = headers.get
+    if get('retry-after-ms'):
+        try:
+            return float(get('retry-after-ms')) / 1000.0
+        except ValueError:
+            pass
+    if get('retry-after'):
+        parsed = _parse_duration(get('retry-after'))
+        if parsed is not None:
+            return parsed
+    waits = []
+    for kind in ('requests', 'tokens'):
+        remaining = get(f'x-ratelimit-remaining-{kind}')
+        reset = get(f'x-ratelimit-reset-{kind}')
+        if reset and remaining is not None and str(remaining).strip() in ('0', '0.0'):
+            parsed = _parse_duration(reset)
+            if parsed is not None:
+                waits.append(parsed)
+    return max(waits) if waits else None
+
+
+def classify_error(exc: BaseException) -> Tuple[str, Optional[float]]:
+    """
+    将调用异常归类为 (信号类型, 建议等待秒数)。兼容 openai、google-genai 与 httpx 的异常。
+    """
+    if isinstance(exc, (asyncio.TimeoutError, TimeoutError)):
+        return TIMEOUT, None
+    name = type(exc).__name__
+    if 'Timeout' in name:
+        return TIMEOUT, None
+    response = getattr(exc, 'response', None)
+    status = getattr(exc, 'status_code', None) or getattr(exc, 'code', None) or getattr(response, 'status_code', None)
+    try:
+        status = int(status) if status is not None else None
+    except (TypeError, ValueError):
+        status = None
+    headers = getattr(response, 'headers', None)
+    if status == 429 or name == 'RateLimitError':
+        return THROTTLED, retry_after_from_headers(headers)
+    if status == 408:
+        return TIMEOUT, None
+    if status is not None and status >= 500:
+        return SERVER_ERROR, retry_after_from_headers(headers)
+    return OTHER, None
+
+
+class AdaptiveConcurrencyController:
+    """
+    AIMD 并发控制：成功且延迟平稳时每满一个窗口（等于当前并发数的成功次数）并发 +1；
+    遇到 429、超时或 5xx 时并发减半，同一冷却期内的多个失败只减一次；
+    带 Retry-After 等限流头时，在建议时长内暂停发放新名额。
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        min_limit: int = 1,
+        max_limit: int = 32,
+        latency_tolerance: float = 1.5,
+        enabled: bool = True,
+    ):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = min(max(initial, self.min_limit), self.max_limit)
+        self.latency_tolerance = latency_tolerance
+        self.enabled = enabled
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self._successes_in_window = 0
+        self._latency_ewma: Optional[float] = None
+        self._baseline: Optional[float] = None
+        self._last_decrease = 0.0
+        self._started = time.monotonic()
+        self._condition: Optional[asyncio.Condition] = None
+        self.history: List[Dict[str, Any]] = []
+        self._record('start')
+
+    def _record(self, reason: str) -> None:
+        self.history.append({
+            'elapsed_s': round(time.monotonic() - self._started, 3),
+            'limit': self.limit,
+            'reason': reason,
+        })
+
+    def _get_condition(self) -> asyncio.Condition:
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    async def acquire(self) -> None:
+        condition = self._get_condition()
+        async with condition:
+            while True:
+                pause = self.paused_until - time.monotonic()
+                if pause > 0:
+                    # 暂停期到点后自行醒来重新检查
+                    try:
+                        await asyncio.wait_for(condition.wait(), timeout=pause)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                if self.in_flight < self.limit:
+                    self.in_flight += 1
+                    return
+                await condition.wait()
+
+    async def release(self) -> None:
+        condition = self._get_condition()
+        async with condition:
+            self.in_flight = max(0, self.in_flight - 1)
+            condition.notify_all()
+
+    def slot(self) -> "_Slot":
+        return _Slot(self)
+
+    def record_success(self, latency: float) -> None:
+        if not self.enabled:
+            return
+        # 短期 EWMA 反映当前延迟；基线取历史较低水平并缓慢上浮，以适应服务端正常波动
+        self._latency_ewma = latency if self._latency_ewma is None else 0.7 * self._latency_ewma + 0.3 * latency
+        if self._baseline is None or self._latency_ewma < self._baseline:
+            self._baseline = self._latency_ewma
+        else:
+            self._baseline *= 1.01
+        if self._latency_ewma > self._baseline * self.latency_tolerance:
+            self._successes_in_window = 0
+            return
+        self._successes_in_window += 1
+        if self._successes_in_window >= self.limit and self.limit < self.max_limit:
+            self._successes_in_window = 0
+            self.limit += 1
+            self._record('increase')
+            self._wake()
+
+    def record_failure(self, exc: BaseException) -> str:
+        kind, retry_after = classify_error(exc)
+        if not self.enabled or kind == OTHER:
+            return kind
+        now = time.monotonic()
+        if retry_after:
+            self.paused_until = max(self.paused_until, now + retry_after)
+        self._successes_in_window = 0
+        # 冷却期取当前延迟基线（至少 1 秒），避免同一波过载的多个失败把并发连续砍到底
+        cooldown = max(1.0, self._latency_ewma or 0.0)
+        if now - self._last_decrease >= cooldown and self.limit > self.min_limit:
+            self.limit = max(self.min_limit, self.limit // 2)
+            self._last_decrease = now
+            self._record(f'decrease:{kind}')
+        return kind
+
+    def _wake(self) -> None:
+        condition = self._condition
+        if condition is None:
+            return
+
+        async def notify():
+            async with condition:
+                condition.notify_all()
+
+        try:
+            asyncio.get_running_loop().create_task(notify())
+        except RuntimeError:
+            pass
+
+    def report(self) -> Dict[str, Any]:
+        limits = [h['limit'] for h in self.history]
+        return {
+            'final_limit': self.limit,
+            'max_limit_reached': max(limits),
+            'min_limit_reached': min(limits),
+            'increases': sum(1 for h in self.history if h['reason'] == 'increase'),
+            'decreases': sum(1 for h in self.history if h['reason'].startswith('decrease')),
+            'history': list(self.history),
+        }
+
+
+class _Slot:
+    def __init__(self, controller: AdaptiveConcurrencyController):
+        self.controller = controller
+
+    async def __aenter__(self):
+        await self.controller.acquire()
+        return self.controller
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.controller.release()
+        return False
+
+
+class RequestHedger:
+    """
+    请求对冲：调用耗时超过已观测延迟的指定分位数时，向备用平台（未配置时为同一平台）再发一份相同请求，
+    先返回有效结果的一方胜出，另一方被取消。对冲请求数不超过主请求数 × budget，
+    被取消或落败一方的消耗计入 extra_tokens。
+    """
+
+    def __init__(
+        self,
+        percentile: float = 95.0,
+        budget: float = 0.05,
+        min_samples: int = 20,
+        window: int = 200,
+        enabled: bool = True,
+    ):
+        self.percentile = min(max(percentile, 0.0), 100.0)
+        self.budget = max(0.0, budget)
+        self.min_samples = max(1, min_samples)
+        self.enabled = enabled
+        self._latencies: deque = deque(maxlen=max(window, self.min_samples))
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.extra_tokens = 0
+
+    def record_latency(self, latency: float) -> None:
+        self._latencies.append(latency)
+
+    def threshold(self) -> Optional[float]:
+        # 样本不足时不对冲，避免冷启动阶段按偶然的快响应误判
+        if len(self._latencies) < self.min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100.0))
+        return ordered[index]
+
+    def _within_budget(self) -> bool:
+        return self.hedged + 1 <= self.requests * self.budget
+
+    async def race(
+        self,
+        primary: Callable[[], Awaitable[Any]],
+        hedge: Callable[[], Awaitable[Any]],
+        accept: Callable[[Any], bool] = lambda result: True,
+        cost: Callable[[Optional[Any]], int] = lambda result: 0,
+    ) -> Any:
+        """
+        执行 primary；超过对冲阈值仍未返回且预算允许时并发执行 hedge。
+        返回先完成且 accept 为真的结果；两者都不被接受时返回其中一个结果，都抛异常时抛出主请求的异常。
+        cost(落败结果) 给出被浪费的 token，落败方被取消时参数为 None。
+        """
+        self.requests += 1
+        first = asyncio.ensure_future(self._timed(primary))
+        delay = self.threshold() if self.enabled else None
+        if delay is None:
+            return await first
+        try:
+            done, _ = await asyncio.wait({first}, timeout=delay)
+        except asyncio.CancelledError:
+            first.cancel()
+            raise
+        if done or not self._within_budget():
+            return await first
+
+        self.hedged += 1
+        second = asyncio.ensure_future(self._timed(hedge))
+        pending = {first, second}
+        results: Dict[asyncio.Future, Any] = {}
+        errors: Dict[asyncio.Future, BaseException] = {}
+        winner: Optional[asyncio.Future] = None
+        try:
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in (t for t in (first, second) if t in done):
+                    if task.exception() is not None:
+                        errors[task] = task.exception()  # type: ignore[assignment]
+                        continue
+                    results[task] = task.result()
+                    if winner is None and accept(results[task]):
+                        winner = task
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        if winner is None and results:
+            # 两份结果都不被接受时仍交给调用方（如走 JSON 修复），优先主请求
+            winner = first if first in results else second
+        if winner is None:
+            raise errors.get(first) or errors[second]
+        if winner is second:
+            self.hedge_wins += 1
+        loser = first if winner is second else second
+        if loser not in errors:
+            # 落败方已完成时按实际结果计费，被取消时由 cost(None) 估算
+            self.extra_tokens += cost(results.get(loser))
+        return results[winner]
+
+    async def _timed(self, call: Callable[[], Awaitable[Any]]) -> Any:
+        started = time.monotonic()
+        result = await call()
+        self.record_latency(time.monotonic() - started)
+        return result
+
+    def report(self) -> Dict[str, Any]:
+        threshold = self.threshold()
+        return {
+            'requests': self.requests,
+            'hedged': self.hedged,
+            'hedge_wins': self.hedge_wins,
+            'hedge_rate': round(self.hedged / self.requests, 4) if self.requests else 0.0,
+            'extra_tokens': self.extra_tokens,
+            'threshold_s': round(threshold, 3) if threshold is not None else None,
+        }
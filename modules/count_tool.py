@@ -1,4 +1,7 @@
 import re
+import os
+import csv
+from typing import Any, Dict
 from markdown import markdown
 from bs4 import BeautifulSoup
 
@@ -11,6 +14,29 @@ def count_md_words(file_path):
     words = re.findall(r'\b\w+\b', text)
     return len(words)
 
+def append_counting_row(csv_path: str, row: Dict[str, Any]) -> None:
+    """
+    向统计表追加一行。新增的统计列会补到已有表头末尾（旧行对应位置留空），
+    表头中已有而本行没有的列（如手工维护的 Capture）同样留空。
+    """
+    header = []
+    rows = []
+    if os.path.isfile(csv_path) and os.path.getsize(csv_path) > 0:
+        with open(csv_path, 'r', newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            header = next(reader, [])
+            rows = list(reader)
+    missing = [key for key in row if key not in header]
+    if missing or not header:
+        header = header + missing
+        with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            for r in rows:
+                writer.writerow(r + [''] * (len(header) - len(r)))
+    with open(csv_path, 'a', newline='', encoding='utf-8') as f:
+        csv.writer(f).writerow([row.get(key, '') for key in header])
+
 def count_structured_paragraphs(
     file_path: str,
     max_chunk_size: int = 600,
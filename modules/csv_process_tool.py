@@ -1,5 +1,7 @@
-import csv, os, re, time
-from typing import Dict
+import csv, os, re, json, time, hashlib, threading, functools, bisect, asyncio
+from concurrent.futures import ProcessPoolExecutor
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
 from nltk.stem import WordNetLemmatizer
 from nltk.tokenize import word_tokenize
 import nltk
@@ -54,6 +56,7 @@ def validate_csv_file(path):
         print("错误：文件不是CSV格式")
         return False, original_path
     
+    terms_dict = {}
     try:
         with open(path, 'r', encoding='utf-8-sig') as f:
             csv_reader = csv.reader(f)
@@ -72,10 +75,15 @@ def validate_csv_file(path):
                 if not definition.strip():
                     print(f"错误：第 {row_num} 行第二列（定义）为空")
                     return False, original_path
-        return True, path
+                terms_dict[term.strip()] = definition.strip()
     except Exception as e:
         print(f"错误：读取CSV文件时出错：{e}")
         return False, original_path
+    # 校验时顺带生成术语索引（已有同内容的索引时跳过），后续加载无需再次规范化术语
+    index_path = glossary_index_path(path) if _glossary_index_enabled() else None
+    if index_path is not None and not os.path.exists(index_path):
+        _try_save_glossary_index(path, GlossaryMatcher(terms_dict))
+    return True, path
 
 
 def load_terms_dict(csv_file_path: str) -> Dict[str, str]:
@@ -91,7 +99,120 @@ def load_terms_dict(csv_file_path: str) -> Dict[str, str]:
                     terms_dict[eng_term] = chi_term
     return terms_dict
 
+# 与 NLTK Treebank 分词在匹配相关部分保持一致：连字符/下划线词整体保留，
+# 否定缩写与所有格等附着成分单独切分，数字中的小数点与千分位不拆开
+_TOKEN_RE = re.compile(r"""
+    \w+(?=n't\b)
+  | n't\b
+  | '(?:s|re|ve|ll|d|m)\b
+  | \d+(?:[.,]\d+)+
+  | \w+(?:-\w+)*
+  | [^\w\s]
+""", re.IGNORECASE | re.VERBOSE)
+
+class TextNormalizer:
+    """
+    术语匹配用的文本规范化引擎：进程内只初始化一次，默认使用预编译正则分词，
+    词形还原结果保存在有界 LRU 缓存中，跨段落、跨文档共享。
+    """
+
+    def __init__(self, cache_size: int = None):
+        if cache_size is None:
+            cache_size = int(os.getenv('CSV_MATCH_LEMMA_CACHE', '50000'))
+        self._lemmatizer = None
+        self._lemmatizer_available = True
+        self._init_lock = threading.Lock()
+        self.lemma = functools.lru_cache(maxsize=cache_size)(self._lemmatize)
+
+    def _get_lemmatizer(self):
+        if self._lemmatizer is None and self._lemmatizer_available:
+            with self._init_lock:
+                if self._lemmatizer is None:
+                    self._lemmatizer = WordNetLemmatizer()
+        return self._lemmatizer
+
+    def _lemmatize(self, lower: str) -> str:
+        if not self._lemmatizer_available:
+            return lower
+        try:
+            return self._get_lemmatizer().lemmatize(lower, 'n')
+        except LookupError:
+            # 缺少 wordnet 数据时只探测一次，之后直接跳过词形还原
+            self._lemmatizer_available = False
+            return lower
+        except Exception:
+            return lower
+
+    def tokenize(self, text: str) -> List[str]:
+        return _TOKEN_RE.findall(text)
+
+    def normalize(self, text: str) -> str:
+        lemma = self.lemma
+        out_tokens = []
+        for token in _TOKEN_RE.findall(text):
+            lower = token.lower()
+            if lower.isalpha() and not (token.isupper() or token[0].isupper()):
+                out_tokens.append(lemma(lower))
+            else:
+                out_tokens.append(lower)
+        return ' '.join(out_tokens)
+
+    def cache_info(self):
+        return self.lemma.cache_info()
+
+_text_normalizer = None
+_text_normalizer_lock = threading.Lock()
+
+def get_text_normalizer() -> TextNormalizer:
+    global _text_normalizer
+    if _text_normalizer is None:
+        with _text_normalizer_lock:
+            if _text_normalizer is None:
+                _text_normalizer = TextNormalizer()
+    return _text_normalizer
+
 def preprocess_text(text: str) -> str:
+    """
+    术语匹配前的文本规范化。CSV_MATCH_NORMALIZER 可选：
+    fast（默认，预编译正则 + LRU 词形缓存）、nltk（原 NLTK 流程）、
+    parity（两者都跑，输出不一致时打印差异，返回 NLTK 结果）。
+    """
+    mode = os.getenv('CSV_MATCH_NORMALIZER', 'fast')
+    if mode == 'nltk':
+        return preprocess_text_nltk(text)
+    fast = get_text_normalizer().normalize(text)
+    if mode == 'parity':
+        reference = preprocess_text_nltk(text)
+        if _word_tokens(fast) != _word_tokens(reference):
+            print(f'NORMALIZER_MISMATCH fast={fast!r} nltk={reference!r}')
+        return reference
+    return fast
+
+def _word_tokens(normalized: str) -> List[str]:
+    # 只有含字母数字的词元影响术语匹配，标点的写法差异（如 `` 与 "）不计入
+    return [t for t in normalized.split() if any(c.isalnum() for c in t)]
+
+def check_normalizer_parity(texts: Iterable[str]) -> dict:
+    """
+    对比快速规范化与 NLTK 流程在给定语料上的输出，返回一致率与不一致样例。
+    """
+    normalizer = get_text_normalizer()
+    total = 0
+    mismatches = []
+    for text in texts:
+        total += 1
+        fast = normalizer.normalize(text)
+        reference = preprocess_text_nltk(text)
+        if _word_tokens(fast) != _word_tokens(reference):
+            mismatches.append({'text': text, 'fast': fast, 'nltk': reference})
+    return {
+        'total': total,
+        'mismatches': len(mismatches),
+        'parity': (total - len(mismatches)) / total if total else 1.0,
+        'samples': mismatches[:20],
+    }
+
+def preprocess_text_nltk(text: str) -> str:
     lemmatizer = WordNetLemmatizer()
     try:
         tokens = word_tokenize(text)
@@ -113,88 +234,232 @@ def preprocess_text(text: str) -> str:
             out_tokens.append(lower)
     return ' '.join(out_tokens)
 
-def find_matching_terms(paragraph: str, terms_dict: Dict[str, str]) -> Dict[str, str]:
-    t0 = time.perf_counter()
-    processed_paragraph = preprocess_text(paragraph)
-    lower_text = processed_paragraph.lower()
-    matches = {}
-    engine = os.getenv('CSV_MATCH_ENGINE', 'aho')
-    if engine == 'aho':
+_ARTICLES = ('the', 'a', 'an')
+_LEADING_ARTICLE_RE = re.compile(r'^\s*(?:the|a|an)\s+', re.IGNORECASE)
+_WHITESPACE_RE = re.compile(r'\s+')
+
+def _normalize_term(eng_term: str) -> str:
+    s = _LEADING_ARTICLE_RE.sub('', eng_term)
+    return _WHITESPACE_RE.sub(' ', s).strip().lower()
+
+def _plural_of(base: str) -> str:
+    if len(base) <= 1:
+        return ''
+    if base.endswith('y') and not base[-2] in 'aeiou':
+        return base[:-1] + 'ies'
+    if base.endswith(('s', 'sh', 'ch', 'x', 'z')):
+        return base + 'es'
+    return base + 's'
+
+def glossary_fingerprint(terms_dict: Dict[str, str]) -> str:
+    # 顺序敏感：同一规范化键后写入的术语会覆盖先写入的，顺序不同即视为不同术语表
+    h = hashlib.sha1()
+    for eng_term, chi_term in terms_dict.items():
+        h.update(eng_term.encode('utf-8'))
+        h.update(b'\x1f')
+        h.update(chi_term.encode('utf-8'))
+        h.update(b'\x1e')
+    return h.hexdigest()
+
+class GlossaryMatcher:
+    """
+    术语表匹配器：每个术语表只构建一次索引（单复数、冠词变体与 Aho-Corasick 自动机），
+    之后每个段落的匹配只需一次自动机扫描。
+    """
+
+    def __init__(self, terms_dict: Dict[str, str], fingerprint: str = None):
+        self.terms_dict = dict(terms_dict)
+        self.fingerprint = fingerprint or glossary_fingerprint(self.terms_dict)
+        # (原术语, 译名, 规范化词根, 复数形式)
+        self._entries = []
+        for eng_term, chi_term in self.terms_dict.items():
+            base = _normalize_term(eng_term)
+            if base:
+                self._entries.append((eng_term, chi_term, base, _plural_of(base)))
+        self._automaton = None
+        # 正则回退引擎：(编译后的字典树正则, {变体: 词条序号})，惰性构建
+        self._regex = None
+        # 模糊匹配删除邻域索引，按编辑距离惰性构建：{k: (单词术语列表, {删除变体: [术语序号, ...]})}
+        self._fuzzy_index = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.terms_dict)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        # 模糊索引体积大且可快速重建，不随索引文件/进程池序列化
+        state['_fuzzy_index'] = {}
+        state['_regex'] = None
+        return state
+
+    def __setstate__(self, state):
+        # 旧版本序列化的状态可能缺少后加的惰性字段，先填默认值
+        self._automaton = None
+        self._regex = None
+        self._fuzzy_index = {}
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_index(cls, terms_dict: Dict[str, str], entries, fingerprint: str) -> "GlossaryMatcher":
+        # 由索引文件中已规范化的词条恢复，跳过逐条词形还原；自动机由调用方按需重建
+        matcher = cls.__new__(cls)
+        matcher.__setstate__({
+            'terms_dict': dict(terms_dict),
+            'fingerprint': fingerprint,
+            '_entries': [tuple(entry) for entry in entries],
+        })
+        return matcher
+
+    def prepare(self) -> "GlossaryMatcher":
+        # 预先构建自动机（如序列化到磁盘前）；ahocorasick 不可用时保持惰性
         try:
-            import ahocorasick
-            A = ahocorasick.Automaton()
-            for eng_term, chi_term in terms_dict.items():
-                s = re.sub(r'^\s*(?:the|a|an)\s+', '', eng_term, flags=re.IGNORECASE)
-                raw_base = re.sub(r'\s+', ' ', s).strip()
-                base = raw_base.lower()
-                if not base:
-                    continue
-                A.add_word(base, (eng_term, chi_term, len(base)))
-                
-                # Add plural forms to automaton
-                if len(base) > 1:
-                    plurals = []
-                    if base.endswith('y') and not base[-2] in 'aeiou':
-                        plurals.append(base[:-1] + 'ies')
-                    elif base.endswith(('s', 'sh', 'ch', 'x', 'z')):
-                        plurals.append(base + 'es')
-                    else:
-                        plurals.append(base + 's')
-                    
-                    for pl in plurals:
-                        A.add_word(pl, (eng_term, chi_term, len(pl)))
-                        for art in ('the', 'a', 'an'):
-                            w_pl = f"{art} {pl}"
-                            A.add_word(w_pl, (eng_term, chi_term, len(w_pl)))
-
-                for art in ('the', 'a', 'an'):
-                    w = f"{art} {base}"
-                    A.add_word(w, (eng_term, chi_term, len(w)))
-            A.make_automaton()
-            for end_idx, val in A.iter(lower_text):
-                eng_term, chi_term, mlen = val
-                start_idx = end_idx - mlen + 1
-                s = start_idx
-                e = end_idx
-                prev_c = lower_text[s-1] if s > 0 else ' '
-                next_c = lower_text[e+1] if e+1 < len(lower_text) else ' '
-                if not (prev_c.isalnum() or prev_c == '_') and not (next_c.isalnum() or next_c == '_'):
-                    matches[eng_term] = chi_term
+            if self._entries:
+                self._get_automaton()
         except Exception:
-            engine = 'regex'
-    if engine == 'regex':
-        optional_articles = r'(?:\b(?:the|a|an)\s+)?'
-        for eng_term, chi_term in terms_dict.items():
-            s = re.sub(r'^\s*(?:the|a|an)\s+', '', eng_term, flags=re.IGNORECASE)
-            base = re.sub(r'\s+', ' ', s).strip().lower()
-            if not base:
-                continue
-            
-            # Construct regex for singular and plural
-            escaped_base = re.escape(base)
-            
-            # Simple pluralization logic for regex
-            if base.endswith('y') and not base[-2] in 'aeiou':
-                plural_base = base[:-1] + 'ies'
-            elif base.endswith(('s', 'sh', 'ch', 'x', 'z')):
-                plural_base = base + 'es'
+            pass
+        return self
+
+    def _get_automaton(self):
+        if self._automaton is None:
+            with self._lock:
+                if self._automaton is None:
+                    self._automaton = self._build_automaton()
+        return self._automaton
+
+    def _variant_table(self) -> Dict[str, int]:
+        # 词根/复数变体 -> 词条序号；不同术语的变体相同时（如 "HOPKINS" 与 "Hopkins"）后出现者覆盖前者，
+        # 自动机与正则两个引擎共用这张表，保证命中结果一致
+        variants: Dict[str, int] = {}
+        for idx, (_, _, base, plural) in enumerate(self._entries):
+            variants[base] = idx
+            if plural:
+                variants[plural] = idx
+        return variants
+
+    def _build_automaton(self):
+        import ahocorasick
+        # 只登记词根与复数形式：冠词变体（the/a/an + 词）命中时词根本身必然也以词边界命中，
+        # 无需额外登记；值为 (词条序号 << 1) | 是否复数，便于紧凑序列化
+        A = ahocorasick.Automaton(ahocorasick.STORE_INTS)
+        for variant, idx in self._variant_table().items():
+            A.add_word(variant, (idx << 1) | (variant != self._entries[idx][2]))
+        A.make_automaton()
+        return A
+
+    def match(self, paragraph: str) -> Dict[str, str]:
+        t0 = time.perf_counter()
+        matches = self.match_normalized(preprocess_text(paragraph).lower())
+        t1 = time.perf_counter()
+        if os.getenv('CSV_MATCH_DEBUG') == '1':
+            print(f'MATCH_TIME={t1 - t0:.6f}s MATCHES={len(matches)} TERMS={len(self.terms_dict)}')
+        return matches
+
+    def match_normalized(self, lower_text: str) -> Dict[str, str]:
+        matches = _rank_hits(self._iter_hits(lower_text))
+        if os.getenv('CSV_MATCH_FUZZY', '0') == '1':
+            self._match_fuzzy(lower_text, matches)
+        return matches
+
+    def match_batch(self, paragraphs: List[str]) -> List[Dict[str, str]]:
+        return self.match_batch_normalized([preprocess_text(p).lower() for p in paragraphs])
+
+    def match_batch_normalized(self, lower_texts: List[str]) -> List[Dict[str, str]]:
+        """
+        整篇文档一次扫描：各段以换行拼接后只跑一遍匹配引擎，再按命中位置的偏移量映射回所属段落。
+        """
+        if not lower_texts:
+            return []
+        starts = []
+        offset = 0
+        for text in lower_texts:
+            starts.append(offset)
+            offset += len(text) + 1
+        hits_per_segment = [[] for _ in lower_texts]
+        for hit in self._iter_hits('\n'.join(lower_texts)):
+            hits_per_segment[bisect.bisect_right(starts, hit[0]) - 1].append(hit)
+        results = [_rank_hits(hits) for hits in hits_per_segment]
+        if os.getenv('CSV_MATCH_FUZZY', '0') == '1':
+            for text, matches in zip(lower_texts, results):
+                self._match_fuzzy(text, matches)
+        return results
+
+    def _iter_hits(self, lower_text: str) -> Iterator[Tuple[int, int, str, str]]:
+        # 逐个产出 (命中起始偏移, 结束偏移, 原术语, 译名)；aho 不可用时回退到正则
+        engine = os.getenv('CSV_MATCH_ENGINE', 'aho')
+        if engine == 'aho':
+            try:
+                hits = list(self._iter_aho_hits(lower_text))
+            except Exception:
+                engine = 'regex'
             else:
-                plural_base = base + 's'
-            
-            escaped_plural = re.escape(plural_base)
-            
-            # Match either singular or plural, with optional articles
-            pattern = rf'{optional_articles}\b(?:{escaped_base}|{escaped_plural})\b'
-            
-            if re.search(pattern, lower_text, re.IGNORECASE):
-                matches[eng_term] = chi_term
-    if os.getenv('CSV_MATCH_FUZZY', '0') == '1':
+                yield from hits
+        if engine == 'regex':
+            yield from self._iter_regex_hits(lower_text)
+
+    def _iter_aho_hits(self, lower_text: str) -> Iterator[Tuple[int, int, str, str]]:
+        if not self._entries:
+            return
+        A = self._get_automaton()
+        entries = self._entries
+        for end_idx, val in A.iter(lower_text):
+            eng_term, chi_term, base, plural = entries[val >> 1]
+            mlen = len(plural) if val & 1 else len(base)
+            s = end_idx - mlen + 1
+            e = end_idx
+            prev_c = lower_text[s-1] if s > 0 else ' '
+            next_c = lower_text[e+1] if e+1 < len(lower_text) else ' '
+            if not (prev_c.isalnum() or prev_c == '_') and not (next_c.isalnum() or next_c == '_'):
+                yield s, e + 1, eng_term, chi_term
+
+    def _iter_regex_hits(self, lower_text: str) -> Iterator[Tuple[int, int, str, str]]:
+        if not self._entries:
+            return
+        pattern, variants = self._get_regex()
+        entries = self._entries
+        for m in pattern.finditer(lower_text):
+            # 命中的是该位置满足词边界的最长术语；同一位置起始的较短术语必为其前缀，
+            # 逐个检查前缀中的词边界切分点即可补全（与自动机引擎的重叠命中语义一致）
+            start = m.start()
+            hit = m.group(1)
+            for end in range(1, len(hit) + 1):
+                if end < len(hit) and _is_word_char(hit[end]):
+                    continue
+                idx = variants.get(hit[:end])
+                if idx is not None:
+                    yield start, start + end, entries[idx][0], entries[idx][1]
+
+    def _get_regex(self):
+        if self._regex is None:
+            with self._lock:
+                if self._regex is None:
+                    self._regex = self._build_regex()
+        return self._regex
+
+    def _build_regex(self):
+        # 单复数变体合成一个字典树优化的交替式，整段只需一次 finditer；
+        # 冠词变体无需展开：冠词 + 词命中时词根本身也会命中
+        variants = self._variant_table()
+        body = _trie_regex(variants)
+        pattern = re.compile(rf'(?<!\w)(?=({body})(?!\w))')
+        return pattern, variants
+
+    def _match_fuzzy(self, lower_text: str, matches: Dict[str, str]) -> None:
         try:
             ed = int(os.getenv('CSV_MATCH_FUZZY_ED', '1'))
         except Exception:
             ed = 1
+        if os.getenv('CSV_MATCH_FUZZY_ENGINE', 'index') == 'scan':
+            self._match_fuzzy_scan(lower_text, matches, ed)
+        else:
+            self._match_fuzzy_index(lower_text, matches, ed)
+
+    def _match_fuzzy_scan(self, lower_text: str, matches: Dict[str, str], ed: int) -> None:
+        # 原始实现：逐术语 × 逐词元比较，O(术语数 × 词元数)，保留用于对照与基准测试
         tokens = lower_text.split()
-        for eng_term, chi_term in terms_dict.items():
+        for eng_term, chi_term in self.terms_dict.items():
             if ' ' in eng_term:
                 continue
             if eng_term in matches:
@@ -204,10 +469,399 @@ def find_matching_terms(paragraph: str, terms_dict: Dict[str, str]) -> Dict[str,
                 if _levenshtein_leq(t, w, ed):
                     matches[eng_term] = chi_term
                     break
-    t1 = time.perf_counter()
-    if os.getenv('CSV_MATCH_DEBUG') == '1':
-        print(f'MATCH_TIME={t1 - t0:.6f}s MATCHES={len(matches)} TERMS={len(terms_dict)}')
-    return matches
+
+    def _match_fuzzy_index(self, lower_text: str, matches: Dict[str, str], ed: int) -> None:
+        # SymSpell 式删除邻域：术语与词元各自删除至多 ed 个字符后有交集，才可能在编辑距离 ed 之内，
+        # 候选再用 _levenshtein_leq 精确校验；结果与逐项扫描一致，按术语表顺序写入
+        terms, index = self._get_fuzzy_index(ed)
+        hits = set()
+        for w in set(lower_text.split()):
+            candidates = set()
+            for variant in _deletes(w, ed):
+                ids = index.get(variant)
+                if ids:
+                    candidates.update(ids)
+            for idx in candidates:
+                if idx not in hits and _levenshtein_leq(terms[idx][1], w, ed):
+                    hits.add(idx)
+        for idx in sorted(hits):
+            eng_term = terms[idx][0]
+            if eng_term not in matches:
+                matches[eng_term] = self.terms_dict[eng_term]
+
+    def _get_fuzzy_index(self, ed: int) -> Tuple[List[Tuple[str, str]], Dict[str, List[int]]]:
+        built = self._fuzzy_index.get(ed)
+        if built is None:
+            with self._lock:
+                built = self._fuzzy_index.get(ed)
+                if built is None:
+                    # 参与模糊匹配的单词术语：(原术语, 小写形式)，顺序与术语表一致
+                    terms = [(eng_term, eng_term.lower()) for eng_term in self.terms_dict if ' ' not in eng_term]
+                    index = {}
+                    for idx, (_, t) in enumerate(terms):
+                        for variant in _deletes(t, ed):
+                            index.setdefault(variant, []).append(idx)
+                    built = (terms, index)
+                    self._fuzzy_index[ed] = built
+        return built
+
+def _rank_hits(hits: Iterable[Tuple[int, int, str, str]]) -> Dict[str, str]:
+    """
+    将命中位置汇总为 {原术语: 译名}，按首次出现先后排列；设置了提示词术语预算（GLOSSARY_TOKEN_BUDGET）时
+    改按出现次数降序排列（次数相同按首次出现先后），以便截断时优先保留高频术语。
+    CSV_MATCH_LONGEST=1 时按“最左最长”保留互不重叠的命中：匹配到 "Night City" 时，
+    被其覆盖的 "Night"、"City" 不再计入（它们在别处独立出现时仍会命中）。
+    """
+    # 统一按起始位置（同位置时长者优先）排序，两个引擎的输出顺序一致
+    hits = sorted(hits, key=lambda h: (h[0], h[0] - h[1]))
+    if os.getenv('CSV_MATCH_LONGEST', '0') == '1':
+        selected = []
+        last_end = -1
+        for hit in hits:
+            if hit[0] >= last_end:
+                selected.append(hit)
+                last_end = hit[1]
+        hits = selected
+    counts: Dict[str, int] = {}
+    translations: Dict[str, str] = {}
+    for _, _, eng_term, chi_term in hits:
+        counts[eng_term] = counts.get(eng_term, 0) + 1
+        translations[eng_term] = chi_term
+    if int(os.getenv('GLOSSARY_TOKEN_BUDGET') or 0) <= 0:
+        return translations
+    return {eng_term: translations[eng_term] for eng_term in sorted(counts, key=lambda k: -counts[k])}
+
+def _is_word_char(c: str) -> bool:
+    return c.isalnum() or c == '_'
+
+def _trie_regex(words: Iterable[str]) -> str:
+    # 将词表压缩为字典树形式的正则：公共前缀只匹配一次，可选后缀贪婪，优先尝试更长的术语
+    trie: dict = {}
+    for w in words:
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[''] = None
+
+    def build(node: dict) -> str:
+        alts = [re.escape(ch) + build(child) for ch, child in node.items() if ch]
+        if not alts:
+            return ''
+        if len(alts) == 1 and '' not in node:
+            return alts[0]
+        group = '(?:' + '|'.join(alts) + ')'
+        return group + '?' if '' in node else group
+
+    return build(trie)
+
+def _deletes(word: str, k: int) -> set:
+    # word 删除至多 k 个字符得到的全部变体（含自身）
+    result = {word}
+    frontier = {word}
+    for _ in range(max(0, k)):
+        next_frontier = set()
+        for w in frontier:
+            for i in range(len(w)):
+                next_frontier.add(w[:i] + w[i+1:])
+        next_frontier -= result
+        result |= next_frontier
+        frontier = next_frontier
+    return result
+
+_MATCHER_CACHE_SIZE = 8
+_matcher_cache: "OrderedDict[str, GlossaryMatcher]" = OrderedDict()
+_matcher_cache_lock = threading.Lock()
+
+def get_glossary_matcher(terms_dict: Dict[str, str]) -> GlossaryMatcher:
+    """
+    按术语表指纹返回共享的 GlossaryMatcher；相同内容的术语表（CLI、WebUI 多个任务）复用同一索引。
+    """
+    if isinstance(terms_dict, GlossaryMatcher):
+        return terms_dict
+    fingerprint = glossary_fingerprint(terms_dict)
+    with _matcher_cache_lock:
+        matcher = _matcher_cache.get(fingerprint)
+        if matcher is not None:
+            _matcher_cache.move_to_end(fingerprint)
+            return matcher
+    return _register_matcher(GlossaryMatcher(terms_dict, fingerprint=fingerprint))
+
+def _register_matcher(matcher: GlossaryMatcher) -> GlossaryMatcher:
+    with _matcher_cache_lock:
+        matcher = _matcher_cache.setdefault(matcher.fingerprint, matcher)
+        _matcher_cache.move_to_end(matcher.fingerprint)
+        while len(_matcher_cache) > _MATCHER_CACHE_SIZE:
+            _matcher_cache.popitem(last=False)
+    return matcher
+
+# 索引内容（词条的规范化方式、字段）变化时递增，旧索引随之失效
+GLOSSARY_INDEX_VERSION = 2
+
+def _glossary_index_enabled() -> bool:
+    return os.getenv('GLOSSARY_INDEX', 'True').lower() in ('1', 'true', 'yes')
+
+def glossary_index_path(csv_path: str) -> Optional[str]:
+    """
+    术语索引保存在私有缓存目录（GLOSSARY_INDEX_DIR）中，按术语表内容哈希命名：
+    不与术语表放在同一目录（如 WebUI 的上传目录），内容变化即自动对应到新文件。
+    """
+    if not os.path.exists(csv_path):
+        return None
+    index_dir = os.getenv('GLOSSARY_INDEX_DIR', os.path.join('data', 'glossary_index'))
+    return os.path.join(index_dir, f"{_file_sha256(csv_path)}.v{GLOSSARY_INDEX_VERSION}.json")
+
+def _file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _is_str_list(value, length: int) -> bool:
+    return isinstance(value, list) and len(value) == length and all(isinstance(v, str) for v in value)
+
+def _load_index_matcher(index_path: str) -> Optional["GlossaryMatcher"]:
+    """
+    读取 JSON 术语索引并逐项校验结构；索引只含数据，损坏或被篡改时退回解析 CSV。
+    """
+    try:
+        with open(index_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if not isinstance(data, dict) or data.get('version') != GLOSSARY_INDEX_VERSION:
+            return None
+        terms, entries = data.get('terms'), data.get('entries')
+        if not isinstance(terms, list) or not all(_is_str_list(t, 2) for t in terms):
+            return None
+        if not isinstance(entries, list) or not all(_is_str_list(e, 4) for e in entries):
+            return None
+        terms_dict = dict(terms)
+        # 指纹与词条对应的术语一并核对，避免索引与术语表内容不一致
+        fingerprint = glossary_fingerprint(terms_dict)
+        if data.get('fingerprint') != fingerprint or any(terms_dict.get(e[0]) != e[1] for e in entries):
+            return None
+    except Exception:
+        return None
+    return GlossaryMatcher.from_index(terms_dict, entries, fingerprint).prepare()
+
+def _try_save_glossary_index(csv_path: str, matcher: GlossaryMatcher) -> Optional[str]:
+    if not _glossary_index_enabled():
+        return None
+    try:
+        return save_glossary_index(csv_path, matcher)
+    except Exception as e:
+        print(f"警告：术语索引保存失败：{e}")
+        return None
+
+def save_glossary_index(csv_path: str, matcher: GlossaryMatcher) -> str:
+    """
+    将规范化后的术语词条（词根与复数形式）以 JSON 保存到私有缓存目录，返回索引路径。
+    Aho-Corasick 自动机不落盘，加载索引时由词条重建。
+    """
+    index_path = glossary_index_path(csv_path)
+    os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    data = {
+        'version': GLOSSARY_INDEX_VERSION,
+        'fingerprint': matcher.fingerprint,
+        'terms': list(matcher.terms_dict.items()),
+        'entries': matcher._entries,
+    }
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, index_path)
+    return index_path
+
+def load_glossary_matcher(csv_path: str) -> GlossaryMatcher:
+    """
+    加载术语表对应的 GlossaryMatcher：优先使用缓存目录中与术语表内容对应的索引，
+    否则解析 CSV 并重建索引。结果同时登记到按指纹共享的内存缓存中。
+    """
+    matcher = None
+    index_path = glossary_index_path(csv_path) if _glossary_index_enabled() else None
+    if index_path is not None and os.path.exists(index_path):
+        matcher = _load_index_matcher(index_path)
+    if matcher is None:
+        matcher = GlossaryMatcher(load_terms_dict(csv_path))
+        _try_save_glossary_index(csv_path, matcher)
+    return _register_matcher(matcher)
+
+class TermRegistry:
+    """
+    分层术语表：不可变的基础层（CSV 术语表及其预构建索引）+ 可变的增量层（LLM 新发现的术语）。
+    新增术语时只重建增量层索引；查询与匹配时增量层优先，两层都不复制。
+    """
+
+    def __init__(self, base: Union[Dict[str, str], GlossaryMatcher], new_terms=None):
+        self.base = get_glossary_matcher(base)
+        self.delta: Dict[str, str] = {}
+        self._delta_matcher = None
+        self._lock = threading.Lock()
+        if new_terms:
+            self.add_terms(new_terms)
+
+    def add_terms(self, new_terms) -> int:
+        """
+        合并新术语，支持 {术语: 译名} 字典或 [{'term':..., 'translation':...}] 列表。
+        返回实际发生变化的条目数；无变化时不会触发增量索引重建。
+        """
+        if isinstance(new_terms, dict):
+            items = new_terms.items()
+        else:
+            items = ((str(nt.get('term', '')).strip(), str(nt.get('translation', '')).strip()) for nt in new_terms)
+        changed = 0
+        with self._lock:
+            for term, translation in items:
+                if term and self.delta.get(term) != translation:
+                    self.delta[term] = translation
+                    changed += 1
+            if changed:
+                self._delta_matcher = None
+        return changed
+
+    def get(self, term: str, default=None):
+        if term in self.delta:
+            return self.delta[term]
+        return self.base.terms_dict.get(term, default)
+
+    def __contains__(self, term) -> bool:
+        return term in self.delta or term in self.base.terms_dict
+
+    def _get_delta_matcher(self):
+        with self._lock:
+            if self._delta_matcher is None and self.delta:
+                self._delta_matcher = GlossaryMatcher(self.delta)
+            return self._delta_matcher
+
+    def match(self, paragraph: str, base_matches: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        """
+        base_matches 为预处理阶段整篇批量匹配得到的基础层结果；提供时只对增量层做匹配。
+        """
+        if base_matches is not None and not self.delta:
+            return dict(base_matches)
+        return self.match_normalized(preprocess_text(paragraph).lower(), base_matches)
+
+    def match_normalized(self, lower_text: str, base_matches: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        delta_matcher = self._get_delta_matcher()
+        if base_matches is not None:
+            matches = dict(base_matches)
+        else:
+            matches = self.base.match_normalized(lower_text)
+        if delta_matcher is None:
+            return matches
+        delta_matches = delta_matcher.match_normalized(lower_text)
+        if delta_matches:
+            # 与新术语规范化后相同的基础术语被增量层覆盖
+            shadowed = {_normalize_term(term) for term in delta_matches}
+            matches = {k: v for k, v in matches.items() if _normalize_term(k) not in shadowed}
+            matches.update(delta_matches)
+        return matches
+
+# ---- 进程池匹配后端（可选） ----
+# 规范化与匹配是纯 Python 的 CPU 密集操作，线程里跑会受 GIL 限制。
+# CSV_MATCH_WORKERS > 0 时改由进程池执行：子进程在初始化时拿到预构建的匹配器，
+# fork 启动方式下直接写时复制共享父进程内存，spawn 下则通过序列化索引传入。
+
+_match_pool: Optional[ProcessPoolExecutor] = None
+_match_pool_fingerprint: Optional[str] = None
+_match_pool_lock = threading.Lock()
+_worker_matcher: Optional[GlossaryMatcher] = None
+
+def _match_pool_workers() -> int:
+    try:
+        return max(0, int(os.getenv('CSV_MATCH_WORKERS', '0')))
+    except ValueError:
+        return 0
+
+def _init_match_worker(matcher: GlossaryMatcher) -> None:
+    global _worker_matcher
+    _worker_matcher = matcher
+
+def _pool_normalize_and_match(paragraph: str) -> Tuple[str, Dict[str, str]]:
+    lower_text = preprocess_text(paragraph).lower()
+    return lower_text, _worker_matcher.match_normalized(lower_text)
+
+def _pool_match_batch(paragraphs: List[str]) -> List[Dict[str, str]]:
+    return _worker_matcher.match_batch(paragraphs)
+
+def get_match_pool(matcher: GlossaryMatcher) -> Optional[ProcessPoolExecutor]:
+    """
+    返回绑定该术语表的匹配进程池；未启用（CSV_MATCH_WORKERS<=0）时返回 None。
+    换用另一份术语表时关闭旧池重建，同一时刻只保留一个。
+    """
+    global _match_pool, _match_pool_fingerprint
+    workers = _match_pool_workers()
+    if workers <= 0:
+        return None
+    with _match_pool_lock:
+        if _match_pool is not None and _match_pool_fingerprint == matcher.fingerprint:
+            return _match_pool
+        if _match_pool is not None:
+            _match_pool.shutdown(wait=False, cancel_futures=True)
+        # 先在父进程建好自动机，fork 出的子进程直接共享，不必各自重建
+        matcher.prepare()
+        _match_pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_match_worker, initargs=(matcher,))
+        _match_pool_fingerprint = matcher.fingerprint
+        return _match_pool
+
+def shutdown_match_pool() -> None:
+    global _match_pool, _match_pool_fingerprint
+    with _match_pool_lock:
+        if _match_pool is not None:
+            _match_pool.shutdown(wait=True)
+        _match_pool = None
+        _match_pool_fingerprint = None
+
+async def match_terms_async(registry: TermRegistry, paragraph: str, base_matches: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """
+    协程入口：启用进程池时基础层的规范化与匹配在子进程完成，增量层（通常很小）在当前进程补匹配；
+    否则退回线程执行。
+    """
+    if base_matches is not None and not registry.delta:
+        return dict(base_matches)
+    pool = get_match_pool(registry.base) if base_matches is None else None
+    if pool is None:
+        return await asyncio.to_thread(registry.match, paragraph, base_matches)
+    loop = asyncio.get_running_loop()
+    lower_text, base = await loop.run_in_executor(pool, _pool_normalize_and_match, paragraph)
+    if not registry.delta:
+        return base
+    return registry.match_normalized(lower_text, base)
+
+def find_matching_terms(paragraph: str, terms_dict: Union[Dict[str, str], GlossaryMatcher]) -> Dict[str, str]:
+    return get_glossary_matcher(terms_dict).match(paragraph)
+
+def match_terms_batch(paragraphs: List[str], terms_dict: Union[Dict[str, str], GlossaryMatcher]) -> List[Dict[str, str]]:
+    matcher = get_glossary_matcher(terms_dict)
+    pool = get_match_pool(matcher)
+    if pool is None or len(paragraphs) < 2:
+        return matcher.match_batch(paragraphs)
+    # 按进程数切块，每块在子进程内仍是一次整块扫描
+    chunk_count = min(_match_pool_workers(), len(paragraphs))
+    size = -(-len(paragraphs) // chunk_count)
+    chunks = [paragraphs[i:i + size] for i in range(0, len(paragraphs), size)]
+    results = []
+    for part in pool.map(_pool_match_batch, chunks):
+        results.extend(part)
+    return results
+
+def summarize_glossary_coverage(matches_per_segment: List[Dict[str, str]], terms_dict: Union[Dict[str, str], GlossaryMatcher]) -> dict:
+    """
+    统计整篇文档的术语覆盖情况：命中术语的段落数、命中的不同术语数及其占术语表的比例。
+    """
+    glossary_size = len(terms_dict)
+    matched = set()
+    segments_with_terms = 0
+    for matches in matches_per_segment:
+        if matches:
+            segments_with_terms += 1
+            matched.update(matches)
+    return {
+        'segments': len(matches_per_segment),
+        'segments_with_terms': segments_with_terms,
+        'distinct_terms': len(matched),
+        'glossary_terms': glossary_size,
+        'coverage': len(matched) / glossary_size if glossary_size else 0.0,
+    }
 
 def _levenshtein_leq(a: str, b: str, k: int) -> bool:
     if a == b:
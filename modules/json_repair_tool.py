@@ -0,0 +1,156 @@
+import ast
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+_VALID_ESCAPES = set('"\\/bfnrtu')
+_CONTROL_ESCAPES = {'\n': '\\n', '\r': '\\r', '\t': '\\t', '\b': '\\b', '\f': '\\f'}
+_CLOSERS = {'{': '}', '[': ']'}
+_FENCE_RE = re.compile(r'^\s*```[\w-]*\s*\n?|\n?\s*```\s*$')
+
+
+def _strip_to_object(text: str) -> Optional[str]:
+    # 去掉代码围栏与前后说明文字，从第一个 { 开始；结尾的截断由 _rebuild 处理
+    text = _FENCE_RE.sub('', text.strip())
+    start = text.find('{')
+    if start == -1:
+        return None
+    return text[start:]
+
+
+def _next_significant(text: str, i: int) -> str:
+    n = len(text)
+    while i < n and text[i] in ' \t\r\n':
+        i += 1
+    return text[i] if i < n else ''
+
+
+def _drop_trailing_comma(out: List[str]) -> None:
+    while out and out[-1] in (' ', '\t', '\r', '\n'):
+        out.pop()
+    if out and out[-1] == ',':
+        out.pop()
+
+
+def _rebuild(text: str) -> Tuple[str, bool]:
+    """
+    单遍扫描重建 JSON 文本：
+    - 字符串内未转义的引号（其后不是 , : } ] 或结尾）补上转义；裸换行等控制字符转义；非法反斜杠转义补成 \\\\
+    - 删除 } ] 前的尾随逗号
+    - 顶层对象闭合后的多余内容丢弃
+    - 输出被截断时回退到最后一个完整元素处，再补齐未闭合的括号
+    返回 (重建后的文本, 是否发生截断回退)。
+    """
+    out: List[str] = []
+    stack: List[str] = []
+    in_string = False
+    string_is_value = False
+    expect_value = False
+    safe: Optional[Tuple[int, List[str]]] = None
+    n = len(text)
+    i = 0
+    while i < n:
+        ch = text[i]
+        if in_string:
+            if ch == '\\':
+                nxt = text[i + 1] if i + 1 < n else ''
+                if nxt in _VALID_ESCAPES and nxt:
+                    out.append(ch + nxt)
+                    i += 2
+                    continue
+                out.append('\\\\')
+            elif ch == '"':
+                if _next_significant(text, i + 1) in (',', '}', ']', ':', ''):
+                    in_string = False
+                    out.append(ch)
+                    if string_is_value:
+                        safe = (len(out), list(stack))
+                else:
+                    out.append('\\"')
+            elif ch in _CONTROL_ESCAPES:
+                out.append(_CONTROL_ESCAPES[ch])
+            elif ord(ch) < 0x20:
+                out.append(f'\\u{ord(ch):04x}')
+            else:
+                out.append(ch)
+            i += 1
+            continue
+
+        if ch == '"':
+            in_string = True
+            # 对象里冒号后的字符串、数组里的字符串是值，其余是键
+            string_is_value = expect_value or (bool(stack) and stack[-1] == '[')
+            expect_value = False
+            out.append(ch)
+        elif ch in '{[':
+            stack.append(ch)
+            expect_value = False
+            out.append(ch)
+        elif ch in '}]':
+            if not stack:
+                break
+            _drop_trailing_comma(out)
+            out.append(_CLOSERS[stack.pop()])
+            expect_value = False
+            if not stack:
+                return ''.join(out), False
+            safe = (len(out), list(stack))
+        elif ch == ':':
+            expect_value = True
+            out.append(ch)
+        elif ch == ',':
+            _drop_trailing_comma(out)
+            safe = (len(out), list(stack))
+            out.append(ch)
+            expect_value = False
+        else:
+            out.append(ch)
+        i += 1
+
+    # 截断：回退到最后一个完整元素
+    if safe is None:
+        return '', True
+    length, stack = safe
+    out = out[:length]
+    _drop_trailing_comma(out)
+    if out and out[-1] == ':':
+        return '', True
+    out.extend(_CLOSERS[c] for c in reversed(stack))
+    return ''.join(out), True
+
+
+def _literal_object(candidate: str) -> Optional[Dict[str, Any]]:
+    # 模型照抄系统提示里的单引号模板时，输出是 Python 字面量而非 JSON
+    if '"' in candidate.split(':', 1)[0] or "'" not in candidate:
+        return None
+    sources = (candidate, re.sub(r'\btrue\b', 'True', re.sub(r'\bfalse\b', 'False', re.sub(r'\bnull\b', 'None', candidate))))
+    for source in sources:
+        try:
+            value = ast.literal_eval(source)
+        except (ValueError, SyntaxError, MemoryError, RecursionError):
+            continue
+        return value if isinstance(value, dict) else None
+    return None
+
+
+def repair_json_object(text: str) -> Optional[Dict[str, Any]]:
+    """
+    本地确定性修复：处理代码围栏、前后说明文字、尾随逗号、字符串内未转义引号与裸换行、
+    单引号字面量以及被截断的数组/对象。无法修复时返回 None，由调用方退回 LLM 修复。
+    """
+    if not text:
+        return None
+    candidate = _strip_to_object(text)
+    if candidate is None:
+        return None
+    literal = _literal_object(candidate)
+    if literal is not None:
+        return literal
+    rebuilt, _ = _rebuild(candidate)
+    if not rebuilt:
+        return None
+    try:
+        value = json.loads(rebuilt)
+    except ValueError:
+        return None
+    return value if isinstance(value, dict) else None
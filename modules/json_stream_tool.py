@@ -0,0 +1,205 @@
+from typing import List, Optional
+
+_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+_SCALAR_CHARS = set('0123456789+-.eEtruefalsn')
+_WHITESPACE = ' \t\r\n'
+
+
+class StreamBreakageError(ValueError):
+    """
+    流式输出已不可能构成合法 JSON（首字符不是对象、括号错配、缺少逗号或冒号等）。
+    抛出后调用方停止增量解码；这类输出多数仍能被本地修复，完整文本交给 repair_translation_response。
+    """
+
+
+class IncrementalTranslationParser:
+    """
+    增量 JSON 扫描器：逐块喂入模型输出，边读边校验结构，并实时解码顶层对象中指定字段（默认 translation）的字符串值。
+    只做结构跟踪，不构建对象；完整文本仍交给 parse_translation_response 做最终校验。
+    允许开头的 ```json 代码围栏；顶层对象闭合后的剩余内容忽略。
+    """
+
+    def __init__(self, field: str = 'translation'):
+        self.field = field
+        self.text_parts: List[str] = []
+        self.position = 0
+        self.done = False
+        self._started = False
+        self._fence: Optional[str] = None
+        # 容器栈：每层为 [类型('{'/'['), 期望状态]
+        self._stack: List[list] = []
+        self._in_string = False
+        self._string_is_key = False
+        self._string_is_target = False
+        self._escape: Optional[str] = None
+        self._key_chars: List[str] = []
+        self._last_key: Optional[str] = None
+        self._in_scalar = False
+        self._high_surrogate: Optional[int] = None
+        self._target_parts: List[str] = []
+
+    @property
+    def text(self) -> str:
+        return ''.join(self.text_parts)
+
+    @property
+    def translation(self) -> str:
+        return ''.join(self._target_parts)
+
+    def feed(self, chunk: str) -> str:
+        """
+        喂入一段输出，返回本段新解码出的目标字段文本（可能为空）。结构损坏时抛出 StreamBreakageError。
+        """
+        if not chunk:
+            return ''
+        self.text_parts.append(chunk)
+        emitted: List[str] = []
+        for ch in chunk:
+            self.position += 1
+            if self.done:
+                continue
+            if not self._started:
+                self._scan_prefix(ch)
+            elif self._in_string:
+                self._scan_string(ch, emitted)
+            else:
+                self._scan_structure(ch)
+        delta = ''.join(emitted)
+        if delta:
+            self._target_parts.append(delta)
+        return delta
+
+    def _fail(self, reason: str):
+        raise StreamBreakageError(f"{reason} at offset {self.position}")
+
+    def _scan_prefix(self, ch: str) -> None:
+        if self._fence is not None:
+            # 围栏内：先读满三个反引号，再跳过语言标记所在的行
+            if len(self._fence) < 3:
+                if ch != '`':
+                    self._fail('malformed code fence')
+                self._fence += ch
+            elif ch == '\n':
+                self._fence = None
+            return
+        if ch in _WHITESPACE:
+            return
+        if ch == '`':
+            self._fence = '`'
+            return
+        if ch != '{':
+            self._fail(f"expected '{{' but got {ch!r}")
+        self._started = True
+        self._stack.append(['{', 'key_or_end'])
+
+    def _scan_structure(self, ch: str) -> None:
+        frame = self._stack[-1]
+        kind, state = frame
+        if self._in_scalar:
+            if ch in _SCALAR_CHARS:
+                return
+            self._in_scalar = False
+            frame[1] = 'comma_or_end'
+            state = 'comma_or_end'
+        if ch in _WHITESPACE:
+            return
+        if state in ('value', 'value_or_end'):
+            if ch == ']' and state == 'value_or_end':
+                self._close(']')
+            elif ch in '{[':
+                frame[1] = 'comma_or_end'
+                self._stack.append([ch, 'key_or_end' if ch == '{' else 'value_or_end'])
+            elif ch == '"':
+                frame[1] = 'comma_or_end'
+                self._begin_string(is_key=False)
+            elif ch in _SCALAR_CHARS:
+                self._in_scalar = True
+            else:
+                self._fail(f"unexpected {ch!r} where a value was expected")
+        elif state in ('key', 'key_or_end'):
+            if ch == '}' and state == 'key_or_end':
+                self._close('}')
+            elif ch == '"':
+                frame[1] = 'colon'
+                self._begin_string(is_key=True)
+            else:
+                self._fail(f"unexpected {ch!r} where a key was expected")
+        elif state == 'colon':
+            if ch != ':':
+                self._fail(f"expected ':' but got {ch!r}")
+            frame[1] = 'value'
+        elif state == 'comma_or_end':
+            if ch == ',':
+                frame[1] = 'key' if kind == '{' else 'value'
+            elif ch in '}]':
+                self._close(ch)
+            else:
+                self._fail(f"expected ',' or closing bracket but got {ch!r}")
+
+    def _close(self, ch: str) -> None:
+        kind = self._stack[-1][0]
+        if (kind == '{') != (ch == '}'):
+            self._fail(f"mismatched {ch!r}")
+        self._stack.pop()
+        if not self._stack:
+            self.done = True
+
+    def _begin_string(self, is_key: bool) -> None:
+        self._in_string = True
+        self._string_is_key = is_key
+        self._key_chars = []
+        # 只有顶层对象中键为目标字段的字符串值才实时输出
+        self._string_is_target = (not is_key and len(self._stack) == 1 and self._last_key == self.field)
+
+    def _scan_string(self, ch: str, emitted: List[str]) -> None:
+        if self._escape is not None:
+            if self._escape == '':
+                if ch == 'u':
+                    self._escape = 'u'
+                    return
+                if ch not in _ESCAPES:
+                    self._fail(f"invalid escape \\{ch}")
+                self._escape = None
+                self._emit(_ESCAPES[ch], emitted)
+                return
+            if ch not in '0123456789abcdefABCDEF':
+                self._fail('invalid \\u escape')
+            self._escape += ch
+            if len(self._escape) == 5:
+                code = int(self._escape[1:], 16)
+                self._escape = None
+                self._emit_code_point(code, emitted)
+            return
+        if ch == '\\':
+            self._escape = ''
+        elif ch == '"':
+            self._in_string = False
+            if self._high_surrogate is not None:
+                self._high_surrogate = None
+                self._emit('�', emitted, raw=True)
+            if self._string_is_key:
+                self._last_key = ''.join(self._key_chars)
+        else:
+            self._emit(ch, emitted)
+
+    def _emit_code_point(self, code: int, emitted: List[str]) -> None:
+        if 0xD800 <= code <= 0xDBFF:
+            if self._high_surrogate is not None:
+                self._emit('�', emitted, raw=True)
+            self._high_surrogate = code
+            return
+        if 0xDC00 <= code <= 0xDFFF and self._high_surrogate is not None:
+            combined = 0x10000 + ((self._high_surrogate - 0xD800) << 10) + (code - 0xDC00)
+            self._high_surrogate = None
+            self._emit(chr(combined), emitted, raw=True)
+            return
+        self._emit(chr(code), emitted)
+
+    def _emit(self, value: str, emitted: List[str], raw: bool = False) -> None:
+        if not raw and self._high_surrogate is not None:
+            self._high_surrogate = None
+            value = '�' + value
+        if self._string_is_key:
+            self._key_chars.append(value)
+        elif self._string_is_target:
+            emitted.append(value)
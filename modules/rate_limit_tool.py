@@ -0,0 +1,154 @@
+import asyncio
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+
+# 令牌桶容量占每分钟配额的比例：桶满时可立即放行的突发量。任意 60 秒内放行量不超过配额 ×（1 + 该比例），
+# 为 1 时启动或空闲后的第一分钟最多可达两倍配额，超出平台按分钟统计的限额
+DEFAULT_BURST = 0.1
+
+
+class TokenBucket:
+    """
+    按分钟配额连续回填的令牌桶。允许余量为负（预约欠账）：
+    请求先扣减令牌，再按欠账计算需要等待的精确时长，后来者排在欠账之后，天然先到先得。
+    容量为配额的 burst 倍（至少 1），桶满时只放行这部分突发，其余按回填速率均匀放行。
+    """
+
+    def __init__(self, per_minute: float, burst: float = DEFAULT_BURST):
+        self.per_minute = float(per_minute)
+        self.capacity = min(self.per_minute, max(1.0, self.per_minute * burst))
+        self.rate = self.per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        # 扣减 amount 并返回距离令牌到位还需等待的秒数；单次请求最多占一分钟的配额，避免超大请求永远等不到
+        self._refill(now)
+        self.level -= min(amount, self.per_minute)
+        return 0.0 if self.level >= 0 else -self.level / self.rate
+
+    def adjust(self, delta: float) -> None:
+        # 对账：实际用量多于预估时继续扣减（可为负，拖后后续请求），少于预估时返还
+        self.level = min(self.capacity, self.level - delta)
+
+
+class Reservation:
+    def __init__(self, limiter: "RateLimiter", tokens: int):
+        self._limiter = limiter
+        self.tokens = tokens
+        self.settled = False
+
+    def settle(self, actual_tokens: Optional[int]) -> None:
+        """
+        用实际 usage 对账；actual_tokens 为空（如请求失败、用量未知）时保留预估值。
+        """
+        if self.settled:
+            return
+        self.settled = True
+        if actual_tokens is not None:
+            self._limiter._adjust_tokens(int(actual_tokens) - self.tokens)
+
+    def cancel(self) -> None:
+        # 等待中被取消、请求未发出时退还预约
+        if self.settled:
+            return
+        self.settled = True
+        self._limiter._refund(self.tokens)
+
+
+class RateLimiter:
+    """
+    RPM + TPM 双桶限流。状态由线程锁保护，可同时服务多个事件循环（CLI 与 WebUI 各自的事件循环）
+    与线程中的同步调用；等待时间按桶的欠账精确计算，到点即醒，不做盲等轮询。
+    rpm/tpm 小于等于 0 表示对应维度不限制；burst 为桶容量占配额的比例（见 DEFAULT_BURST）。
+    """
+
+    def __init__(self, rpm: int = 0, tpm: int = 0, burst: float = DEFAULT_BURST):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = TokenBucket(rpm, burst) if rpm > 0 else None
+        self._tokens = TokenBucket(tpm, burst) if tpm > 0 else None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self._requests is not None or self._tokens is not None
+
+    def headroom(self) -> float:
+        """
+        当前剩余配额占比（0~1，取 RPM 与 TPM 中较紧的一个），不限流时为 1。供多平台路由按余量分配请求。
+        """
+        with self._lock:
+            now = time.monotonic()
+            fractions = []
+            for bucket in (self._requests, self._tokens):
+                if bucket is not None:
+                    bucket._refill(now)
+                    fractions.append(max(0.0, bucket.level) / bucket.capacity)
+        return min(fractions) if fractions else 1.0
+
+    def _reserve(self, tokens: int) -> Tuple[Reservation, float]:
+        with self._lock:
+            now = time.monotonic()
+            wait = 0.0
+            if self._requests is not None:
+                wait = max(wait, self._requests.reserve(1, now))
+            if self._tokens is not None:
+                tokens = min(tokens, int(self._tokens.per_minute))
+                wait = max(wait, self._tokens.reserve(tokens, now))
+        return Reservation(self, tokens), wait
+
+    def _adjust_tokens(self, delta: int) -> None:
+        if self._tokens is None or delta == 0:
+            return
+        with self._lock:
+            self._tokens._refill(time.monotonic())
+            self._tokens.adjust(delta)
+
+    def _refund(self, tokens: int) -> None:
+        with self._lock:
+            now = time.monotonic()
+            if self._requests is not None:
+                self._requests._refill(now)
+                self._requests.adjust(-1)
+            if self._tokens is not None:
+                self._tokens._refill(now)
+                self._tokens.adjust(-tokens)
+
+    async def acquire(self, tokens: int = 0) -> Reservation:
+        reservation, wait = self._reserve(tokens)
+        if wait > 0:
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                reservation.cancel()
+                raise
+        return reservation
+
+    def acquire_sync(self, tokens: int = 0) -> Reservation:
+        reservation, wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return reservation
+
+
+_limiters: Dict[tuple, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(key: str, rpm: int, tpm: int, burst: float = DEFAULT_BURST) -> RateLimiter:
+    """
+    同一平台的配额在进程内共享（CLI 与 WebUI 的多个 LLMService 共用一个限流器）。
+    """
+    registry_key = (key, rpm, tpm, burst)
+    with _limiters_lock:
+        limiter = _limiters.get(registry_key)
+        if limiter is None:
+            limiter = _limiters[registry_key] = RateLimiter(rpm, tpm, burst)
+        return limiter
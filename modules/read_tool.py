@@ -1,5 +1,7 @@
 import re
-from typing import Generator, Tuple, Union
+from typing import Generator, Optional, Tuple, Union
+
+from modules.csv_process_tool import GlossaryMatcher, match_terms_batch, summarize_glossary_coverage
 
 def read_markdown_file(file_path: str) -> str:
     with open(file_path, 'r', encoding='utf-8') as file:
@@ -343,7 +345,8 @@ def read_and_process_structured_paragraphs_to_json(
     file_path: str,
     max_chunk_size: int = 600,
     min_chunk_size: int = 300,
-    preserve_structure: bool = True
+    preserve_structure: bool = True,
+    glossary: Optional[Union[dict, GlossaryMatcher]] = None
 ) -> str:
     """
     读取文档，将其智能切分为段落，并将过短的段落合并，最终生成一个结构化的 JSON 文件。
@@ -357,6 +360,8 @@ def read_and_process_structured_paragraphs_to_json(
         max_chunk_size (int): 合并后段落内容的最大长度阈值。
         min_chunk_size (int): 判断段落是否“过短”的最小长度阈值。
         preserve_structure (bool): 是否保留文档的结构信息（如标题层级）。
+        glossary (dict | GlossaryMatcher, optional): 术语表。提供时对全部段落做一次批量术语匹配，
+            结果写入各段的 matched_terms，并在 JSON 顶层记录 glossary_coverage。
 
     Returns:
         str: 生成的 JSON 文件的绝对路径。如果处理失败或无内容，则返回空字符串。
@@ -472,9 +477,20 @@ def read_and_process_structured_paragraphs_to_json(
         item['paragraph_number'] = idx + 1
         final_data.append(item)
     
-    # 步骤 5: 构造并保存 JSON 文件
-    # 将处理好的段落数据包装在 'text_info' 键下，并写入文件。
+    # 步骤 5: 整篇批量术语匹配（可选）
+    # 所有文本段落一次扫描完成匹配，翻译时无需再做基础术语表匹配；图片段落不参与。
     json_output = {'text_info': final_data}
+    if glossary is not None:
+        text_items = [item for item in final_data if not (item.get('meta_data') and item['meta_data'].get('is_image'))]
+        matches_per_segment = match_terms_batch([item['content'] for item in text_items], glossary)
+        for item in final_data:
+            item['matched_terms'] = {}
+        for item, matches in zip(text_items, matches_per_segment):
+            item['matched_terms'] = matches
+        json_output['glossary_coverage'] = summarize_glossary_coverage(matches_per_segment, glossary)
+
+    # 步骤 6: 构造并保存 JSON 文件
+    # 将处理好的段落数据包装在 'text_info' 键下，并写入文件。
     
     input_dir = os.path.dirname(file_path)
     base_name = os.path.splitext(os.path.basename(file_path))[0]
@@ -0,0 +1,401 @@
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from modules.api_tool import estimate_tokens
+from modules.batch_tool import LocalBatchServer, completion_body, source_paragraph
+
+_SEGMENT_RE = re.compile(r'<segment id="(\d+)">\n(.*?)\n</segment>', re.S)
+LATENCY_DISTRIBUTIONS = ('fixed', 'uniform', 'exponential', 'lognormal')
+
+
+@dataclass
+class SimulationProfile:
+    """
+    模拟平台的行为参数，均可由 MOCK_* 环境变量设置：
+    延迟分布（均值秒数）、输出吞吐（token/秒，0 为不限）、每分钟请求上限与同时在途上限（超出返回 429）、
+    429/5xx 注入比例、JSON 损坏与截断比例、前缀缓存的块大小（字符数，0 为不模拟）。
+    seed 固定时同一提示词第 n 次请求的结果可复现。
+    """
+    seed: int = 0
+    latency: float = 1.0
+    latency_dist: str = 'lognormal'
+    latency_sigma: float = 0.5
+    output_tps: float = 0.0
+    rpm: int = 0
+    max_concurrency: int = 0
+    rate_429: float = 0.0
+    rate_5xx: float = 0.0
+    rate_malformed: float = 0.0
+    rate_truncated: float = 0.0
+    retry_after: float = 1.0
+    cache_block: int = 256
+
+    @classmethod
+    def from_env(cls) -> 'SimulationProfile':
+        def number(name: str, default: float) -> float:
+            return float(os.getenv(f'MOCK_{name}', default) or default)
+
+        dist = os.getenv('MOCK_LATENCY_DIST', cls.latency_dist).lower()
+        if dist not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"MOCK_LATENCY_DIST 只支持 {', '.join(LATENCY_DISTRIBUTIONS)}：{dist}")
+        return cls(
+            seed=int(number('SEED', cls.seed)),
+            latency=number('LATENCY', cls.latency),
+            latency_dist=dist,
+            latency_sigma=number('LATENCY_SIGMA', cls.latency_sigma),
+            output_tps=number('OUTPUT_TPS', cls.output_tps),
+            rpm=int(number('RPM', cls.rpm)),
+            max_concurrency=int(number('MAX_CONCURRENCY', cls.max_concurrency)),
+            rate_429=number('RATE_429', cls.rate_429),
+            rate_5xx=number('RATE_5XX', cls.rate_5xx),
+            rate_malformed=number('RATE_MALFORMED', cls.rate_malformed),
+            rate_truncated=number('RATE_TRUNCATED', cls.rate_truncated),
+            retry_after=number('RETRY_AFTER', cls.retry_after),
+            cache_block=int(number('CACHE_BLOCK', cls.cache_block)),
+        )
+
+
+class SimulatedAPIError(Exception):
+    """
+    模拟的 HTTP 错误；带 status_code 与含 retry-after 头的 response，classify_error 按真实平台的错误归类。
+    """
+
+    def __init__(self, status_code: int, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        headers = {'retry-after': f'{retry_after:g}'} if retry_after else {}
+        self.response = httpx.Response(status_code, headers=headers)
+
+
+@dataclass
+class SimulatedReply:
+    content: str
+    prompt_tokens: int
+    completion_tokens: int
+    latency: float
+    finish_reason: str = 'stop'
+    fault: Optional[str] = None
+    cached_tokens: int = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+
+class TranslationSimulator:
+    """
+    翻译请求模拟器：把提示词中的原文段落作为译文返回（批量提示词按 <segment> 逐段返回 items），
+    按 SimulationProfile 注入延迟、限流与各类故障，token 数按 estimate_tokens 估算。
+    随机数按 (seed, 系统提示词+提示词, 该提示词的第几次请求) 派生，与并发调度顺序无关；
+    只有 rpm 与 max_concurrency 两个上限取决于真实时间。
+    """
+
+    def __init__(self, profile: Optional[SimulationProfile] = None):
+        self.profile = profile or SimulationProfile()
+        self._lock = threading.Lock()
+        self._occurrences: Dict[str, int] = {}
+        self._recent: deque = deque()
+        self._cached_blocks: set = set()
+        self.in_flight = 0
+        self.stats = {'requests': 0, 'ok': 0, '429': 0, '5xx': 0, 'malformed': 0, 'truncated': 0}
+
+    def _rng(self, system_prompt: str, prompt: str) -> random.Random:
+        digest = hashlib.sha256(f'{system_prompt}\x00{prompt}'.encode('utf-8')).hexdigest()
+        with self._lock:
+            n = self._occurrences.get(digest, 0)
+            self._occurrences[digest] = n + 1
+        return random.Random(f'{self.profile.seed}:{digest}:{n}')
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    def _admit(self) -> None:
+        profile = self.profile
+        now = time.monotonic()
+        with self._lock:
+            while self._recent and now - self._recent[0] >= 60:
+                self._recent.popleft()
+            if profile.rpm > 0 and len(self._recent) >= profile.rpm:
+                self.stats['requests'] += 1
+                self.stats['429'] += 1
+                wait = 60 - (now - self._recent[0])
+                raise SimulatedAPIError(429, 'simulated rate limit: requests per minute exceeded', max(wait, 0.001))
+            if profile.max_concurrency > 0 and self.in_flight >= profile.max_concurrency:
+                self.stats['requests'] += 1
+                self.stats['429'] += 1
+                raise SimulatedAPIError(429, 'simulated rate limit: too many concurrent requests', profile.retry_after)
+            self._recent.append(now)
+            self.in_flight += 1
+
+    def _release(self) -> None:
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+
+    def _draw_latency(self, rng: random.Random) -> float:
+        profile = self.profile
+        mean = max(0.0, profile.latency)
+        if mean == 0 or profile.latency_dist == 'fixed':
+            return mean
+        if profile.latency_dist == 'uniform':
+            return rng.uniform(0, 2 * mean)
+        if profile.latency_dist == 'exponential':
+            return rng.expovariate(1 / mean)
+        # 对数正态：参数取使均值等于 latency 的 mu
+        sigma = max(0.0, profile.latency_sigma)
+        return rng.lognormvariate(math.log(mean) - sigma * sigma / 2, sigma)
+
+    def _cached_prefix(self, text: str) -> int:
+        """
+        模拟平台侧前缀缓存：按 cache_block 个字符分块，从开头起与此前请求逐块相同的部分视为命中，返回命中的字符数。
+        """
+        block = self.profile.cache_block
+        if block <= 0:
+            return 0
+        digest = hashlib.sha256()
+        keys = []
+        for end in range(block, len(text) + 1, block):
+            digest.update(text[end - block:end].encode('utf-8'))
+            keys.append(digest.hexdigest())
+        with self._lock:
+            hits = 0
+            while hits < len(keys) and keys[hits] in self._cached_blocks:
+                hits += 1
+            self._cached_blocks.update(keys)
+        return hits * block
+
+    @staticmethod
+    def _render(prompt: str) -> str:
+        segments = _SEGMENT_RE.findall(prompt)
+        if segments:
+            items = [{'id': int(sid), 'translation': text, 'new_terms': []} for sid, text in segments]
+            return json.dumps({'items': items}, ensure_ascii=False)
+        return json.dumps({'translation': source_paragraph(prompt), 'new_terms': []}, ensure_ascii=False)
+
+    @staticmethod
+    def _malform(content: str, rng: random.Random) -> str:
+        # 模拟常见的模型输出毛病：代码围栏、前置说明、尾随逗号、单引号字面量
+        kind = rng.randrange(4)
+        if kind == 0:
+            return f'```json\n{content}\n```'
+        if kind == 1:
+            return f'以下是翻译结果：\n{content}'
+        if kind == 2:
+            return content[:-1] + ',}'
+        return repr(json.loads(content))
+
+    def plan(self, system_prompt: str, prompt: str) -> SimulatedReply:
+        """
+        决定一次请求的结果（不计入限流与在途数，不等待）；注入 429/5xx 时抛出 SimulatedAPIError。
+        """
+        profile = self.profile
+        rng = self._rng(system_prompt or '', prompt)
+        self._count('requests')
+        draw = rng.random()
+        if draw < profile.rate_429:
+            self._count('429')
+            raise SimulatedAPIError(429, 'simulated rate limit', profile.retry_after)
+        if draw < profile.rate_429 + profile.rate_5xx:
+            self._count('5xx')
+            raise SimulatedAPIError(rng.choice((500, 502, 503)), 'simulated server error')
+        content = self._render(prompt)
+        finish_reason, fault = 'stop', None
+        draw = rng.random()
+        if draw < profile.rate_truncated:
+            content = content[:max(1, int(len(content) * rng.uniform(0.3, 0.9)))]
+            finish_reason, fault = 'length', 'truncated'
+        elif draw < profile.rate_truncated + profile.rate_malformed:
+            content = self._malform(content, rng)
+            fault = 'malformed'
+        self._count(fault or 'ok')
+        completion_tokens = estimate_tokens(content)
+        latency = self._draw_latency(rng)
+        if profile.output_tps > 0:
+            latency += completion_tokens / profile.output_tps
+        prompt_tokens = estimate_tokens(system_prompt or '') + estimate_tokens(prompt)
+        text = f'{system_prompt or ""}\x00{prompt}'
+        return SimulatedReply(
+            content=content,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            latency=latency,
+            finish_reason=finish_reason,
+            fault=fault,
+            cached_tokens=min(prompt_tokens, estimate_tokens(text[:self._cached_prefix(text)])),
+        )
+
+    def start(self, system_prompt: str, prompt: str) -> SimulatedReply:
+        """
+        准入（限流与在途上限）并决定结果；成功返回后调用方须在完成时调用 finish()。
+        """
+        self._admit()
+        try:
+            return self.plan(system_prompt, prompt)
+        except BaseException:
+            self._release()
+            raise
+
+    def finish(self) -> None:
+        self._release()
+
+    @staticmethod
+    def chunks(reply: SimulatedReply, chunk_size: int = 16) -> List[str]:
+        return [reply.content[i:i + chunk_size] for i in range(0, len(reply.content), chunk_size)] or ['']
+
+    def complete(self, system_prompt: str, prompt: str, timeout: Optional[float] = None) -> SimulatedReply:
+        """
+        同步完成一次请求；延迟超过 timeout 时像客户端超时一样等满 timeout 后抛出 TimeoutError。
+        """
+        reply = self.start(system_prompt, prompt)
+        try:
+            if timeout is not None and reply.latency > timeout:
+                time.sleep(timeout)
+                raise TimeoutError('simulated request timed out')
+            time.sleep(reply.latency)
+            return reply
+        finally:
+            self.finish()
+
+    async def complete_async(self, system_prompt: str, prompt: str, on_delta: Optional[Callable[[str], None]] = None) -> SimulatedReply:
+        """
+        异步完成一次请求；提供 on_delta 时分块流式回调，延迟均摊到各块。
+        """
+        reply = self.start(system_prompt, prompt)
+        try:
+            if on_delta is None:
+                await asyncio.sleep(reply.latency)
+                return reply
+            chunks = self.chunks(reply)
+            for chunk in chunks:
+                await asyncio.sleep(reply.latency / len(chunks))
+                on_delta(chunk)
+            return reply
+        finally:
+            self.finish()
+
+
+def _split_messages(messages: List[Dict[str, Any]]) -> Tuple[str, str, str]:
+    system_prompt = next((m.get('content') or '' for m in messages if m.get('role') == 'system'), '')
+    prompt = next((m.get('content') or '' for m in reversed(messages) if m.get('role') == 'user'), '')
+    # Kimi 的 partial 模式：助手消息作为输出前缀，返回内容不再包含它
+    last = messages[-1] if messages else {}
+    prefix = (last.get('content') or '') if last.get('role') == 'assistant' and last.get('partial') else ''
+    return system_prompt, prompt, prefix
+
+
+class MockOpenAIServer(LocalBatchServer):
+    """
+    本地 OpenAI 兼容替身服务：/v1/chat/completions（含 SSE 流式）、/v1/models，以及继承的 /v1/files 与 /v1/batches。
+    行为由 TranslationSimulator 决定，注入的 429/5xx 以真实状态码与 retry-after 头返回，
+    便于把任一 OpenAI 兼容平台（如 DEEPSEEK_BASE_URL）指向本服务，压测整条 HTTP 链路。
+    """
+
+    def __init__(self, simulator: Optional[TranslationSimulator] = None, port: int = 0, model: str = 'mock-translator'):
+        self.simulator = simulator or TranslationSimulator(SimulationProfile.from_env())
+        self.model = model
+        super().__init__(responder=self._batch_respond, port=port)
+        self._add_chat_routes()
+
+    def _batch_respond(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        # 批处理不模拟延迟，只注入故障
+        system_prompt, prompt, prefix = _split_messages(body.get('messages', []))
+        reply = self.simulator.plan(system_prompt, prompt)
+        content = reply.content[len(prefix):] if prefix and reply.content.startswith(prefix) else reply.content
+        return completion_body(body.get('model', self.model), content, reply.prompt_tokens, reply.completion_tokens, reply.cached_tokens)
+
+    def _add_chat_routes(self) -> None:
+        from fastapi.responses import JSONResponse, StreamingResponse
+
+        app = self.app
+        simulator = self.simulator
+
+        @app.get('/v1/models')
+        async def list_models():
+            return {'object': 'list', 'data': [{'id': self.model, 'object': 'model', 'created': 0, 'owned_by': 'local'}]}
+
+        @app.post('/v1/chat/completions')
+        async def chat_completions(payload: Dict[str, Any]):
+            system_prompt, prompt, prefix = _split_messages(payload.get('messages', []))
+            model = payload.get('model') or self.model
+            # 准入与故障判定在响应开始前完成，注入的错误以状态码返回
+            try:
+                reply = simulator.start(system_prompt, prompt)
+            except SimulatedAPIError as e:
+                return _error_response(e)
+            if prefix and reply.content.startswith(prefix):
+                reply.content = reply.content[len(prefix):]
+
+            if not payload.get('stream'):
+                try:
+                    await asyncio.sleep(reply.latency)
+                finally:
+                    simulator.finish()
+                body = completion_body(model, reply.content, reply.prompt_tokens, reply.completion_tokens, reply.cached_tokens)
+                body['choices'][0]['finish_reason'] = reply.finish_reason
+                return JSONResponse(body)
+
+            include_usage = bool((payload.get('stream_options') or {}).get('include_usage'))
+            completion_id = f'chatcmpl-{os.urandom(6).hex()}'
+
+            def sse(delta: Optional[Dict[str, Any]], finish_reason=None, usage=None) -> str:
+                chunk: Dict[str, Any] = {
+                    'id': completion_id, 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': model,
+                    'choices': [] if delta is None else [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}],
+                }
+                if usage is not None:
+                    chunk['usage'] = usage
+                return f'data: {json.dumps(chunk, ensure_ascii=False)}\n\n'
+
+            async def events():
+                try:
+                    yield sse({'role': 'assistant', 'content': ''})
+                    chunks = simulator.chunks(reply)
+                    for chunk in chunks:
+                        await asyncio.sleep(reply.latency / len(chunks))
+                        yield sse({'content': chunk})
+                    yield sse({}, finish_reason=reply.finish_reason)
+                    if include_usage:
+                        yield sse(None, usage=completion_body(model, '', reply.prompt_tokens, reply.completion_tokens,
+                                                              reply.cached_tokens)['usage'])
+                    yield 'data: [DONE]\n\n'
+                finally:
+                    # 正常结束或客户端提前断开都释放在途名额
+                    simulator.finish()
+
+            return StreamingResponse(events(), media_type='text/event-stream')
+
+
+def _error_response(error: SimulatedAPIError):
+    from fastapi.responses import JSONResponse
+
+    error_type = 'rate_limit_error' if error.status_code == 429 else 'server_error'
+    headers = {key: value for key, value in error.response.headers.items() if key == 'retry-after'}
+    return JSONResponse({'error': {'message': str(error), 'type': error_type, 'code': error.status_code}},
+                        status_code=error.status_code, headers=headers)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='本地 OpenAI 兼容模拟服务（行为参数见 MOCK_* 环境变量）')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+    server = MockOpenAIServer(port=args.port).start()
+    print(f'模拟服务已启动：{server.base_url}（Ctrl+C 退出）')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
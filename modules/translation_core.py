@@ -1,16 +1,44 @@
 import asyncio
+import os
 import time
 import logging
 import re
-from typing import Dict, Any, List, Optional
+from typing import Callable, Dict, Any, List, Optional, Tuple, Union
 from enum import Enum
 from pydantic import BaseModel
 
-from modules.api_tool import LLMService
-from modules.csv_process_tool import find_matching_terms
+from modules.api_tool import (
+    LLMService,
+    DeadlineExceeded,
+    current_deadline,
+    current_route,
+    estimate_tokens,
+    repair_translation_response,
+)
+from modules.csv_process_tool import GlossaryMatcher, TermRegistry, match_terms_async
+from modules.concurrency_tool import AdaptiveConcurrencyController, RequestHedger, classify_error
+from modules.cache_tool import TranslationCache, get_translation_cache, make_cache_key
+from modules.usage_tool import (
+    HEDGE,
+    LLM_REPAIR,
+    LOCAL_REPAIR,
+    RETRY,
+    REWRITE,
+    TRANSLATE,
+    UsageLedger,
+    UsageRecord,
+    current_ledger,
+    current_stage,
+    merge_usage,
+    split_usage,
+    usage_totals,
+)
 
 logger = logging.getLogger(__name__)
 
+# 可单独设置超时的调用阶段，环境变量为 <阶段>_TIMEOUT（如 TRANSLATE_TIMEOUT）
+STAGES = ('translate', 'repair', 'rewrite')
+
 class WritePolicy(Enum):
     PLAIN_MD = "plain_md"
     ORDERED_JSON = "ordered_json"
@@ -33,20 +61,310 @@ class TranslationResult(BaseModel):
     header_path: List[str]
     success: bool = True
     error: Optional[str] = None
+    cache_hit: bool = False
+    # 本地修复代替 LLM 修复时节省的 token（按一次修复请求的输入与输出估算）
+    repair_tokens_saved: int = 0
+    # 实际完成翻译的平台（路由模式下为被选中的成员平台）
+    provider: Optional[str] = None
+    # 按阶段的用量明细（见 usage_tool.STAGES）；tokens 为各阶段之和，含失败的尝试
+    usage: Dict[str, Dict[str, Any]] = {}
 
 class TranslationCore:
-    def __init__(self, llm_service: LLMService):
+    def __init__(
+        self,
+        llm_service: LLMService,
+        concurrency_controller: Optional[AdaptiveConcurrencyController] = None,
+        translation_cache: Optional[TranslationCache] = None,
+        request_hedger: Optional[RequestHedger] = None,
+        hedge_service: Optional[LLMService] = None,
+        stage_timeouts: Optional[Dict[str, float]] = None,
+        segment_timeout: Optional[float] = None,
+    ):
         self.llm_service = llm_service
+        # 可选的自适应并发控制器：主调用的耗时与过载异常会回报给它
+        self.concurrency_controller = concurrency_controller
+        # 响应缓存：未显式传入时按 TRANSLATION_CACHE 取进程内共享实例，关闭时为 None
+        self.translation_cache = translation_cache if translation_cache is not None else get_translation_cache()
+        # 可选的请求对冲：慢调用超过延迟分位数时向 hedge_service（默认同一服务）发送重复请求
+        self.request_hedger = request_hedger
+        self.hedge_service = hedge_service
+        # JSON 修复计数：本地修复、LLM 修复、修复失败，以及 LLM 修复消耗与本地修复节省的 token
+        self.repair_stats = {'local': 0, 'remote': 0, 'failed': 0, 'remote_tokens': 0, 'tokens_saved': 0}
+        # 各阶段单次调用的超时与整段（含重试）的总时限，单位秒，0 表示不限制；未传入时读取环境变量
+        self.stage_timeouts = stage_timeouts if stage_timeouts is not None else {
+            stage: float(os.getenv(f'{stage.upper()}_TIMEOUT') or 0) for stage in STAGES
+        }
+        self.segment_timeout = segment_timeout if segment_timeout is not None else float(os.getenv('SEGMENT_TIMEOUT') or 0)
+        # 整次运行按阶段累计的用量（各段账本之和，含失败段落）
+        self.run_usage: Dict[str, Dict[str, Any]] = {}
+
+    def _cache_key(self, prompt: str) -> str:
+        service = self.llm_service
+        provider = getattr(service, 'Linkedprovider', None)
+        return make_cache_key(
+            str(getattr(service, 'provider_name', '')),
+            str(getattr(provider, 'model', '') or ''),
+            str(getattr(service, 'system_prompt', '') or ''),
+            os.getenv('BASE_PROMPT', ''),
+            prompt,
+            bool(getattr(service, 'structured', True)),
+        )
+
+    async def _call_service(self, method_name: str, *args, service: Optional[LLMService] = None):
+        # 优先使用 LLMService 的原生异步方法（<方法名>_async），不占用线程池；
+        # 只有同步实现时（如测试替身）才退回 asyncio.to_thread
+        service = service or self.llm_service
+        ledger = current_ledger.get()
+        before = len(ledger.records) if ledger is not None else 0
+        started = time.monotonic()
+        async_method = getattr(service, f"{method_name}_async", None)
+        if async_method is not None and asyncio.iscoroutinefunction(async_method):
+            result = await async_method(*args)
+        else:
+            result = await asyncio.to_thread(getattr(service, method_name), *args)
+        if ledger is not None and len(ledger.records) == before:
+            # 服务未自行记账（如测试替身）时按返回的 total_tokens 补记一笔
+            ledger.add(UsageRecord(stage=current_stage.get(), total_tokens=int(result[1] or 0),
+                                   latency=round(time.monotonic() - started, 3), estimated=True))
+        return result
+
+    async def _run_stage(self, stage: str, call: Callable[[], Any], scale: int = 1):
+        """
+        在截止时间内执行一个阶段的调用：取阶段超时与外层（整段）截止时间中较早者，写入 current_deadline
+        供 provider 设置单次请求超时，并用 wait_for 兜底；超时时取消调用（异步客户端随之断开连接），
+        抛出可重试的 DeadlineExceeded。scale 为一次请求包含的段落数，阶段超时按其放大。
+        """
+        deadline = current_deadline.get()
+        limit = (self.stage_timeouts.get(stage) or 0) * scale
+        if limit > 0:
+            stage_deadline = time.monotonic() + limit
+            deadline = stage_deadline if deadline is None else min(deadline, stage_deadline)
+        if deadline is None:
+            return await call()
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceeded(f"{stage} 阶段开始前已超过截止时间")
+        token = current_deadline.set(deadline)
+        try:
+            return await asyncio.wait_for(call(), timeout=remaining)
+        except asyncio.TimeoutError as e:
+            raise DeadlineExceeded(f"{stage} 阶段超时（{remaining:.1f} 秒）") from e
+        finally:
+            current_deadline.reset(token)
+
+    @staticmethod
+    async def _metered(stage: str, call: Callable[[], Any]):
+        # 以 stage 为计费阶段执行调用；LLMService 把每次调用的用量按 current_stage 记入当前段落的账本
+        token = current_stage.set(stage)
+        try:
+            return await call()
+        finally:
+            current_stage.reset(token)
+
+    @staticmethod
+    def _time_left() -> Optional[float]:
+        deadline = current_deadline.get()
+        return None if deadline is None else deadline - time.monotonic()
+
+    def _begin_route(self) -> Dict[str, str]:
+        # 每段一个新的路由记录；asyncio.to_thread 复制上下文时共享同一个字典，路由结果能回传
+        route: Dict[str, str] = {}
+        current_route.set(route)
+        return route
+
+    def _provider_of(self, route: Dict[str, str]) -> Optional[str]:
+        provider = route.get('provider') or getattr(self.llm_service, 'provider_name', None)
+        return provider if isinstance(provider, str) else None
+
+    def _streaming_enabled(self) -> bool:
+        if os.getenv('STREAM_OUTPUT', 'False').lower() not in ('1', 'true', 'yes'):
+            return False
+        return asyncio.iscoroutinefunction(getattr(self.llm_service, 'call_ai_model_api_stream_async', None))
+
+    async def _call_model(self, prompt: str, on_partial: Optional[Callable[[str], None]]):
+        # STREAM_OUTPUT 开启时走流式接口：译文边生成边回调（参数为本次尝试累计的译文），结构损坏时停止实时回调并读完整段
+        if not self._streaming_enabled():
+            return await self._call_service('call_ai_model_api', prompt)
+        partial: List[str] = []
+
+        def on_translation(delta: str):
+            partial.append(delta)
+            if on_partial is not None:
+                on_partial(''.join(partial))
+
+        if on_partial is not None:
+            on_partial('')
+        return await self.llm_service.call_ai_model_api_stream_async(prompt, on_translation)
+
+    async def _call_model_hedged(self, prompt: str, on_partial: Optional[Callable[[str], None]], route: Dict[str, str]):
+        hedger = self.request_hedger
+        if hedger is None:
+            return await self._call_model(prompt, on_partial)
+        hedge_service = self.hedge_service or self.llm_service
+        hedge_route: Dict[str, str] = {}
+        hedge_results: List[Any] = []
+
+        async def hedge():
+            # 对冲请求不走流式；在独立的路由记录里执行，胜出后再写回本段的路由记录
+            current_route.set(hedge_route)
+            current_stage.set(HEDGE)
+            result = await self._call_service('call_ai_model_api', prompt, service=hedge_service)
+            hedge_results.append(result)
+            return result
+
+        def cost(result) -> int:
+            if result is not None:
+                return result[1] or 0
+            # 被取消的请求按输入估算（输出部分无从得知）并记入账本；对冲请求已返回说明被取消的是主请求
+            estimate = estimate_tokens(getattr(hedge_service, 'system_prompt', '') or '') + estimate_tokens(prompt)
+            ledger = current_ledger.get()
+            if ledger is not None:
+                ledger.add(UsageRecord(stage=current_stage.get() if hedge_results else HEDGE,
+                                       prompt_tokens=estimate, total_tokens=estimate, estimated=True))
+            return estimate
+
+        response = await hedger.race(
+            lambda: self._call_model(prompt, on_partial),
+            hedge,
+            accept=lambda result: "error" not in result[0],
+            cost=cost,
+        )
+        if hedge_results and response is hedge_results[0]:
+            provider = hedge_route.get('provider') or getattr(hedge_service, 'provider_name', None)
+            if isinstance(provider, str):
+                route['provider'] = provider
+            if on_partial is not None:
+                on_partial(response[0].get('translation', ''))
+        return response
+
+    @staticmethod
+    def _resolve_registry(terms_dict, aggregated_new_terms) -> TermRegistry:
+        # 调用方传入共享的 TermRegistry 时直接复用；普通字典/匹配器则临时包装
+        if isinstance(terms_dict, TermRegistry):
+            registry = terms_dict
+        else:
+            registry = TermRegistry(terms_dict)
+        if aggregated_new_terms and aggregated_new_terms is not registry.delta:
+            registry.add_terms(aggregated_new_terms)
+        return registry
+
+    async def _repair_response(self, response_data: Dict[str, Any], repair_policy: RepairPolicy) -> Tuple[Dict[str, Any], int, int]:
+        """
+        修复无效 JSON：先做本地确定性修复，失败后再按 repair_policy 请求 LLM 修复。
+        返回 (结果, LLM 修复消耗的 token, 本地修复节省的 token)；未能修复时结果仍带 error 字段。
+        """
+        origin_text = response_data.get("origin_text", "")
+        started = time.monotonic()
+        local = repair_translation_response(origin_text)
+        ledger = current_ledger.get()
+        if ledger is not None:
+            # 本地修复不计费，只记次数与耗时
+            ledger.add(UsageRecord(stage=LOCAL_REPAIR, latency=round(time.monotonic() - started, 3)))
+        if local is not None:
+            # 省下的是一次修复请求：输入为原文加修复指令，输出约与原文等长
+            saved = estimate_tokens(origin_text) * 2 + estimate_tokens(LLMService._REPAIR_SYSTEM_PROMPT)
+            self.repair_stats['local'] += 1
+            self.repair_stats['tokens_saved'] += saved
+            return local, 0, saved
+
+        tokens = 0
+        for _ in range(repair_policy.value):
+            time_left = self._time_left()
+            if time_left is not None and time_left <= 0:
+                break
+            try:
+                response_data, add_tokens = await self._metered(
+                    LLM_REPAIR, lambda: self._run_stage('repair', lambda: self._call_service('repair_json', origin_text))
+                )
+                tokens += add_tokens
+                if "error" not in response_data:
+                    self.repair_stats['remote'] += 1
+                    self.repair_stats['remote_tokens'] += tokens
+                    return response_data, tokens, 0
+            except Exception:
+                pass
+        self.repair_stats['failed'] += 1
+        self.repair_stats['remote_tokens'] += tokens
+        return response_data, tokens, 0
+
+    async def _apply_glossary_rewrite(
+        self,
+        response_data: Dict[str, Any],
+        current_terms: TermRegistry,
+        terminology_policy: TerminologyPolicy,
+        repair_policy: RepairPolicy,
+    ) -> int:
+        """
+        术语一致性复写：新术语与权威词表译名冲突时请求复写，原地更新 response_data，返回消耗的 token。
+        """
+        tokens = 0
+        # 检查新生成的术语是否与已知术语冲突
+        new_terms_list = response_data.get("new_terms", [])
+        corrections = {}
+
+        if terminology_policy == TerminologyPolicy.MERGE_ON_CONFLICT:
+            for item in new_terms_list:
+                term = item.get("term", "").strip()
+                translation = item.get("translation", "").strip()
+                if not term or not translation:
+                    continue
+
+                # 如果该术语已在权威词表中，且译名不一致
+                if term in current_terms:
+                    expected = current_terms.get(term)
+                    if translation != expected:
+                        corrections[term] = expected
+
+        # 如果有冲突，进行复写
+        if corrections:
+            if hasattr(self.llm_service, 'rewrite_with_glossary'):
+                translation = response_data.get("translation", "")
+                notes = response_data.get("notes", "")
+                # 复写
+                rewrite_result, rewrite_tokens = await self._metered(REWRITE, lambda: self._run_stage('rewrite', lambda: self._call_service(
+                    'rewrite_with_glossary', 
+                    translation, 
+                    notes, 
+                    corrections
+                )))
+                tokens += rewrite_tokens
+
+                # 检查复写结果是否包含错误，并尝试修复
+                if "error" in rewrite_result:
+                    rewrite_result, add_tokens, _ = await self._repair_response(rewrite_result, repair_policy)
+                    tokens += add_tokens
+
+                    if "error" in rewrite_result:
+                        logger.warning(f"Glossary rewrite JSON repair failed after {repair_policy.value} attempts: {rewrite_result.get('error')}. Using original translation.")
+                        # 如果修复失败，rewrite_result 仍然是错误的，下面的 .get() 会回退到原值，这符合预期降级行为
+
+                # 更新结果
+                response_data["translation"] = rewrite_result.get("translation", translation)
+                response_data["notes"] = rewrite_result.get("notes", notes)
+
+                # 从新术语列表中移除被纠正的术语
+                # 因为它们已经被复写为标准译名，不再视为"新术语"
+                response_data["new_terms"] = [
+                    t for t in new_terms_list 
+                    if t.get("term") not in corrections
+                ]
+            else:
+                # 如果服务不支持术语复写（如接口未实现），则跳过复写步骤
+                # 保持原译文和新术语列表
+                logger.warning("LLMService instance missing 'rewrite_with_glossary' method. Skipping glossary rewrite step.")
+                pass
+        return tokens
 
     async def execute_translation_step(
         self,
         segment: Dict[str, Any],
-        terms_dict: Dict[str, str],
+        terms_dict: Union[Dict[str, str], GlossaryMatcher, TermRegistry],
         aggregated_new_terms: Dict[str, str],
         tracker_state: Optional[Any] = None,
         repair_policy: RepairPolicy = RepairPolicy.RETRY_MAX_5,
         terminology_policy: TerminologyPolicy = TerminologyPolicy.MERGE_ON_CONFLICT,
-        max_api_retries: int = 3
+        max_api_retries: int = 3,
+        on_partial: Optional[Callable[[str], None]] = None
     ) -> TranslationResult:
         """
         执行单段翻译的核心流程：
@@ -55,8 +373,38 @@ class TranslationCore:
         3. API 调用与重试（含 JSON 修复）
         4. 术语一致性复写（可选）
         5. 结果封装
+        设置了 segment_timeout 时整段（含重试与退避）在该时限内结束，超时后不再重试。
+        返回结果的 tokens / repair_tokens / usage 以本段的用量账本为准，失败的段落同样带有已消耗的用量。
         """
-        
+        token = current_deadline.set(time.monotonic() + self.segment_timeout) if self.segment_timeout > 0 else None
+        ledger = UsageLedger()
+        ledger_token = current_ledger.set(ledger)
+        try:
+            result = await self._translate_segment(
+                segment, terms_dict, aggregated_new_terms, tracker_state,
+                repair_policy, terminology_policy, max_api_retries, on_partial
+            )
+        finally:
+            current_ledger.reset(ledger_token)
+            if token is not None:
+                current_deadline.reset(token)
+            merge_usage(self.run_usage, ledger.by_stage())
+        result.usage = ledger.by_stage()
+        result.tokens = ledger.total_tokens
+        result.repair_tokens = ledger.stage_tokens(LLM_REPAIR)
+        return result
+
+    async def _translate_segment(
+        self,
+        segment: Dict[str, Any],
+        terms_dict: Union[Dict[str, str], GlossaryMatcher, TermRegistry],
+        aggregated_new_terms: Dict[str, str],
+        tracker_state: Optional[Any],
+        repair_policy: RepairPolicy,
+        terminology_policy: TerminologyPolicy,
+        max_api_retries: int,
+        on_partial: Optional[Callable[[str], None]],
+    ) -> TranslationResult:
         paragraph_text = segment.get("content", "")
         meta_data = segment.get("meta_data", {})
         header_path = meta_data.get("header_path", []) if meta_data else []
@@ -77,122 +425,59 @@ class TranslationCore:
         
         # 1. 准备术语表：基础词表 + 已聚合的新术语
         # 注意：这里只读不写 aggregated_new_terms，写入由调用方处理
-        current_terms = terms_dict.copy()
-        current_terms.update(aggregated_new_terms)
+        # 分层术语表：基础层索引预构建，新术语只重建增量层，查询时增量层优先
+        current_terms = self._resolve_registry(terms_dict, aggregated_new_terms)
         
-        matched_terms = await asyncio.to_thread(find_matching_terms, paragraph_text, current_terms)
+        # 预处理阶段已整篇批量匹配过基础术语表时（segment['matched_terms']），只需匹配增量层
+        # 启用 CSV_MATCH_WORKERS 时基础层匹配在进程池中执行，不占用事件循环所在进程的 GIL
+        matched_terms = await match_terms_async(current_terms, paragraph_text, segment.get("matched_terms"))
         
         # 2. 构造 Prompt
         prompt = self.llm_service.create_prompt(paragraph_text, matched_terms)
+        route = self._begin_route()
         
-        # 3. API 调用与重试循环
+        # 3. API 调用与重试循环（先查响应缓存，命中时不调用 API，token 记为 0）
+        cache = self.translation_cache
+        cache_key = self._cache_key(prompt) if cache is not None else None
+        cached = await asyncio.to_thread(cache.get, cache_key) if cache is not None else None
         attempts = 0
         last_error = None
         last_response_data = {}
+        tokens = 0
         repair_tokens = 0
+        repair_tokens_saved = 0
         while attempts < max_api_retries:
             try:
-                # 异步调用 API（如果 LLMService 内部是同步的，使用 to_thread）
-                # 注意：llm_service.call_ai_model_api 内部已经包含了解析逻辑
-                # 但我们需要处理网络层面的重试，以及 JSON 修复层面的重试
-                
-                # 这里假设 call_ai_model_api 是同步的，我们把它放到线程里跑
-                # 如果它本身支持异步，可以直接 await。目前看它是同步的。
-                response_data, tokens = await asyncio.to_thread(self.llm_service.call_ai_model_api, prompt)
+                if cached is not None:
+                    response_data, tokens = dict(cached['response']), 0
+                else:
+                    # 异步调用 API：LLMService 提供原生异步方法时直接 await，否则放到线程里跑
+                    # 注意：llm_service.call_ai_model_api 内部已经包含了解析逻辑
+                    # 但我们需要处理网络层面的重试，以及 JSON 修复层面的重试
+                    call_started = time.monotonic()
+                    response_data, tokens = await self._metered(
+                        RETRY if attempts else TRANSLATE,
+                        lambda: self._run_stage('translate', lambda: self._call_model_hedged(prompt, on_partial, route)),
+                    )
+                    if self.concurrency_controller is not None:
+                        self.concurrency_controller.record_success(time.monotonic() - call_started)
                 last_response_data = response_data
                 # 检查是否需要 JSON 修复
                 # call_ai_model_api 已经在 structured=True 时尝试了解析，如果失败会返回 error 字段
                 if "error" in response_data:
-                    # 尝试修复
-                    repair_attempts = 0
-                    max_repair = repair_policy.value
-                    origin_text = response_data.get("origin_text", "")
-                    
-                    repaired = False
-                    while repair_attempts < max_repair:
-                        try:
-                            # 修复也是 IO 操作，放线程里
-                            response_data, add_tokens = await asyncio.to_thread(self.llm_service.repair_json, origin_text)
-                            repair_tokens += add_tokens
-                            if "error" not in response_data:
-                                repaired = True
-                                break
-                        except Exception:
-                            pass
-                        repair_attempts += 1
-                    
-                    if not repaired:
-                        raise ValueError(f"JSON repair failed after {max_repair} attempts: {response_data.get('error')}")
+                    # 尝试修复：本地修复优先，失败才调用 LLM
+                    response_data, add_tokens, saved = await self._repair_response(response_data, repair_policy)
+                    repair_tokens += add_tokens
+                    repair_tokens_saved += saved
+                    if "error" in response_data:
+                        raise ValueError(f"JSON repair failed after {repair_policy.value} attempts: {response_data.get('error')}")
+
+                # 缓存解析（及修复）后的响应；术语复写依赖运行中的术语表，命中后仍照常执行
+                if cache is not None and cached is None:
+                    await asyncio.to_thread(cache.put, cache_key, response_data, tokens, repair_tokens)
 
                 # 4. 术语一致性复写 (Rewrite with Glossary)
-                # 检查新生成的术语是否与已知术语冲突
-                new_terms_list = response_data.get("new_terms", [])
-                corrections = {}
-                
-                if terminology_policy == TerminologyPolicy.MERGE_ON_CONFLICT:
-                    for item in new_terms_list:
-                        term = item.get("term", "").strip()
-                        translation = item.get("translation", "").strip()
-                        if not term or not translation:
-                            continue
-                        
-                        # 如果该术语已在权威词表中，且译名不一致
-                        if term in current_terms:
-                            expected = current_terms[term]
-                            if translation != expected:
-                                corrections[term] = expected
-                
-                # 如果有冲突，进行复写
-                if corrections:
-                    if hasattr(self.llm_service, 'rewrite_with_glossary'):
-                        translation = response_data.get("translation", "")
-                        notes = response_data.get("notes", "")
-                        # 复写
-                        rewrite_result, rewrite_tokens = await asyncio.to_thread(
-                            self.llm_service.rewrite_with_glossary, 
-                            translation, 
-                            notes, 
-                            corrections
-                        )
-                        tokens += rewrite_tokens
-                        
-                        # 检查复写结果是否包含错误，并尝试修复
-                        if "error" in rewrite_result:
-                            repair_attempts = 0
-                            max_repair = repair_policy.value
-                            origin_text = rewrite_result.get("origin_text", "")
-                            
-                            repaired = False
-                            while repair_attempts < max_repair:
-                                try:
-                                    rewrite_result, add_tokens = await asyncio.to_thread(self.llm_service.repair_json, origin_text)
-                                    tokens += add_tokens
-                                    if "error" not in rewrite_result:
-                                        repaired = True
-                                        break
-                                except Exception:
-                                    pass
-                                repair_attempts += 1
-                            
-                            if not repaired:
-                                logger.warning(f"Glossary rewrite JSON repair failed after {max_repair} attempts: {rewrite_result.get('error')}. Using original translation.")
-                                # 如果修复失败，rewrite_result 仍然是错误的，下面的 .get() 会回退到原值，这符合预期降级行为
-                        
-                        # 更新结果
-                        response_data["translation"] = rewrite_result.get("translation", translation)
-                        response_data["notes"] = rewrite_result.get("notes", notes)
-                        
-                        # 从新术语列表中移除被纠正的术语
-                        # 因为它们已经被复写为标准译名，不再视为"新术语"
-                        response_data["new_terms"] = [
-                            t for t in new_terms_list 
-                            if t.get("term") not in corrections
-                        ]
-                    else:
-                        # 如果服务不支持术语复写（如接口未实现），则跳过复写步骤
-                        # 保持原译文和新术语列表
-                        logger.warning("LLMService instance missing 'rewrite_with_glossary' method. Skipping glossary rewrite step.")
-                        pass
+                tokens += await self._apply_glossary_rewrite(response_data, current_terms, terminology_policy, repair_policy)
 
                 # 成功返回
                 return TranslationResult(
@@ -202,14 +487,26 @@ class TranslationCore:
                     repair_tokens=repair_tokens,
                     new_terms_delta=response_data.get("new_terms", []),
                     header_path=header_path,
-                    success=True
+                    success=True,
+                    cache_hit=cached is not None,
+                    repair_tokens_saved=repair_tokens_saved,
+                    provider=self._provider_of(route)
                 )
 
             except Exception as e:
                 last_error = str(e)
                 attempts += 1
-                # 简单的指数退避
-                await asyncio.sleep(1 * attempts)
+                if self.concurrency_controller is not None:
+                    self.concurrency_controller.record_failure(e)
+                # 整段时限已到时不再重试
+                time_left = self._time_left()
+                if time_left is not None and time_left <= 0:
+                    last_error = f"段落超过总时限（{self.segment_timeout:g} 秒）：{last_error}"
+                    break
+                # 线性退避；服务端给出 Retry-After 等限流头时至少等到建议时长，但不超过整段剩余时间
+                _, retry_after = classify_error(e)
+                delay = max(1 * attempts, retry_after or 0)
+                await asyncio.sleep(delay if time_left is None else min(delay, time_left))
         
         # 如果重试耗尽
         # 检查是否可以降级使用部分有效的数据
@@ -286,3 +583,220 @@ class TranslationCore:
             error=f"Max retries ({max_api_retries}) reached. Last error: {last_error}"
         )
 
+
+    async def execute_translation_batch(
+        self,
+        segments: List[Dict[str, Any]],
+        terms_dict: Union[Dict[str, str], GlossaryMatcher, TermRegistry],
+        aggregated_new_terms: Dict[str, str],
+        repair_policy: RepairPolicy = RepairPolicy.RETRY_MAX_5,
+        terminology_policy: TerminologyPolicy = TerminologyPolicy.MERGE_ON_CONFLICT,
+        max_api_retries: int = 3
+    ) -> List[TranslationResult]:
+        """
+        批量翻译：多个短段落合并为一次请求，按段落 id 拆回各自的 TranslationResult（顺序与输入一致）。
+        与单段流程一样先逐段查响应缓存，只有未命中的段落进入合并请求（见 _translate_pack）。
+        """
+        if len(segments) == 1 or not getattr(self.llm_service, 'supports_batch', False):
+            return [
+                await self.execute_translation_step(
+                    segment, terms_dict, aggregated_new_terms,
+                    repair_policy=repair_policy, terminology_policy=terminology_policy, max_api_retries=max_api_retries
+                )
+                for segment in segments
+            ]
+
+        current_terms = self._resolve_registry(terms_dict, aggregated_new_terms)
+        matched: List[Dict[str, str]] = []
+        for segment in segments:
+            matched.append(await match_terms_async(current_terms, segment.get("content", ""), segment.get("matched_terms")))
+
+        # 逐段查响应缓存：键与单段流程相同（按单段提示词计算），两种模式的缓存可以互相命中
+        cache = self.translation_cache
+        cache_keys: List[Optional[str]] = [None] * len(segments)
+        results: Dict[int, TranslationResult] = {}
+        if cache is not None:
+            for index, (segment, terms) in enumerate(zip(segments, matched)):
+                cache_keys[index] = self._cache_key(self.llm_service.create_prompt(segment.get("content", ""), terms))
+                cached = await asyncio.to_thread(cache.get, cache_keys[index])
+                if cached is not None:
+                    results[index] = await self._batch_item_result(
+                        dict(cached['response']), segment, {}, current_terms, terminology_policy, repair_policy,
+                        self._begin_route(), cache_hit=True
+                    )
+        pending = [index for index in range(len(segments)) if index not in results]
+        if pending:
+            pending_results = await self._translate_pack(
+                [segments[index] for index in pending], [matched[index] for index in pending],
+                [cache_keys[index] for index in pending], current_terms,
+                repair_policy, terminology_policy, max_api_retries
+            )
+            results.update(zip(pending, pending_results))
+        return [results[index] for index in range(len(segments))]
+
+    async def _translate_pack(
+        self,
+        segments: List[Dict[str, Any]],
+        matched: List[Dict[str, str]],
+        cache_keys: List[Optional[str]],
+        current_terms: TermRegistry,
+        repair_policy: RepairPolicy,
+        terminology_policy: TerminologyPolicy,
+        max_api_retries: int
+    ) -> List[TranslationResult]:
+        """
+        把未命中缓存的段落合并为一次请求；整包（含重试与退避）的时限为 segment_timeout × 段落数。
+        有段落缺失或校验失败时对半拆分后重试，拆到单段时回到 execute_translation_step。
+        """
+        if len(segments) == 1:
+            return [await self.execute_translation_step(
+                segments[0], current_terms, current_terms.delta,
+                repair_policy=repair_policy, terminology_policy=terminology_policy, max_api_retries=max_api_retries
+            )]
+
+        ids = list(range(1, len(segments) + 1))
+        matched_terms: Dict[str, str] = {}
+        for terms in matched:
+            matched_terms.update(terms)
+        prompt = self.llm_service.create_batch_prompt(
+            [(sid, segment.get("content", "")) for sid, segment in zip(ids, segments)], matched_terms
+        )
+
+        items: Dict[int, Dict[str, Any]] = {}
+        attempts = 0
+        route = self._begin_route()
+        deadline_token = (current_deadline.set(time.monotonic() + self.segment_timeout * len(segments))
+                          if self.segment_timeout > 0 else None)
+        # 批量请求（含重试）单独记一本账，结束后按原文长度分摊到各段落
+        batch_ledger = UsageLedger()
+        ledger_token = current_ledger.set(batch_ledger)
+        try:
+            while attempts < max_api_retries:
+                try:
+                    call_started = time.monotonic()
+                    items, _ = await self._metered(RETRY if attempts else TRANSLATE, lambda: self._run_stage(
+                        'translate', lambda: self._call_service('call_ai_model_api_batch', prompt, ids), scale=len(segments)
+                    ))
+                    if self.concurrency_controller is not None:
+                        self.concurrency_controller.record_success(time.monotonic() - call_started)
+                    break
+                except Exception as e:
+                    attempts += 1
+                    logger.warning(f"Batch request of {len(segments)} segments failed: {e}")
+                    if self.concurrency_controller is not None:
+                        self.concurrency_controller.record_failure(e)
+                    # 整包时限已到时不再重试，未完成的段落逐段走单段流程（各自另有时限）
+                    time_left = self._time_left()
+                    if time_left is not None and time_left <= 0:
+                        attempts = max_api_retries
+                        break
+                    _, retry_after = classify_error(e)
+                    delay = max(1 * attempts, retry_after or 0)
+                    await asyncio.sleep(delay if time_left is None else min(delay, time_left))
+        finally:
+            current_ledger.reset(ledger_token)
+            if deadline_token is not None:
+                current_deadline.reset(deadline_token)
+        batch_usage = batch_ledger.by_stage()
+        merge_usage(self.run_usage, batch_usage)
+
+        # 本次请求的用量按原文长度分摊到成功的段落上；全部失败时分摊到失败的段落上
+        done = [sid for sid in ids if sid in items]
+        failed = [sid for sid in ids if sid not in items]
+        owners = done or failed
+        shares = dict(zip(owners, split_usage(batch_usage, [max(1, len(segments[sid - 1].get("content", ""))) for sid in owners])))
+        results: Dict[int, TranslationResult] = {}
+        cache = self.translation_cache
+        for sid in done:
+            response_data = items[sid]
+            # 缓存解析后的响应（术语复写之前），记录分摊到本段的 token
+            if cache is not None and cache_keys[sid - 1] is not None:
+                await asyncio.to_thread(cache.put, cache_keys[sid - 1], response_data, usage_totals(shares[sid])['total_tokens'], 0)
+            results[sid] = await self._batch_item_result(
+                response_data, segments[sid - 1], shares[sid], current_terms, terminology_policy, repair_policy, route
+            )
+
+        if failed and attempts >= max_api_retries:
+            # 请求本身反复失败（网络、限流等），拆分无助于恢复，直接逐段走单段流程
+            for sid in failed:
+                results[sid] = await self.execute_translation_step(
+                    segments[sid - 1], current_terms, current_terms.delta,
+                    repair_policy=repair_policy, terminology_policy=terminology_policy, max_api_retries=max_api_retries
+                )
+        elif failed:
+            logger.warning(f"Batch returned {len(done)}/{len(segments)} valid items; splitting {len(failed)} segments and retrying.")
+            middle = (len(failed) + 1) // 2
+            for part in (failed[:middle], failed[middle:]):
+                if not part:
+                    continue
+                part_results = await self._translate_pack(
+                    [segments[sid - 1] for sid in part], [matched[sid - 1] for sid in part],
+                    [cache_keys[sid - 1] for sid in part], current_terms,
+                    repair_policy, terminology_policy, max_api_retries
+                )
+                results.update(zip(part, part_results))
+        if not done:
+            for sid in failed:
+                result = results[sid]
+                result.usage = merge_usage(shares[sid], result.usage)
+                result.tokens = usage_totals(result.usage)['total_tokens']
+        return [results[sid] for sid in ids]
+
+    async def _batch_item_result(
+        self,
+        response_data: Dict[str, Any],
+        segment: Dict[str, Any],
+        share: Dict[str, Dict[str, Any]],
+        current_terms: TermRegistry,
+        terminology_policy: TerminologyPolicy,
+        repair_policy: RepairPolicy,
+        route: Dict[str, str],
+        cache_hit: bool = False
+    ) -> TranslationResult:
+        # 对批量结果（或缓存命中）中的一段做术语复写，复写用量与分摊到本段的批量用量合并
+        ledger = UsageLedger()
+        ledger_token = current_ledger.set(ledger)
+        try:
+            await self._apply_glossary_rewrite(response_data, current_terms, terminology_policy, repair_policy)
+        finally:
+            current_ledger.reset(ledger_token)
+        merge_usage(self.run_usage, ledger.by_stage())
+        usage = merge_usage(share, ledger.by_stage())
+        meta_data = segment.get("meta_data") or {}
+        return TranslationResult(
+            content=response_data.get("translation", ""),
+            notes=response_data.get("notes", ""),
+            tokens=usage_totals(usage)['total_tokens'],
+            repair_tokens=0,
+            new_terms_delta=response_data.get("new_terms", []),
+            header_path=meta_data.get("header_path", []),
+            success=True,
+            cache_hit=cache_hit,
+            provider=self._provider_of(route),
+            usage=usage
+        )
+
+
+def pack_segments(segments: List[Dict[str, Any]], token_budget: int, max_segments: int = 20) -> List[List[Dict[str, Any]]]:
+    """
+    把连续的段落按估算 token 打包，每包不超过 token_budget 与 max_segments；超出预算的长段落与图片单独成包。
+    token_budget 小于等于 0 时每段单独成包。
+    """
+    packs: List[List[Dict[str, Any]]] = []
+    current: List[Dict[str, Any]] = []
+    used = 0
+    for segment in segments:
+        meta_data = segment.get("meta_data") or {}
+        cost = estimate_tokens(segment.get("content", ""))
+        solo = token_budget <= 0 or meta_data.get("is_image") or cost > token_budget
+        if current and (solo or used + cost > token_budget or len(current) >= max_segments):
+            packs.append(current)
+            current, used = [], 0
+        if solo:
+            packs.append([segment])
+            continue
+        current.append(segment)
+        used += cost
+    if current:
+        packs.append(current)
+    return packs
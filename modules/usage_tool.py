@@ -0,0 +1,125 @@
+import threading
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+# 计费阶段：首次翻译、翻译重试、本地 JSON 修复（不计费，只计次数）、LLM JSON 修复、术语复写、对冲请求
+TRANSLATE = 'translate'
+RETRY = 'retry'
+LOCAL_REPAIR = 'local_repair'
+LLM_REPAIR = 'llm_repair'
+REWRITE = 'rewrite'
+HEDGE = 'hedge'
+STAGES = (TRANSLATE, RETRY, LOCAL_REPAIR, LLM_REPAIR, REWRITE, HEDGE)
+
+USAGE_FIELDS = ('calls', 'prompt_tokens', 'completion_tokens', 'cached_tokens', 'total_tokens', 'latency_s')
+
+
+@dataclass
+class UsageRecord:
+    """
+    一次模型调用的用量：平台未返回明细时 prompt/completion 按文本长度估算（estimated 为真）；
+    被取消的请求只能按输入估算。
+    """
+    stage: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    total_tokens: int = 0
+    latency: float = 0.0
+    estimated: bool = False
+
+
+class UsageLedger:
+    """
+    用量账本：按阶段汇总 UsageRecord。TranslationCore 每段一本，运行结束时各段账本合并为整次运行的账本。
+    """
+
+    def __init__(self):
+        self.records: List[UsageRecord] = []
+        self._lock = threading.Lock()
+
+    def add(self, record: UsageRecord) -> None:
+        with self._lock:
+            self.records.append(record)
+
+    @property
+    def total_tokens(self) -> int:
+        with self._lock:
+            return sum(r.total_tokens for r in self.records)
+
+    def stage_tokens(self, stage: str) -> int:
+        with self._lock:
+            return sum(r.total_tokens for r in self.records if r.stage == stage)
+
+    def by_stage(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            records = list(self.records)
+        summary: Dict[str, Dict[str, Any]] = {}
+        for r in records:
+            entry = summary.setdefault(r.stage, empty_usage())
+            entry['calls'] += 1
+            entry['prompt_tokens'] += r.prompt_tokens
+            entry['completion_tokens'] += r.completion_tokens
+            entry['cached_tokens'] += r.cached_tokens
+            entry['total_tokens'] += r.total_tokens
+            entry['latency_s'] = round(entry['latency_s'] + r.latency, 3)
+        return summary
+
+
+def empty_usage() -> Dict[str, Any]:
+    return {field: 0.0 if field == 'latency_s' else 0 for field in USAGE_FIELDS}
+
+
+def merge_usage(into: Dict[str, Dict[str, Any]], usage: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    把按阶段的用量累加进 into（原地修改并返回），用于从段落汇总到整次运行。
+    """
+    for stage, entry in usage.items():
+        target = into.setdefault(stage, empty_usage())
+        for field in USAGE_FIELDS:
+            target[field] += entry.get(field, 0)
+        target['latency_s'] = round(target['latency_s'], 3)
+    return into
+
+
+def usage_totals(usage: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    totals = empty_usage()
+    for entry in usage.values():
+        for field in USAGE_FIELDS:
+            totals[field] += entry.get(field, 0)
+    totals['latency_s'] = round(totals['latency_s'], 3)
+    return totals
+
+
+def split_usage(usage: Dict[str, Dict[str, Any]], weights: List[int]) -> List[Dict[str, Dict[str, Any]]]:
+    """
+    按权重把一次批量请求的用量分摊到各段落；整数字段按比例取整，余数归最后一段，各段之和等于原值。
+    """
+    total_weight = sum(weights) or 1
+    parts: List[Dict[str, Dict[str, Any]]] = [{} for _ in weights]
+    for stage, entry in usage.items():
+        for field in USAGE_FIELDS:
+            value = entry.get(field, 0)
+            allocated = 0
+            for i, weight in enumerate(weights):
+                if i == len(weights) - 1:
+                    share = value - allocated
+                elif field == 'latency_s':
+                    share = round(value * weight / total_weight, 3)
+                else:
+                    share = value * weight // total_weight
+                allocated += share
+                parts[i].setdefault(stage, empty_usage())[field] = round(share, 3) if field == 'latency_s' else share
+    return parts
+
+
+# 当前段落的用量账本与调用所属阶段：TranslationCore 设置，LLMService 每次调用结束时把用量记入账本
+current_ledger: ContextVar[Optional[UsageLedger]] = ContextVar('current_ledger', default=None)
+current_stage: ContextVar[str] = ContextVar('current_stage', default=TRANSLATE)
+
+
+def record_call(record: UsageRecord) -> None:
+    ledger = current_ledger.get()
+    if ledger is not None:
+        ledger.add(record)
@@ -29,6 +29,10 @@ def write_to_markdown_through_json(
         item['notes'] = content_info.get('notes', '')
         item['new_terms'] = content_info.get('new_terms', [])
         item['status'] = 'completed'
+        if content_info.get('provider'):
+            item['provider'] = content_info['provider']
+        if content_info.get('usage'):
+            item['usage'] = content_info['usage']
     else:
         for idx, item in enumerate(data['text_info']):
             if item['paragraph_number'] == p_id:
@@ -37,6 +41,10 @@ def write_to_markdown_through_json(
                 item['notes'] = content_info.get('notes', '')
                 item['new_terms'] = content_info.get('new_terms', [])
                 item['status'] = 'completed'
+                if content_info.get('provider'):
+                    item['provider'] = content_info['provider']
+                if content_info.get('usage'):
+                    item['usage'] = content_info['usage']
                 break
             
     if target_idx == -1:
@@ -152,3 +160,18 @@ def _find_last_header_in_file(file_path: str):
     except FileNotFoundError:
         return None
     return last_header
+
+
+def update_json_metadata(json_file_path: str, key: str, value) -> None:
+    """
+    在中间 JSON 顶层写入一项运行信息（如并发调整记录），不改动 text_info。
+    """
+    try:
+        with open(json_file_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        print(f"Error: JSON file not found at {json_file_path}")
+        return
+    data[key] = value
+    with open(json_file_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
@@ -19,7 +19,7 @@ load_dotenv(dotenv_path="data/.env")
 
 # 导入项目模块
 from modules.api_tool import LLMService
-from modules.csv_process_tool import load_terms_dict, find_matching_terms
+from modules.csv_process_tool import load_terms_dict, find_matching_terms, get_glossary_matcher
 from modules.read_tool import read_structured_paragraphs
 from modules.config import global_config
 
@@ -86,12 +86,13 @@ class TranslationSimulator:
         
         segment_results = []
         aggregated_new_terms = []
+        glossary = get_glossary_matcher(terms_dict)
         
         for seg_idx, segment in enumerate(segments, 1):
             print(f"\n📄 翻译段落 {seg_idx}/{len(segments)}")
             
             # 查找匹配的术语（模拟真实流程）
-            specific_terms = find_matching_terms(segment, terms_dict)
+            specific_terms = find_matching_terms(segment, glossary)
             if specific_terms:
                 print(f"发现 {len(specific_terms)} 个匹配术语")
             
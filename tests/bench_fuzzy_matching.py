@@ -0,0 +1,68 @@
+"""
+模糊术语匹配基准：删除邻域索引（index）对比逐术语扫描（scan）。
+
+用法：python tests/bench_fuzzy_matching.py [术语数] [段落数] [编辑距离]
+"""
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.csv_process_tool import GlossaryMatcher  # noqa: E402
+
+
+def _word(rng, lo=4, hi=11):
+    return ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(lo, hi)))
+
+
+def build_case(n_terms, n_paragraphs, seed=42):
+    rng = random.Random(seed)
+    terms = {}
+    while len(terms) < n_terms:
+        terms[_word(rng)] = f"术语{len(terms)}"
+    keys = list(terms)
+    paragraphs = []
+    for _ in range(n_paragraphs):
+        words = [_word(rng, 2, 9) for _ in range(100)]
+        for _ in range(3):
+            t = rng.choice(keys)
+            pos = rng.randrange(len(t))
+            words[rng.randrange(len(words))] = t[:pos] + rng.choice(string.ascii_lowercase) + t[pos + 1:]
+        paragraphs.append(' '.join(words) + '.')
+    return terms, paragraphs
+
+
+def run(n_terms=20000, n_paragraphs=20, ed=1):
+    terms, paragraphs = build_case(n_terms, n_paragraphs)
+    matcher = GlossaryMatcher(terms)
+    lowered = [p.lower() for p in paragraphs]
+
+    t0 = time.perf_counter()
+    matcher._get_fuzzy_index(ed)
+    build = time.perf_counter() - t0
+
+    results = {}
+    for engine in ('index', 'scan'):
+        method = matcher._match_fuzzy_index if engine == 'index' else matcher._match_fuzzy_scan
+        t0 = time.perf_counter()
+        outputs = []
+        for text in lowered:
+            matches = {}
+            method(text, matches, ed)
+            outputs.append(matches)
+        results[engine] = (time.perf_counter() - t0, outputs)
+
+    assert results['index'][1] == results['scan'][1], 'index/scan results differ'
+    print(f"terms={n_terms} paragraphs={n_paragraphs} ed={ed}")
+    print(f"index build: {build:.3f}s")
+    for engine, (elapsed, outputs) in results.items():
+        hits = sum(len(m) for m in outputs)
+        print(f"{engine:>5}: {elapsed / n_paragraphs * 1000:.2f} ms/segment, matches={hits}")
+
+
+if __name__ == '__main__':
+    args = [int(a) for a in sys.argv[1:4]]
+    run(*args)
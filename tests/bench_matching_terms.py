@@ -0,0 +1,213 @@
+"""
+术语匹配基准：在不同规模的合成术语表上比较 aho / regex / fuzzy 三种引擎。
+
+统计每种引擎的索引构建耗时、构建期内存峰值（tracemalloc）、单段匹配延迟（p50/p95）与命中数，
+结果写入 JSON 报告，便于在版本之间对比。
+
+用法：
+    python tests/bench_matching_terms.py                       # 1k/10k/100k/500k，全部引擎
+    python tests/bench_matching_terms.py --sizes 1000,10000 --segments 100 --out bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import string
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.csv_process_tool import GlossaryMatcher, find_matching_terms  # noqa: E402
+
+DEFAULT_SIZES = [1000, 10000, 100000, 500000]
+ENGINES = ['aho', 'regex', 'fuzzy']
+FILLER = ("the of and to in is was for on with as by at from that this it be are "
+          "an or which have has had not but were they their been would there").split()
+
+
+def _word(rng, lo=3, hi=10):
+    return ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(lo, hi)))
+
+
+def build_glossary(size, rng):
+    """
+    合成术语表：约 55% 单词术语、35% 多词术语（2-3 词）、10% 以 y 结尾的术语（复数变形为 -ies）。
+    """
+    terms = {}
+    while len(terms) < size:
+        r = rng.random()
+        if r < 0.55:
+            term = _word(rng).capitalize() if rng.random() < 0.3 else _word(rng)
+        elif r < 0.9:
+            term = ' '.join(_word(rng) for _ in range(rng.randint(2, 3)))
+        else:
+            term = _word(rng, 3, 8) + 'y'
+        terms.setdefault(term, f"术语{len(terms)}")
+    return terms
+
+
+def build_segments(terms, count, rng, words_per_segment=100, terms_per_segment=6):
+    """
+    合成约 600 字符的段落：普通词中随机插入若干术语，其中一部分带冠词或写成复数（plural-heavy）。
+    """
+    keys = list(terms)
+    segments = []
+    for _ in range(count):
+        words = [rng.choice(FILLER) if rng.random() < 0.6 else _word(rng) for _ in range(words_per_segment)]
+        for _ in range(terms_per_segment):
+            term = rng.choice(keys)
+            roll = rng.random()
+            if roll < 0.35:
+                term = term[:-1] + 'ies' if term.endswith('y') else term + 's'
+            elif roll < 0.55:
+                term = f"the {term}"
+            words.insert(rng.randrange(len(words)), term)
+        text = ' '.join(words)
+        segments.append(text[0].upper() + text[1:] + '.')
+    return segments
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    k = (len(ordered) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def _set_engine(engine, fuzzy_ed):
+    os.environ['CSV_MATCH_ENGINE'] = 'regex' if engine == 'regex' else 'aho'
+    os.environ['CSV_MATCH_FUZZY'] = '1' if engine == 'fuzzy' else '0'
+    os.environ['CSV_MATCH_FUZZY_ED'] = str(fuzzy_ed)
+
+
+def _build_index(matcher, engine, fuzzy_ed):
+    if engine == 'regex':
+        matcher._get_regex()
+    else:
+        matcher._get_automaton()
+        if engine == 'fuzzy':
+            matcher._get_fuzzy_index(fuzzy_ed)
+
+
+def bench_engine(terms, segments, engine, fuzzy_ed=1, measure_memory=True):
+    _set_engine(engine, fuzzy_ed)
+
+    t0 = time.perf_counter()
+    matcher = GlossaryMatcher(terms)
+    _build_index(matcher, engine, fuzzy_ed)
+    build_s = time.perf_counter() - t0
+
+    peak_mb = None
+    if measure_memory:
+        # 另建一份在 tracemalloc 下测内存，避免追踪开销计入构建耗时
+        tracemalloc.start()
+        traced = GlossaryMatcher(terms)
+        _build_index(traced, engine, fuzzy_ed)
+        peak_mb = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        tracemalloc.stop()
+        del traced
+
+    latencies = []
+    matches_total = 0
+    for seg in segments:
+        t0 = time.perf_counter()
+        matches = find_matching_terms(seg, matcher)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        matches_total += len(matches)
+
+    return {
+        'engine': engine,
+        'build_s': round(build_s, 4),
+        'build_peak_mb': round(peak_mb, 2) if peak_mb is not None else None,
+        'latency_ms': {
+            'p50': round(_percentile(latencies, 50), 4),
+            'p95': round(_percentile(latencies, 95), 4),
+            'mean': round(sum(latencies) / len(latencies), 4) if latencies else 0.0,
+        },
+        'matches_total': matches_total,
+        'matches_per_segment': round(matches_total / len(segments), 2) if segments else 0.0,
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def run_benchmark(sizes=None, engines=None, segments=200, seed=42, fuzzy_ed=1, measure_memory=True, out_path=None):
+    sizes = sizes or DEFAULT_SIZES
+    engines = engines or ENGINES
+    saved_env = {k: os.environ.get(k) for k in ('CSV_MATCH_ENGINE', 'CSV_MATCH_FUZZY', 'CSV_MATCH_FUZZY_ED')}
+    results = []
+    try:
+        for size in sizes:
+            rng = random.Random(seed + size)
+            terms = build_glossary(size, rng)
+            segs = build_segments(terms, segments, rng)
+            for engine in engines:
+                row = bench_engine(terms, segs, engine, fuzzy_ed, measure_memory)
+                row['glossary_terms'] = size
+                row['segments'] = segments
+                results.append(row)
+                print(f"terms={size:>7} engine={engine:<5} build={row['build_s']:.3f}s "
+                      f"peak={row['build_peak_mb']}MB p50={row['latency_ms']['p50']:.3f}ms "
+                      f"p95={row['latency_ms']['p95']:.3f}ms matches/seg={row['matches_per_segment']}")
+    finally:
+        for k, v in saved_env.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'git_revision': _git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'seed': seed,
+            'fuzzy_ed': fuzzy_ed,
+        },
+        'results': results,
+    }
+    if out_path:
+        with open(out_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='术语匹配基准')
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)), help='术语表规模，逗号分隔')
+    parser.add_argument('--engines', default=','.join(ENGINES), help='引擎：aho,regex,fuzzy')
+    parser.add_argument('--segments', type=int, default=200, help='每个规模测试的段落数')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--fuzzy-ed', type=int, default=1)
+    parser.add_argument('--no-memory', action='store_true', help='跳过 tracemalloc 内存测量')
+    parser.add_argument('--out', default=f"bench_matching_terms_{datetime.now():%Y%m%d_%H%M%S}.json")
+    args = parser.parse_args(argv)
+    run_benchmark(
+        sizes=[int(s) for s in args.sizes.split(',') if s],
+        engines=[e for e in args.engines.split(',') if e],
+        segments=args.segments,
+        seed=args.seed,
+        fuzzy_ed=args.fuzzy_ed,
+        measure_memory=not args.no_memory,
+        out_path=args.out,
+    )
+    print(f"报告已保存：{args.out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+import asyncio
+import json
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from modules.api_tool import LLMService, KimiProvider, DeepseekProvider
+from modules.translation_core import TranslationCore
+
+VALID = json.dumps({"translation": "译文", "new_terms": []}, ensure_ascii=False)
+
+
+class FakeAsyncCompletions:
+    def __init__(self, content):
+        self.content = content
+        self.calls = []
+
+    async def create(self, **kwargs):
+        self.calls.append((kwargs, threading.current_thread()))
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=self.content))],
+            usage=SimpleNamespace(total_tokens=42),
+        )
+
+
+def fake_client(content):
+    return SimpleNamespace(chat=SimpleNamespace(completions=FakeAsyncCompletions(content)))
+
+
+@pytest.fixture(autouse=True)
+def keys(monkeypatch):
+    monkeypatch.setenv('KIMI_API_KEY', 'test-key')
+    monkeypatch.setenv('DEEPSEEK_API_KEY', 'test-key')
+    monkeypatch.setenv('DEEPSEEK_BASE_URL', 'http://localhost:1/v1')
+
+
+def test_async_client_cached_per_event_loop(monkeypatch):
+    provider = DeepseekProvider()
+    created = []
+    monkeypatch.setattr(provider, '_create_async_client', lambda: created.append(1) or fake_client(VALID))
+
+    async def twice():
+        await provider.generate_completion_async("p", "s")
+        await provider.generate_completion_async("p", "s")
+
+    asyncio.run(twice())
+    assert len(created) == 1
+    asyncio.run(twice())
+    assert len(created) == 2
+
+
+def test_sync_loop_reuses_one_async_client_and_closes_it(monkeypatch, tmp_path):
+    from main import UserConfig, run_sync_translation_loop
+    from modules import api_tool
+
+    monkeypatch.setattr(api_tool, "_provider_registry", {})
+    monkeypatch.setenv("Requests_Per_Minute", "0")
+    monkeypatch.setenv("Tokens_Per_Minute", "0")
+    service = LLMService(provider="deepseek")
+    clients = []
+
+    def create():
+        client = fake_client(VALID)
+        client.closed = False
+
+        async def close():
+            client.closed = True
+
+        client.close = close
+        clients.append(client)
+        return client
+
+    monkeypatch.setattr(service.Linkedprovider, '_create_async_client', create)
+    config = UserConfig(paragraphs=["One.", "Two.", "Three."], total_paragraphs=3,
+                        output_md_file=str(tmp_path / "out.md"), blank_csv_path=str(tmp_path / "terms.csv"))
+
+    total = run_sync_translation_loop(config, TranslationCore(service, translation_cache=None), {}, [], None)
+
+    assert total == 3 * 42
+    assert len(clients) == 1 and len(clients[0].chat.completions.calls) == 3
+    assert clients[0].closed
+
+
+def test_concurrent_loop_closes_async_clients(monkeypatch, tmp_path):
+    from main import run_translation_loop
+    from modules import api_tool
+
+    monkeypatch.setattr(api_tool, "_provider_registry", {})
+    monkeypatch.setenv("Requests_Per_Minute", "0")
+    monkeypatch.setenv("Tokens_Per_Minute", "0")
+    service = LLMService(provider="deepseek")
+    client = fake_client(VALID)
+    client.closed = False
+
+    async def close():
+        client.closed = True
+
+    client.close = close
+    monkeypatch.setattr(service.Linkedprovider, '_create_async_client', lambda: client)
+    paragraphs = [{"paragraph_number": i, "content": f"P{i}.", "meta_data": {}} for i in (1, 2)]
+
+    total = asyncio.run(run_translation_loop(paragraphs, TranslationCore(service, translation_cache=None), {}, [],
+                                             str(tmp_path / "out.md"), False))
+
+    assert total == 2 * 42 and client.closed
+
+
+def test_close_async_clients_uses_aio_aclose_for_genai(monkeypatch):
+    from modules import api_tool
+    from modules.api_tool import close_async_clients
+
+    closed = []
+
+    async def aclose():
+        closed.append("aio")
+
+    genai_like = SimpleNamespace(aio=SimpleNamespace(aclose=aclose), close=lambda: closed.append("sync"))
+    provider = SimpleNamespace()
+    monkeypatch.setattr(api_tool, "_provider_registry", {("gemini",): provider})
+
+    async def run():
+        provider._async_clients = {asyncio.get_running_loop(): genai_like}
+        await close_async_clients()
+        return provider._async_clients
+
+    assert asyncio.run(run()) == {} and closed == ["aio"]
+
+
+def test_kimi_async_keeps_partial_prefix(monkeypatch):
+    provider = KimiProvider()
+    client = fake_client(VALID[1:])
+    monkeypatch.setattr(provider, '_create_async_client', lambda: client)
+    content, tokens = asyncio.run(provider.generate_completion_async("p", "s"))
+    assert content == VALID and tokens == 42
+    kwargs, _ = client.chat.completions.calls[0]
+    assert kwargs['messages'][-1]['partial'] is True
+
+
+def test_translation_core_awaits_async_service_on_loop_thread(monkeypatch):
+    service = LLMService(provider="deepseek")
+    client = fake_client(VALID)
+    monkeypatch.setattr(service.Linkedprovider, '_create_async_client', lambda: client)
+    monkeypatch.setattr(service, 'call_ai_model_api', lambda prompt: pytest.fail("sync path used"))
+    core = TranslationCore(service)
+
+    async def run():
+        return await core.execute_translation_step({"content": "Hello"}, {}, {}), threading.current_thread()
+
+    result, loop_thread = asyncio.run(run())
+    assert result.success and result.content == "译文" and result.tokens == 42
+    assert client.chat.completions.calls[0][1] is loop_thread
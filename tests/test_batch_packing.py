@@ -0,0 +1,160 @@
+import asyncio
+import json
+from unittest.mock import MagicMock
+
+from modules.api_tool import LLMService, parse_batch_translation_response
+from modules.translation_core import TranslationCore, pack_segments
+
+
+def _seg(n, text):
+    return {"paragraph_number": n, "content": text, "meta_data": {"header_path": []}}
+
+
+def test_pack_segments_respects_budget_images_and_max():
+    segs = [_seg(1, "# Title"), _seg(2, "- item"), _seg(3, "x" * 400), _seg(4, "## Next"),
+            {"paragraph_number": 5, "content": "![img](a.png)", "meta_data": {"is_image": True}}, _seg(6, "tail")]
+    packs = pack_segments(segs, token_budget=50)
+    assert [[s["paragraph_number"] for s in p] for p in packs] == [[1, 2], [3], [4], [5], [6]]
+    assert [len(p) for p in pack_segments([_seg(i, "short") for i in range(5)], 100, max_segments=2)] == [2, 2, 1]
+    assert [len(p) for p in pack_segments(segs, 0)] == [1] * 6
+
+
+def test_parse_batch_response_keeps_only_valid_items():
+    text = json.dumps({"items": [
+        {"id": 1, "translation": "一", "new_terms": [{"term": "A", "translation": "甲", "reason": "r"}]},
+        {"id": 2, "translation": "二"},
+        {"id": 1, "translation": "重复", "new_terms": []},
+        {"id": 9, "translation": "多余", "new_terms": []},
+    ]}, ensure_ascii=False)
+    parsed = parse_batch_translation_response(f"```json\n{text}\n```", [1, 2, 3])
+    assert list(parsed) == [1]
+    assert parsed[1]["translation"] == "一" and parsed[1]["notes"] == "- 甲 (原文: A)：r"
+    assert parse_batch_translation_response("not json", [1]) == {}
+
+
+def test_batch_prompt_shares_glossary(monkeypatch):
+    monkeypatch.setenv("KIMI_API_KEY", "test-key")
+    monkeypatch.setenv("BASE_PROMPT", "<BASE>")
+    service = LLMService(provider="kimi")
+    prompt = service.create_batch_prompt([(1, "Night City"), (2, "Arasaka")], {"Night City": "夜之城"})
+    assert prompt.count("<BASE>") == 1 and prompt.count("术语表") == 1
+    assert '<segment id="1">\nNight City\n</segment>' in prompt and '<segment id="2">' in prompt
+    assert service.supports_batch
+
+
+def _item(sid, text):
+    return {"translation": text, "notes": "", "new_terms": []}
+
+
+def test_batch_splits_and_retries_failed_items():
+    service = MagicMock(spec=LLMService)
+    service.supports_batch = True
+    service.create_batch_prompt.side_effect = lambda segs, terms: [sid for sid, _ in segs]
+    calls = []
+
+    async def batch(prompt, ids):
+        calls.append(len(ids))
+        if len(ids) == 4:
+            # 首次请求只有第 1、3 段通过校验
+            return {1: _item(1, "一"), 3: _item(3, "三")}, 100
+        return {sid: _item(sid, f"重试{sid}") for sid in ids}, 10
+
+    service.call_ai_model_api_batch_async.side_effect = batch
+    service.create_prompt.return_value = "prompt"
+    service.call_ai_model_api_async.return_value = ({"translation": "单段", "notes": "", "new_terms": []}, 7)
+    segments = [_seg(1, "a"), _seg(2, "bb"), _seg(3, "a"), _seg(4, "bb")]
+
+    results = asyncio.run(TranslationCore(service).execute_translation_batch(segments, {}, []))
+
+    assert [r.content for r in results] == ["一", "单段", "三", "单段"]
+    assert all(r.success for r in results)
+    # 4 段合并请求后，失败的两段拆成单段重试
+    assert calls == [4]
+    assert service.call_ai_model_api_async.call_count == 2
+    assert results[0].tokens + results[2].tokens == 100
+
+
+def test_batch_split_halves_before_single_fallback():
+    service = MagicMock(spec=LLMService)
+    service.supports_batch = True
+    service.create_batch_prompt.side_effect = lambda segs, terms: [sid for sid, _ in segs]
+    calls = []
+
+    async def batch(prompt, ids):
+        calls.append(len(ids))
+        if len(ids) == 6:
+            return {1: _item(1, "一"), 2: _item(2, "二")}, 60
+        return {sid: _item(sid, f"重试{sid}") for sid in ids}, 20
+
+    service.call_ai_model_api_batch_async.side_effect = batch
+    segments = [_seg(i, "text") for i in range(1, 7)]
+
+    results = asyncio.run(TranslationCore(service).execute_translation_batch(segments, {}, []))
+
+    assert calls == [6, 2, 2]
+    assert [r.content for r in results] == ["一", "二", "重试1", "重试2", "重试1", "重试2"]
+    assert sum(r.tokens for r in results) == 100
+
+
+def _batch_service():
+    service = MagicMock(spec=LLMService)
+    service.supports_batch = True
+    service.provider_name = "fake"
+    service.create_prompt.side_effect = lambda text, terms: f"prompt:{text}"
+    service.create_batch_prompt.side_effect = lambda segs, terms: [sid for sid, _ in segs]
+    return service
+
+
+def test_batch_reads_and_fills_translation_cache(tmp_path):
+    from modules.cache_tool import TranslationCache
+
+    cache = TranslationCache(str(tmp_path / "cache.sqlite3"))
+    service = _batch_service()
+    calls = []
+
+    async def batch(prompt, ids):
+        calls.append(len(ids))
+        return {sid: _item(sid, f"译{sid}") for sid in ids}, 30
+
+    service.call_ai_model_api_batch_async.side_effect = batch
+    core = TranslationCore(service, translation_cache=cache, stage_timeouts={}, segment_timeout=0)
+    segments = [_seg(1, "a"), _seg(2, "b"), _seg(3, "c")]
+    cache.put(core._cache_key("prompt:b"), {"translation": "缓存", "notes": "", "new_terms": []}, 9)
+
+    results = asyncio.run(core.execute_translation_batch(segments, {}, []))
+
+    # 命中的第 2 段不进入合并请求，其余两段合并为一次请求并写入缓存
+    assert calls == [2]
+    assert [r.content for r in results] == ["译1", "缓存", "译2"]
+    assert [r.cache_hit for r in results] == [False, True, False]
+    assert results[1].tokens == 0 and results[0].tokens + results[2].tokens == 30
+    assert cache.get(core._cache_key("prompt:a"))["response"]["translation"] == "译1"
+
+    results = asyncio.run(core.execute_translation_batch(segments, {}, []))
+    assert calls == [2] and all(r.cache_hit for r in results)
+
+
+def test_batch_deadline_scales_with_pack_size():
+    service = _batch_service()
+    calls = []
+
+    async def batch(prompt, ids):
+        calls.append(len(ids))
+        if len(ids) > 1:
+            await asyncio.sleep(0.3)
+        return {sid: _item(sid, f"译{sid}") for sid in ids}, 10
+
+    service.call_ai_model_api_batch_async.side_effect = batch
+    service.call_ai_model_api_async.return_value = ({"translation": "单段", "notes": "", "new_terms": []}, 5)
+    segments = [_seg(i, "text") for i in range(1, 5)]
+
+    # 阶段超时 0.1 秒按 4 段放大为 0.4 秒，合并请求在时限内完成
+    core = TranslationCore(service, translation_cache=None, stage_timeouts={"translate": 0.1}, segment_timeout=0)
+    assert [r.content for r in asyncio.run(core.execute_translation_batch(segments, {}, []))] == ["译1", "译2", "译3", "译4"]
+
+    # 整包时限 0.05 × 4 秒先到：不再重试合并请求，逐段走单段流程
+    calls.clear()
+    core = TranslationCore(service, translation_cache=None, stage_timeouts={}, segment_timeout=0.05)
+    results = asyncio.run(core.execute_translation_batch(segments, {}, []))
+    assert calls == [4]
+    assert [r.content for r in results] == ["单段"] * 4
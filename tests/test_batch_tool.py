@@ -0,0 +1,164 @@
+import json
+
+import pytest
+from openai import OpenAI
+
+from modules.api_tool import LLMService
+from modules.batch_tool import (
+    LocalBatchServer,
+    OpenAIBatchAdapter,
+    build_batch_adapter,
+    echo_responder,
+    render_batch_requests,
+    run_batch_translation,
+)
+from modules.read_tool import read_and_process_structured_paragraphs_to_json
+
+SOURCE = "# A\n\nFirst paragraph about Night City.\n\n# B\n\nSecond paragraph.\n\n# C\n\nThird paragraph.\n"
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setenv("KIMI_API_KEY", "test-key")
+    monkeypatch.setenv("BASE_PROMPT", "<BASE>")
+    monkeypatch.setenv("SYSTEM_PROMPT", "<SYSTEM>")
+    return LLMService(provider="kimi")
+
+
+@pytest.fixture
+def json_path(tmp_path):
+    md = tmp_path / "doc.md"
+    md.write_text(SOURCE, encoding="utf-8")
+    return read_and_process_structured_paragraphs_to_json(str(md), max_chunk_size=600, min_chunk_size=0)
+
+
+def _items(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _flaky_responder(failures):
+    # 含指定原文的段落首次请求时失败：error 为 5xx，garbage 为非 JSON 输出
+    seen = set()
+
+    def respond(body):
+        prompt = body["messages"][1]["content"]
+        for marker, kind in failures.items():
+            if marker in prompt and marker not in seen:
+                seen.add(marker)
+                if kind == "error":
+                    raise RuntimeError("upstream 500")
+                reply = echo_responder(body)
+                reply["choices"][0]["message"]["content"] = "抱歉，无法翻译"
+                return reply
+        return echo_responder(body)
+
+    return respond
+
+
+@pytest.mark.parametrize("provider", ["doubao", "mock"])
+def test_providers_without_chat_completions_batch_are_rejected(monkeypatch, provider):
+    monkeypatch.setenv("DOUBAO_API_KEY", "test-key")
+    llm_service = LLMService(provider=provider)
+    assert not llm_service.supports_batch_api
+    for kind in ("provider", "local"):
+        with pytest.raises(ValueError, match="不支持 Batch API"):
+            build_batch_adapter(llm_service, kind)
+
+
+def test_render_requests_uses_provider_body(service, json_path, tmp_path):
+    items = _items(json_path)["text_info"]
+    path = tmp_path / "requests.jsonl"
+    count = render_batch_requests(items, service, {"Night City": "夜之城"}, str(path))
+    lines = [json.loads(l) for l in path.read_text(encoding="utf-8").splitlines()]
+    assert count == len(items) == len(lines)
+    assert [l["custom_id"] for l in lines] == [f"paragraph-{i['paragraph_number']}" for i in items]
+    body = lines[0]["body"]
+    assert lines[0]["url"] == "/v1/chat/completions" and body["model"] == service.Linkedprovider.model
+    assert body["messages"][0]["content"] == "<SYSTEM>"
+    assert "Night City -> 夜之城" in body["messages"][1]["content"]
+    # Kimi 的 partial 前缀随请求体一起提交
+    assert body["messages"][-1] == {"role": "assistant", "content": "{", "partial": True}
+
+
+def test_batch_round_trip_resubmits_failed_items(service, json_path, tmp_path):
+    output = tmp_path / "doc_output.md"
+    responder = _flaky_responder({"Second paragraph": "error", "Third paragraph": "garbage"})
+    with LocalBatchServer(responder=responder) as server:
+        stats = run_batch_translation(
+            json_path, str(output), service, OpenAIBatchAdapter(server.client()),
+            poll_interval=0.05, on_status=None,
+        )
+
+    data = _items(json_path)
+    assert stats["rounds"] == 2 and len(stats["batch_ids"]) == 2 and stats["failed"] == []
+    assert stats["submitted"] == len(data["text_info"]) + 2 and stats["total_tokens"] > 0
+    assert all(item["status"] == "completed" for item in data["text_info"])
+    assert data["batch"]["completed"] == len(data["text_info"])
+    text = output.read_text(encoding="utf-8")
+    assert text.index("First paragraph") < text.index("Second paragraph") < text.index("Third paragraph")
+
+
+def test_items_left_pending_after_resubmits_exhausted(service, json_path, tmp_path):
+    def respond(body):
+        if "Second paragraph" in body["messages"][1]["content"]:
+            raise RuntimeError("always down")
+        return echo_responder(body)
+
+    output = tmp_path / "doc_output.md"
+    with LocalBatchServer(responder=respond) as server:
+        stats = run_batch_translation(
+            json_path, str(output), service, OpenAIBatchAdapter(server.client()),
+            poll_interval=0.05, max_resubmits=1, on_status=None,
+        )
+
+    failed = [i["paragraph_number"] for i in _items(json_path)["text_info"] if "Second paragraph" in i["content"]]
+    assert stats["failed"] == failed and stats["rounds"] == 2
+    # 有序写出在失败段落处停住，之后的段落留在 JSON 中
+    assert "Third paragraph" not in output.read_text(encoding="utf-8")
+
+
+def test_interrupted_run_resumes_active_batch(service, json_path, tmp_path):
+    with LocalBatchServer(responder=echo_responder) as server:
+        adapter = OpenAIBatchAdapter(server.client())
+        requests = tmp_path / "requests.jsonl"
+        render_batch_requests(_items(json_path)["text_info"], service, None, str(requests))
+        batch_id = adapter.submit(str(requests))
+        data = _items(json_path)
+        data["batch"] = {"batch_ids": [batch_id], "rounds": 1, "submitted": 3, "active_batch_id": batch_id}
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+
+        stats = run_batch_translation(json_path, str(tmp_path / "out.md"), service, adapter, poll_interval=0.05, on_status=None)
+
+    assert stats["batch_ids"] == [batch_id] and stats["rounds"] == 1 and stats["failed"] == []
+    assert len(server.batches) == 1
+
+
+def test_local_server_forwards_gpt_body_with_prompt_cache_key(monkeypatch, json_path, tmp_path):
+    import httpx
+
+    from modules.api_tool import prompt_cache_key
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setenv("BASE_PROMPT", "<BASE>")
+    monkeypatch.setenv("SYSTEM_PROMPT", "<SYSTEM>")
+    gpt = LLMService(provider="gpt")
+    forwarded = []
+
+    def handler(request):
+        body = json.loads(request.content)
+        forwarded.append(body)
+        return httpx.Response(200, json=echo_responder(body))
+
+    # 上游用真实 SDK 客户端，只替换传输层
+    upstream = OpenAI(api_key="test-key", base_url="https://api.openai.test/v1",
+                      http_client=httpx.Client(transport=httpx.MockTransport(handler)))
+    with LocalBatchServer(upstream=upstream) as server:
+        stats = run_batch_translation(
+            json_path, str(tmp_path / "doc_output.md"), gpt, OpenAIBatchAdapter(server.client()),
+            poll_interval=0.05, on_status=None,
+        )
+
+    assert stats["failed"] == [] and len(forwarded) == len(_items(json_path)["text_info"])
+    assert all(body["prompt_cache_key"] == prompt_cache_key("<SYSTEM>") for body in forwarded)
@@ -0,0 +1,20 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_matching_terms import run_benchmark
+
+
+def test_benchmark_smoke(tmp_path):
+    out = tmp_path / "report.json"
+    report = run_benchmark(sizes=[200], segments=5, measure_memory=False, out_path=str(out))
+    with open(out, encoding="utf-8") as f:
+        assert json.load(f) == report
+    rows = {row['engine']: row for row in report['results']}
+    assert set(rows) == {'aho', 'regex', 'fuzzy'}
+    # aho 与 regex 引擎的命中数一致，fuzzy 在其基础上只增不减
+    assert rows['aho']['matches_total'] == rows['regex']['matches_total'] > 0
+    assert rows['fuzzy']['matches_total'] >= rows['aho']['matches_total']
+    assert rows['aho']['latency_ms']['p95'] >= rows['aho']['latency_ms']['p50']
@@ -0,0 +1,68 @@
+import asyncio
+from unittest.mock import MagicMock
+
+from modules.api_tool import LLMService
+from modules.cache_tool import TranslationCache, get_translation_cache, make_cache_key
+from modules.translation_core import TranslationCore
+
+
+def test_cache_key_covers_every_input():
+    base = ("kimi", "kimi-k2", "sys", "base", "prompt")
+    key = make_cache_key(*base)
+    assert key == make_cache_key(*base)
+    for i in range(len(base)):
+        changed = list(base)
+        changed[i] = changed[i] + "x"
+        assert make_cache_key(*changed) != key
+    # 字段边界不同、拼接结果相同时也不能碰撞
+    assert make_cache_key("ab", "c", "", "", "") != make_cache_key("a", "bc", "", "", "")
+
+
+def test_cache_roundtrip_stats_and_persistence(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = TranslationCache(path)
+    assert cache.get("k") is None
+    cache.put("k", {"translation": "译文", "notes": "注", "new_terms": [{"term": "a", "translation": "甲", "reason": ""}]}, 120, 30)
+    hit = cache.get("k")
+    assert hit["response"]["new_terms"][0]["translation"] == "甲"
+    assert (hit["tokens"], hit["repair_tokens"]) == (120, 30)
+    assert cache.stats() == {"entries": 1, "hits": 1, "misses": 1, "hit_rate": 0.5, "tokens_saved": 150}
+    cache.close()
+    assert TranslationCache(path).get("k")["response"]["translation"] == "译文"
+
+
+def test_cache_lru_eviction(tmp_path):
+    cache = TranslationCache(str(tmp_path / "cache.sqlite3"), max_entries=2)
+    cache.put("a", {"translation": "A"}, 1)
+    cache.put("b", {"translation": "B"}, 1)
+    # 访问 a 使 b 成为最久未使用
+    cache._conn.execute("UPDATE responses SET last_access = last_access - 10 WHERE key = 'b'")
+    assert cache.get("a") is not None
+    cache.put("c", {"translation": "C"}, 1)
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
+
+
+def test_cache_disabled_by_default(monkeypatch):
+    monkeypatch.delenv("TRANSLATION_CACHE", raising=False)
+    assert get_translation_cache() is None
+
+
+def test_translation_core_uses_cache(tmp_path):
+    mock_llm = MagicMock(spec=LLMService)
+    mock_llm.provider_name = "kimi"
+    mock_llm.system_prompt = "sys"
+    mock_llm.structured = True
+    mock_llm.create_prompt.return_value = "prompt"
+    mock_llm.call_ai_model_api_async.return_value = ({"translation": "译文", "notes": "", "new_terms": []}, 100)
+    cache = TranslationCache(str(tmp_path / "cache.sqlite3"))
+    core = TranslationCore(mock_llm, translation_cache=cache)
+
+    first = asyncio.run(core.execute_translation_step({"content": "Text"}, {}, []))
+    second = asyncio.run(core.execute_translation_step({"content": "Text"}, {}, []))
+
+    assert mock_llm.call_ai_model_api_async.call_count == 1
+    assert (first.cache_hit, first.tokens) == (False, 100)
+    assert (second.cache_hit, second.tokens, second.content) == (True, 0, "译文")
+    assert cache.stats()["tokens_saved"] == 100
@@ -0,0 +1,162 @@
+import asyncio
+
+import httpx
+import openai
+
+from modules.concurrency_tool import (
+    AdaptiveConcurrencyController,
+    RequestHedger,
+    classify_error,
+    retry_after_from_headers,
+    THROTTLED,
+    TIMEOUT,
+    SERVER_ERROR,
+    OTHER,
+)
+
+
+def _status_error(cls, status, headers=None):
+    request = httpx.Request("POST", "https://api.example.com/v1/chat/completions")
+    response = httpx.Response(status, headers=headers or {}, request=request)
+    return cls("error", response=response, body=None)
+
+
+def test_classify_openai_errors():
+    assert classify_error(_status_error(openai.RateLimitError, 429, {"retry-after": "3"})) == (THROTTLED, 3.0)
+    assert classify_error(_status_error(openai.InternalServerError, 503))[0] == SERVER_ERROR
+    request = httpx.Request("POST", "https://api.example.com")
+    assert classify_error(openai.APITimeoutError(request=request))[0] == TIMEOUT
+    assert classify_error(httpx.ReadTimeout("slow"))[0] == TIMEOUT
+    assert classify_error(asyncio.TimeoutError())[0] == TIMEOUT
+    assert classify_error(ValueError("bad json"))[0] == OTHER
+
+
+def test_retry_after_headers():
+    assert retry_after_from_headers({"retry-after-ms": "1500"}) == 1.5
+    assert retry_after_from_headers({"x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": "1m30s"}) == 90.0
+    assert retry_after_from_headers({"x-ratelimit-remaining-tokens": "0", "x-ratelimit-reset-tokens": "250ms"}) == 0.25
+    # 仍有余量时 reset 头只是信息，不应暂停
+    assert retry_after_from_headers({"x-ratelimit-remaining-requests": "5", "x-ratelimit-reset-requests": "2s"}) is None
+    assert retry_after_from_headers({}) is None
+
+
+def test_additive_increase_while_latency_flat():
+    controller = AdaptiveConcurrencyController(2, max_limit=4)
+    for _ in range(2):
+        controller.record_success(1.0)
+    assert controller.limit == 3
+    for _ in range(3):
+        controller.record_success(1.0)
+    assert controller.limit == 4
+    for _ in range(10):
+        controller.record_success(1.0)
+    assert controller.limit == 4
+
+
+def test_no_increase_when_latency_rises():
+    controller = AdaptiveConcurrencyController(2, max_limit=8)
+    controller.record_success(1.0)
+    for _ in range(10):
+        controller.record_success(5.0)
+    assert controller.limit <= 3
+
+
+def test_multiplicative_decrease_once_per_cooldown():
+    controller = AdaptiveConcurrencyController(8, max_limit=8)
+    err = _status_error(openai.RateLimitError, 429)
+    assert controller.record_failure(err) == THROTTLED
+    assert controller.limit == 4
+    controller.record_failure(err)
+    assert controller.limit == 4
+    controller._last_decrease -= 10
+    controller.record_failure(_status_error(openai.InternalServerError, 500))
+    assert controller.limit == 2
+    assert controller.record_failure(ValueError("parse")) == OTHER
+    report = controller.report()
+    assert report["decreases"] == 2
+    assert [h["reason"] for h in report["history"]] == ["start", "decrease:throttled", "decrease:server_error"]
+
+
+def test_disabled_controller_keeps_limit():
+    controller = AdaptiveConcurrencyController(3, max_limit=3, enabled=False)
+    controller.record_failure(_status_error(openai.RateLimitError, 429))
+    controller.record_success(1.0)
+    assert controller.limit == 3
+
+
+def test_slots_bound_in_flight_and_retry_after_pauses():
+    async def run():
+        controller = AdaptiveConcurrencyController(2, max_limit=4)
+        peak = 0
+
+        async def job():
+            nonlocal peak
+            async with controller.slot():
+                peak = max(peak, controller.in_flight)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(job() for _ in range(6)))
+        assert peak == 2
+        assert controller.in_flight == 0
+
+        controller.record_failure(_status_error(openai.RateLimitError, 429, {"retry-after-ms": "200"}))
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        async with controller.slot():
+            pass
+        assert loop.time() - start >= 0.15
+
+    asyncio.run(run())
+
+
+def _warm_hedger(budget=1.0, latency=0.01):
+    hedger = RequestHedger(percentile=90, budget=budget, min_samples=5)
+    for _ in range(10):
+        hedger.record_latency(latency)
+    hedger.requests = 10
+    return hedger
+
+
+async def _reply(value, delay, log=None):
+    try:
+        await asyncio.sleep(delay)
+    except asyncio.CancelledError:
+        if log is not None:
+            log.append(value)
+        raise
+    return value
+
+
+def test_hedger_waits_for_samples_before_hedging():
+    hedger = RequestHedger(min_samples=3, budget=1.0)
+    result = asyncio.run(hedger.race(lambda: _reply("primary", 0.05), lambda: _reply("hedge", 0)))
+    assert result == "primary" and hedger.hedged == 0 and hedger.threshold() is None
+
+
+def test_hedge_wins_and_slow_primary_is_cancelled():
+    hedger = _warm_hedger()
+    cancelled = []
+    result = asyncio.run(hedger.race(
+        lambda: _reply("primary", 5, cancelled), lambda: _reply("hedge", 0.01), cost=lambda r: 100 if r is None else 1))
+    assert result == "hedge" and cancelled == ["primary"]
+    assert hedger.report()["hedge_wins"] == 1 and hedger.extra_tokens == 100
+
+
+def test_invalid_result_waits_for_the_other_request():
+    hedger = _warm_hedger()
+    result = asyncio.run(hedger.race(
+        lambda: _reply("primary", 0.1), lambda: _reply("bad", 0.01), accept=lambda r: r != "bad", cost=lambda r: 7))
+    assert result == "primary" and hedger.hedge_wins == 0 and hedger.extra_tokens == 7
+    with_errors = _warm_hedger()
+
+    async def broken():
+        raise RuntimeError("down")
+
+    assert asyncio.run(with_errors.race(lambda: _reply("primary", 0.05), broken)) == "primary"
+
+
+def test_hedging_respects_budget():
+    hedger = _warm_hedger(budget=0.05)
+    assert asyncio.run(hedger.race(lambda: _reply("primary", 0.05), lambda: _reply("hedge", 0))) == "primary"
+    # 11 次请求的 5% 不足 1 次，不发对冲
+    assert hedger.hedged == 0 and hedger.requests == 11
@@ -0,0 +1,115 @@
+import asyncio
+import time
+
+import pytest
+
+import modules.api_tool as api_tool
+from modules.api_tool import DeadlineExceeded, LLMService, current_deadline, request_timeout
+from modules.concurrency_tool import TIMEOUT, classify_error
+from modules.simulation_tool import MockOpenAIServer, SimulationProfile, TranslationSimulator
+from modules.translation_core import TranslationCore
+
+OK = ({"translation": "T", "notes": "", "new_terms": []}, 10)
+
+
+class _HangingService:
+    """前 hangs 次调用一直挂起，之后正常返回；记录每次调用时 provider 可见的剩余超时。"""
+
+    provider_name = "fake"
+    structured = True
+
+    def __init__(self, hangs):
+        self.hangs = hangs
+        self.calls = 0
+        self.timeouts = []
+
+    def create_prompt(self, text, terms):
+        return text
+
+    async def call_ai_model_api_async(self, prompt):
+        self.calls += 1
+        self.timeouts.append(request_timeout())
+        if self.calls <= self.hangs:
+            await asyncio.Event().wait()
+        return OK
+
+
+@pytest.fixture
+def fast_backoff(monkeypatch):
+    real_sleep = asyncio.sleep
+
+    async def sleep(delay, *args, **kwargs):
+        return await real_sleep(min(delay, 0.01), *args, **kwargs)
+
+    monkeypatch.setattr(asyncio, "sleep", sleep)
+
+
+def test_stage_timeout_is_passed_down_and_retried(fast_backoff):
+    service = _HangingService(hangs=1)
+    core = TranslationCore(service, translation_cache=None, stage_timeouts={"translate": 0.2}, segment_timeout=0)
+
+    result = asyncio.run(core.execute_translation_step({"content": "text", "meta_data": {}}, {}, {}))
+
+    assert result.success and result.content == "T" and service.calls == 2
+    assert all(0 < t <= 0.2 for t in service.timeouts)
+    assert current_deadline.get() is None
+
+
+def test_segment_deadline_stops_retrying(fast_backoff):
+    service = _HangingService(hangs=100)
+    core = TranslationCore(service, translation_cache=None, stage_timeouts={"translate": 0.1}, segment_timeout=0.35)
+
+    started = time.monotonic()
+    result = asyncio.run(core.execute_translation_step({"content": "text", "meta_data": {}}, {}, {}, max_api_retries=50))
+
+    assert not result.success and "总时限" in result.error
+    assert time.monotonic() - started < 1.0 and service.calls < 10
+
+
+@pytest.fixture
+def slow_server(monkeypatch):
+    monkeypatch.setattr(api_tool, "_provider_registry", {})
+    monkeypatch.setenv("SYSTEM_PROMPT", "<SYSTEM>")
+    monkeypatch.setenv("BASE_PROMPT", "<BASE>")
+    monkeypatch.setenv("Requests_Per_Minute", "0")
+    monkeypatch.setenv("Tokens_Per_Minute", "0")
+    simulator = TranslationSimulator(SimulationProfile(latency=5.0, latency_dist="fixed"))
+    with MockOpenAIServer(simulator) as server:
+        monkeypatch.setenv("DEEPSEEK_BASE_URL", server.base_url)
+        monkeypatch.setenv("DEEPSEEK_API_KEY", "test-key")
+        yield LLMService(provider="deepseek")
+
+
+def test_client_request_timeout_follows_deadline(slow_server):
+    token = current_deadline.set(time.monotonic() + 0.3)
+    started = time.monotonic()
+    try:
+        with pytest.raises(Exception) as excinfo:
+            slow_server.Linkedprovider.client.with_options(max_retries=0).chat.completions.create(
+                **slow_server.Linkedprovider._request("hi", "<SYSTEM>"), **api_tool._timeout_kwargs()
+            )
+    finally:
+        current_deadline.reset(token)
+    assert time.monotonic() - started < 2.0
+    assert classify_error(excinfo.value)[0] == TIMEOUT
+    token = current_deadline.set(time.monotonic() - 1)
+    try:
+        with pytest.raises(DeadlineExceeded):
+            request_timeout()
+    finally:
+        current_deadline.reset(token)
+
+
+def test_cancelling_the_run_aborts_in_flight_request(slow_server):
+    core = TranslationCore(slow_server, translation_cache=None, stage_timeouts={}, segment_timeout=0)
+
+    async def run():
+        task = asyncio.create_task(core.execute_translation_step({"content": "text", "meta_data": {}}, {}, {}))
+        await asyncio.sleep(0.3)
+        started = time.monotonic()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return time.monotonic() - started
+
+    assert asyncio.run(run()) < 0.5
@@ -0,0 +1,38 @@
+import random
+import string
+
+import pytest
+
+from modules.csv_process_tool import GlossaryMatcher, find_matching_terms
+
+
+@pytest.fixture(autouse=True)
+def fuzzy_on(monkeypatch):
+    monkeypatch.setenv('CSV_MATCH_ENGINE', 'aho')
+    monkeypatch.setenv('CSV_MATCH_FUZZY', '1')
+
+
+def test_fuzzy_index_finds_typo():
+    terms = {"priority": "优先级", "board game": "桌游"}
+    assert find_matching_terms("The priorty is high.", terms) == {"priority": "优先级"}
+
+
+@pytest.mark.parametrize("ed", [1, 2])
+def test_fuzzy_index_matches_scan(monkeypatch, ed):
+    monkeypatch.setenv('CSV_MATCH_FUZZY_ED', str(ed))
+    rng = random.Random(ed)
+    word = lambda lo, hi: ''.join(rng.choice('abcdeh') for _ in range(rng.randint(lo, hi)))
+    terms = {word(1, 7): str(i) for i in range(300)}
+    matcher = GlossaryMatcher(terms)
+    for _ in range(20):
+        text = ' '.join(word(1, 8) for _ in range(30)) + ' .'
+        indexed, scanned = {}, {}
+        matcher._match_fuzzy_index(text, indexed, ed)
+        matcher._match_fuzzy_scan(text, scanned, ed)
+        assert indexed == scanned
+        assert list(indexed) == list(scanned)
+
+
+def test_fuzzy_scan_engine_still_available(monkeypatch):
+    monkeypatch.setenv('CSV_MATCH_FUZZY_ENGINE', 'scan')
+    assert find_matching_terms("The priorty is high.", {"priority": "优先级"}) == {"priority": "优先级"}
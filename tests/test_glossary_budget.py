@@ -0,0 +1,67 @@
+import csv
+
+import pytest
+
+from modules.api_tool import LLMService, estimate_tokens
+from modules.count_tool import append_counting_row
+from modules.csv_process_tool import GlossaryMatcher
+
+
+@pytest.fixture(autouse=True)
+def matcher_env(monkeypatch):
+    monkeypatch.setenv('CSV_MATCH_FUZZY', '0')
+    monkeypatch.setenv('KIMI_API_KEY', 'test-key')
+
+
+TERMS = {"Night": "夜", "City": "城市", "Night City": "夜之城", "Arasaka": "荒坂"}
+TEXT = "Night City never sleeps. Arasaka owns the city; Arasaka owns the night."
+
+
+@pytest.mark.parametrize("engine", ["aho", "regex"])
+def test_longest_match_wins(monkeypatch, engine):
+    monkeypatch.setenv('CSV_MATCH_ENGINE', engine)
+    matcher = GlossaryMatcher(TERMS)
+    assert set(matcher.match(TEXT)) == set(TERMS)
+    monkeypatch.setenv('CSV_MATCH_LONGEST', '1')
+    assert matcher.match("Night City never sleeps.") == {"Night City": "夜之城"}
+    # 在别处独立出现时仍然命中
+    assert set(matcher.match(TEXT)) == set(TERMS)
+
+
+def test_matches_ranked_by_occurrence_only_under_budget(monkeypatch):
+    monkeypatch.setenv('CSV_MATCH_LONGEST', '1')
+    monkeypatch.delenv('GLOSSARY_TOKEN_BUDGET', raising=False)
+    # 不截断时保持首次出现的先后顺序
+    assert list(GlossaryMatcher(TERMS).match(TEXT)) == ["Night City", "Arasaka", "City", "Night"]
+    monkeypatch.setenv('GLOSSARY_TOKEN_BUDGET', '50')
+    assert list(GlossaryMatcher(TERMS).match(TEXT))[0] == "Arasaka"
+
+
+def test_prompt_glossary_budget(monkeypatch):
+    monkeypatch.setenv('GLOSSARY_TOKEN_BUDGET', str(estimate_tokens("Arasaka -> 荒坂") + 1))
+    service = LLMService()
+    prompt = service.create_prompt("text", {"Arasaka": "荒坂", "Night City": "夜之城"})
+    assert "Arasaka -> 荒坂" in prompt
+    assert "Night City" not in prompt
+    assert service.glossary_tokens_saved == estimate_tokens("Night City -> 夜之城") + 1
+
+
+def test_prompt_without_budget_keeps_all_terms(monkeypatch):
+    monkeypatch.delenv('GLOSSARY_TOKEN_BUDGET', raising=False)
+    service = LLMService()
+    prompt = service.create_prompt("text", {"Arasaka": "荒坂", "Night City": "夜之城"})
+    assert "Night City -> 夜之城" in prompt
+    assert service.glossary_tokens_saved == 0
+
+
+def test_append_counting_row_upgrades_header(tmp_path):
+    path = tmp_path / "counting_table.csv"
+    path.write_text("Input file,Tokens,Capture\na.md,10,5\n", encoding="utf-8")
+    append_counting_row(str(path), {"Input file": "b.md", "Tokens": 20, "Glossary tokens saved": 7})
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = list(csv.reader(f))
+    assert rows == [
+        ["Input file", "Tokens", "Capture", "Glossary tokens saved"],
+        ["a.md", "10", "5", ""],
+        ["b.md", "20", "", "7"],
+    ]
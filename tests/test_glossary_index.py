@@ -0,0 +1,131 @@
+import csv
+import json
+import os
+import pickle
+
+import pytest
+
+from modules import csv_process_tool
+from modules.csv_process_tool import (
+    GlossaryMatcher,
+    glossary_index_path,
+    load_glossary_matcher,
+    validate_csv_file,
+)
+
+
+@pytest.fixture(autouse=True)
+def set_aho_engine(monkeypatch, tmp_path):
+    monkeypatch.setenv('CSV_MATCH_ENGINE', 'aho')
+    monkeypatch.setenv('CSV_MATCH_FUZZY', '0')
+    monkeypatch.setenv('GLOSSARY_INDEX', 'True')
+    monkeypatch.setenv('GLOSSARY_INDEX_DIR', str(tmp_path / 'index'))
+    monkeypatch.setattr(csv_process_tool, "_matcher_cache", type(csv_process_tool._matcher_cache)())
+
+
+def write_csv(path, rows):
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        w = csv.writer(f)
+        for r in rows:
+            w.writerow(r)
+
+
+def test_validate_writes_index_and_loader_uses_it(tmp_path, monkeypatch):
+    p = tmp_path / "terms.csv"
+    write_csv(p, [["term", "definition"], ["outlaw", "法外之徒"], ["board game", "桌游"]])
+    ok, path = validate_csv_file(str(p))
+    assert ok
+    assert os.path.exists(glossary_index_path(path))
+
+    def fail(*a, **k):
+        raise AssertionError("CSV should not be parsed when the index is fresh")
+    monkeypatch.setattr(csv_process_tool, "load_terms_dict", fail)
+    matcher = load_glossary_matcher(path)
+    assert matcher.terms_dict == {"outlaw": "法外之徒", "board game": "桌游"}
+    assert matcher._automaton is not None
+    assert matcher.match("They played a board game with outlaws.") == {"outlaw": "法外之徒", "board game": "桌游"}
+
+
+def test_index_invalidated_when_content_changes(tmp_path):
+    p = tmp_path / "terms.csv"
+    write_csv(p, [["term", "definition"], ["outlaw", "法外之徒"]])
+    assert load_glossary_matcher(str(p)).terms_dict == {"outlaw": "法外之徒"}
+
+    write_csv(p, [["term", "definition"], ["outlaw", "亡命徒"], ["priority", "优先级"]])
+    os.utime(p, ns=(0, os.stat(p).st_mtime_ns + 1_000_000_000))
+    assert load_glossary_matcher(str(p)).terms_dict == {"outlaw": "亡命徒", "priority": "优先级"}
+
+
+def test_index_reused_when_only_mtime_changes(tmp_path, monkeypatch):
+    p = tmp_path / "terms.csv"
+    write_csv(p, [["term", "definition"], ["outlaw", "法外之徒"]])
+    load_glossary_matcher(str(p))
+    os.utime(p, ns=(0, os.stat(p).st_mtime_ns + 1_000_000_000))
+
+    monkeypatch.setattr(csv_process_tool, "load_terms_dict", lambda path: pytest.fail("index should be reused"))
+    assert validate_csv_file(str(p)) == (True, str(p))
+    assert load_glossary_matcher(str(p)).terms_dict == {"outlaw": "法外之徒"}
+
+
+def test_invalid_csv_does_not_write_index(tmp_path):
+    p = tmp_path / "empty.csv"
+    write_csv(p, [["term", "definition"], ["", "法外之徒"]])
+    ok, _ = validate_csv_file(str(p))
+    assert not ok
+    assert not os.path.exists(glossary_index_path(str(p)))
+
+
+def test_index_lives_outside_glossary_folder_and_is_plain_data(tmp_path, monkeypatch):
+    uploads = tmp_path / "uploads"
+    uploads.mkdir()
+    p = uploads / "x.csv"
+    write_csv(p, [["term", "definition"], ["outlaw", "法外之徒"]])
+
+    class Exploit:
+        def __reduce__(self):
+            return (pytest.fail, ("glossary index must never be unpickled",))
+
+    # 与术语表同目录、旧命名的 pickle 索引不再被读取
+    with open(f"{p}.index.pkl", "wb") as f:
+        pickle.dump({"version": 1}, f)
+        pickle.dump(Exploit(), f)
+
+    assert load_glossary_matcher(str(p)).terms_dict == {"outlaw": "法外之徒"}
+    index_path = glossary_index_path(str(p))
+    assert os.path.dirname(index_path) == str(tmp_path / "index")
+    with open(index_path, encoding="utf-8") as f:
+        assert json.load(f)["terms"] == [["outlaw", "法外之徒"]]
+
+
+def test_tampered_index_falls_back_to_csv(tmp_path, monkeypatch):
+    p = tmp_path / "terms.csv"
+    write_csv(p, [["term", "definition"], ["outlaw", "法外之徒"]])
+    load_glossary_matcher(str(p))
+    index_path = glossary_index_path(str(p))
+    with open(index_path, encoding="utf-8") as f:
+        data = json.load(f)
+    data["terms"] = [["outlaw", "篡改"]]
+    with open(index_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+
+    monkeypatch.setattr(csv_process_tool, "_matcher_cache", type(csv_process_tool._matcher_cache)())
+    assert load_glossary_matcher(str(p)).terms_dict == {"outlaw": "法外之徒"}
+
+
+def test_validation_not_skipped_when_index_exists(tmp_path):
+    p = tmp_path / "terms.csv"
+    write_csv(p, [["term", "definition"], ["outlaw", ""]])
+    # 加载路径会为任何 CSV 写索引，索引存在不代表术语表合法
+    load_glossary_matcher(str(p))
+    assert os.path.exists(glossary_index_path(str(p)))
+    assert validate_csv_file(str(p)) == (False, str(p))
+
+
+def test_unpickled_state_missing_lazy_fields_gets_defaults():
+    matcher = GlossaryMatcher({"outlaw": "法外之徒"})
+    state = matcher.__getstate__()
+    for field in ("_regex", "_fuzzy_index", "_automaton"):
+        state.pop(field)
+    restored = GlossaryMatcher.__new__(GlossaryMatcher)
+    restored.__setstate__(state)
+    assert restored.match("Outlaws everywhere.") == {"outlaw": "法外之徒"}
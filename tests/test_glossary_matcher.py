@@ -0,0 +1,57 @@
+import pytest
+
+from modules.csv_process_tool import GlossaryMatcher, get_glossary_matcher, find_matching_terms, glossary_fingerprint
+
+
+@pytest.fixture(autouse=True)
+def set_aho_engine(monkeypatch):
+    monkeypatch.setenv('CSV_MATCH_ENGINE', 'aho')
+    monkeypatch.setenv('CSV_MATCH_FUZZY', '0')
+
+
+def test_matcher_builds_automaton_once():
+    matcher = GlossaryMatcher({"priority": "优先级", "board game": "桌游"})
+    assert matcher.match("We discussed the priority of the board game.") == {"priority": "优先级", "board game": "桌游"}
+    automaton = matcher._automaton
+    assert automaton is not None
+    assert matcher.match("Another priority.") == {"priority": "优先级"}
+    assert matcher._automaton is automaton
+
+
+def test_get_glossary_matcher_shared_by_fingerprint():
+    a = get_glossary_matcher({"outlaw": "法外之徒"})
+    b = get_glossary_matcher({"outlaw": "法外之徒"})
+    c = get_glossary_matcher({"outlaw": "亡命徒"})
+    assert a is b
+    assert a is not c
+    assert get_glossary_matcher(a) is a
+
+
+def test_fingerprint_is_order_sensitive():
+    assert glossary_fingerprint({"a": "1", "b": "2"}) != glossary_fingerprint({"b": "2", "a": "1"})
+
+
+def test_find_matching_terms_accepts_matcher():
+    matcher = GlossaryMatcher({"the Outlaw": "法外之徒"})
+    assert find_matching_terms("A cell of Outlaws gathered.", matcher) == {"the Outlaw": "法外之徒"}
+
+
+def test_empty_glossary_matches_nothing():
+    assert GlossaryMatcher({}).match("Nothing to see here.") == {}
+
+
+def test_regex_engine_matches_automaton(monkeypatch):
+    terms = {"board": "板", "board game": "桌游", "game": "游戏", "the Outlaw": "法外之徒",
+             "party": "派对", "C++": "C++", "priority_queue": "优先队列"}
+    matcher = GlossaryMatcher(terms)
+    texts = [
+        "The board games and the parties of Outlaws.",
+        "A cardboard gamer wrote C++ code with a priority_queue.",
+        "board game",
+    ]
+    aho = [matcher.match(t) for t in texts]
+    monkeypatch.setenv('CSV_MATCH_ENGINE', 'regex')
+    assert [matcher.match(t) for t in texts] == aho
+    assert aho[0] == {"board": "板", "board game": "桌游", "game": "游戏", "the Outlaw": "法外之徒", "party": "派对"}
+    pattern = matcher._get_regex()
+    assert matcher._get_regex() is pattern
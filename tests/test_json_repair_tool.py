@@ -0,0 +1,64 @@
+import asyncio
+from unittest.mock import MagicMock
+
+import pytest
+
+from modules.api_tool import LLMService, repair_translation_response
+from modules.json_repair_tool import repair_json_object
+from modules.translation_core import TranslationCore
+
+TERM = '{"term": "Arasaka", "translation": "荒坂", "reason": "音译"}'
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('```json\n{"translation": "你好", "new_terms": [],}\n```', "你好"),
+    ('以下是结果：{"translation": "他说"快走"，然后离开", "new_terms": []}', '他说"快走"，然后离开'),
+    ('{"translation": "第一行\n第二行", "new_terms": []}', "第一行\n第二行"),
+    ('{"translation": "路径 C:\\query", "new_terms": []}', "路径 C:\\query"),
+    ("{'translation': '单引号', 'new_terms': []}", "单引号"),
+])
+def test_common_failures_repaired_locally(text, expected):
+    assert repair_json_object(text)["translation"] == expected
+
+
+def test_truncated_new_terms_keep_complete_items():
+    text = '{"translation": "译文", "new_terms": [' + TERM + ', {"term": "Militech", "transl'
+    repaired = repair_translation_response(text)
+    assert repaired["translation"] == "译文"
+    assert [t["term"] for t in repaired["new_terms"]] == ["Arasaka"]
+    assert repaired["notes"] == "- 荒坂 (原文: Arasaka)：音译"
+    # new_terms 整段缺失时视为空
+    assert repair_translation_response('{"translation": "译文", "new_te')["new_terms"] == []
+
+
+@pytest.mark.parametrize("text", ['{"translation": "被截断的译', "no json at all", '{"notes": "no translation"}'])
+def test_unrepairable_returns_none(text):
+    assert repair_translation_response(text) is None
+
+
+def _service(first_response):
+    service = MagicMock(spec=LLMService)
+    service.create_prompt.return_value = "prompt"
+    service.call_ai_model_api_async.return_value = (first_response, 100)
+    service.repair_json_async.return_value = ({"translation": "远程修复", "notes": "", "new_terms": []}, 40)
+    return service
+
+
+def test_local_repair_skips_remote_call():
+    broken = {"origin_text": '{"translation": "本地修复", "new_terms": [],}', "error": "Invalid JSON format"}
+    service = _service(broken)
+    core = TranslationCore(service)
+    result = asyncio.run(core.execute_translation_step({"content": "Text"}, {}, []))
+    assert result.content == "本地修复"
+    assert result.repair_tokens == 0 and result.repair_tokens_saved > 0
+    service.repair_json_async.assert_not_called()
+    assert core.repair_stats["local"] == 1 and core.repair_stats["remote"] == 0
+
+
+def test_remote_repair_used_when_local_fails():
+    broken = {"origin_text": '{"translation": "被截断', "error": "Invalid JSON format"}
+    service = _service(broken)
+    core = TranslationCore(service)
+    result = asyncio.run(core.execute_translation_step({"content": "Text"}, {}, []))
+    assert result.content == "远程修复" and result.repair_tokens == 40
+    assert core.repair_stats == {"local": 0, "remote": 1, "failed": 0, "remote_tokens": 40, "tokens_saved": 0}
@@ -0,0 +1,141 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from modules.api_tool import LLMService
+from modules.json_stream_tool import IncrementalTranslationParser, StreamBreakageError
+from modules.translation_core import RepairPolicy, TranslationCore
+
+VALID = json.dumps(
+    {"translation": "第一行\n“引号” \"quoted\" 😀", "new_terms": [{"term": "a", "translation": "甲", "reason": "r"}]},
+    ensure_ascii=True,
+)
+
+
+@pytest.mark.parametrize("size", [1, 2, 7, len(VALID)])
+def test_parser_streams_translation_across_chunk_boundaries(size):
+    parser = IncrementalTranslationParser()
+    out = "".join(parser.feed(VALID[i:i + size]) for i in range(0, len(VALID), size))
+    assert out == "第一行\n“引号” \"quoted\" 😀"
+    assert parser.done and parser.text == VALID
+
+
+def test_parser_ignores_nested_translation_keys_and_fences():
+    parser = IncrementalTranslationParser()
+    text = '```json\n{"new_terms": [{"translation": "甲"}], "translation": "乙"}\n```'
+    assert parser.feed(text) == "乙"
+    assert parser.done
+
+
+@pytest.mark.parametrize("bad", [
+    "Sure, here is the JSON: {",
+    '{"translation": "x" "new_terms": []}',
+    '{"translation": }',
+    '{"new_terms": [1}',
+    '{"translation" "x"}',
+    '{"translation": "\\q"}',
+])
+def test_parser_detects_breakage_early(bad):
+    with pytest.raises(StreamBreakageError):
+        IncrementalTranslationParser().feed(bad)
+
+
+class FakeStream:
+    def __init__(self, chunks, usage=None):
+        self.chunks = chunks
+        self.usage = usage
+        self.sent = 0
+        self.closed = False
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for chunk in self.chunks:
+            self.sent += 1
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=chunk))], usage=None)
+        yield SimpleNamespace(choices=[], usage=self.usage)
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeStreamingCompletions:
+    def __init__(self, streams):
+        self.streams = list(streams)
+        self.calls = []
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        return self.streams.pop(0)
+
+
+@pytest.fixture
+def deepseek(monkeypatch):
+    monkeypatch.setenv('DEEPSEEK_API_KEY', 'test-key')
+    monkeypatch.setenv('DEEPSEEK_BASE_URL', 'http://localhost:1/v1')
+    monkeypatch.setenv('STREAM_OUTPUT', 'True')
+    return LLMService(provider="deepseek")
+
+
+def _chunks(text, size=5):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def test_translation_core_streams_partial_translation(deepseek, monkeypatch):
+    stream = FakeStream(_chunks(VALID), usage=SimpleNamespace(total_tokens=77))
+    completions = FakeStreamingCompletions([stream])
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    monkeypatch.setattr(deepseek.Linkedprovider, '_create_async_client', lambda: client)
+    partials = []
+
+    result = asyncio.run(TranslationCore(deepseek).execute_translation_step(
+        {"content": "Hello"}, {}, {}, on_partial=partials.append))
+
+    assert result.success and result.tokens == 77
+    assert result.content == partials[-1] == "第一行\n“引号” \"quoted\" 😀"
+    assert len(partials) > 2 and partials[0] == ""
+    assert completions.calls[0]["stream"] is True
+    assert stream.closed
+
+
+@pytest.mark.parametrize("broken_text", [
+    '{"translation": "他说"你好"了", "new_terms": []}',
+    '{"translation": "他说\\"你好\\"了", "new_terms": [],}',
+])
+def test_broken_stream_is_read_to_the_end_and_repaired_locally(deepseek, monkeypatch, broken_text):
+    broken = FakeStream(_chunks(broken_text), usage=SimpleNamespace(total_tokens=40))
+    completions = FakeStreamingCompletions([broken])
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    monkeypatch.setattr(deepseek.Linkedprovider, '_create_async_client', lambda: client)
+    partials = []
+
+    result = asyncio.run(TranslationCore(deepseek, translation_cache=None).execute_translation_step(
+        {"content": "Hello"}, {}, {}, on_partial=partials.append))
+
+    assert result.success and result.content == '他说"你好"了'
+    assert broken.sent == len(_chunks(broken_text)) and len(completions.calls) == 1
+    assert result.tokens == 40 and "llm_repair" not in result.usage
+    # 结构损坏后不再推送半截译文
+    assert all('他说"你好"了'.startswith(p) for p in partials)
+
+
+def test_unrepairable_stream_is_retried(deepseek, monkeypatch):
+    broken = FakeStream(_chunks("抱歉，我无法完成这个翻译。" * 5), usage=SimpleNamespace(total_tokens=30))
+    good = FakeStream(_chunks(VALID), usage=SimpleNamespace(total_tokens=50))
+    completions = FakeStreamingCompletions([broken, good])
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    monkeypatch.setattr(deepseek.Linkedprovider, '_create_async_client', lambda: client)
+    monkeypatch.setattr(asyncio, 'sleep', _no_sleep)
+
+    result = asyncio.run(TranslationCore(deepseek, translation_cache=None).execute_translation_step(
+        {"content": "Hello"}, {}, {}, repair_policy=RepairPolicy.NONE))
+
+    assert result.success and result.content.startswith("第一行")
+    assert len(completions.calls) == 2 and result.tokens == 80
+
+
+async def _no_sleep(_):
+    return None
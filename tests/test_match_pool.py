@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+from modules.csv_process_tool import (
+    GlossaryMatcher, TermRegistry, get_match_pool, match_terms_async, match_terms_batch, shutdown_match_pool,
+)
+
+GLOSSARY = {"priority": "优先级", "board game": "桌游", "outlaw": "法外之徒"}
+SEGMENTS = [
+    "The priority of this board game.",
+    "Nothing relevant here.",
+    "Outlaws gathered.",
+    "Board games and priorities.",
+]
+
+
+@pytest.fixture
+def pool_enabled(monkeypatch):
+    monkeypatch.setenv('CSV_MATCH_WORKERS', '2')
+    monkeypatch.setenv('CSV_MATCH_FUZZY', '0')
+    yield
+    shutdown_match_pool()
+
+
+def test_pool_disabled_by_default(monkeypatch):
+    monkeypatch.delenv('CSV_MATCH_WORKERS', raising=False)
+    assert get_match_pool(GlossaryMatcher(GLOSSARY)) is None
+
+
+def test_pool_batch_matches_sequential(pool_enabled):
+    matcher = GlossaryMatcher(GLOSSARY)
+    assert match_terms_batch(SEGMENTS, matcher) == matcher.match_batch(SEGMENTS)
+    assert get_match_pool(matcher) is get_match_pool(matcher)
+
+
+def test_pool_async_match_with_delta(pool_enabled):
+    registry = TermRegistry(GLOSSARY)
+    registry.add_terms({"priority": "优先事项", "night": "夜晚"})
+
+    async def run():
+        return [await match_terms_async(registry, s) for s in SEGMENTS + ["A board game night."]]
+
+    assert asyncio.run(run()) == [registry.match(s) for s in SEGMENTS + ["A board game night."]]
+
+
+def test_webui_shutdown_closes_pool(pool_enabled):
+    from fastapi.testclient import TestClient
+
+    import modules.csv_process_tool as csv_process_tool
+    from app import app
+
+    with TestClient(app):
+        pool = get_match_pool(GlossaryMatcher(GLOSSARY))
+        assert pool is not None and csv_process_tool._match_pool is pool
+    assert csv_process_tool._match_pool is None
@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+from modules.csv_process_tool import GlossaryMatcher, TermRegistry, match_terms_batch
+from modules.read_tool import read_and_process_structured_paragraphs_to_json
+
+
+@pytest.fixture(autouse=True)
+def set_engine(monkeypatch):
+    monkeypatch.setenv('CSV_MATCH_FUZZY', '0')
+
+
+GLOSSARY = {"priority": "优先级", "board game": "桌游", "the Outlaw": "法外之徒"}
+
+
+@pytest.mark.parametrize("engine", ["aho", "regex"])
+def test_batch_matches_equal_per_segment(monkeypatch, engine):
+    monkeypatch.setenv('CSV_MATCH_ENGINE', engine)
+    matcher = GlossaryMatcher(GLOSSARY)
+    segments = [
+        "The priority of this board game.",
+        "Nothing relevant here.",
+        "A cell of Outlaws ends with a board",
+        "game starts the next segment; priority.",
+    ]
+    assert matcher.match_batch(segments) == [matcher.match(s) for s in segments]
+
+
+def test_match_terms_batch_empty():
+    assert match_terms_batch([], GLOSSARY) == []
+
+
+def test_registry_uses_precomputed_base_matches():
+    registry = TermRegistry(GLOSSARY)
+    # 基础层结果直接复用，不再重新匹配
+    assert registry.match("priority", base_matches={"board game": "桌游"}) == {"board game": "桌游"}
+    registry.add_terms({"priority": "优先事项"})
+    assert registry.match("priority", base_matches={"priority": "优先级"}) == {"priority": "优先事项"}
+
+
+def test_preprocess_json_stores_matched_terms(tmp_path):
+    md = tmp_path / "doc.md"
+    md.write_text("# Title\n\nThe priority is high.\n\n![](img.png)\n\nA board game night.\n", encoding="utf-8")
+    json_path = read_and_process_structured_paragraphs_to_json(
+        str(md), max_chunk_size=30, min_chunk_size=0, glossary=GLOSSARY
+    )
+    with open(json_path, encoding="utf-8") as f:
+        data = json.load(f)
+    info = data["text_info"]
+    assert all("matched_terms" in item for item in info)
+    merged = {}
+    for item in info:
+        merged.update(item["matched_terms"])
+    assert merged == {"priority": "优先级", "board game": "桌游"}
+    assert data["glossary_coverage"]["distinct_terms"] == 2
+    assert data["glossary_coverage"]["glossary_terms"] == 3
@@ -0,0 +1,167 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import modules.api_tool as api_tool
+from modules.api_tool import GeminiProvider, LLMService, record_openai_usage
+
+SYSTEM = "<SYSTEM> " * 40
+
+
+@pytest.fixture(autouse=True)
+def env(monkeypatch):
+    monkeypatch.setattr(api_tool, "_provider_registry", {})
+    monkeypatch.setenv("BASE_PROMPT", "<BASE>")
+    monkeypatch.setenv("SYSTEM_PROMPT", SYSTEM)
+    monkeypatch.setenv("Requests_Per_Minute", "0")
+    monkeypatch.setenv("Tokens_Per_Minute", "0")
+    monkeypatch.setenv("MOCK_LATENCY", "0")
+    monkeypatch.delenv("PROMPT_LAYOUT", raising=False)
+
+
+def test_invariant_instructions_come_first(monkeypatch):
+    service = LLMService(provider="mock")
+    first = service.create_prompt("Alpha paragraph.", {"Arasaka": "荒坂"})
+    second = service.create_prompt("Beta paragraph.", {"Night City": "夜之城"})
+    assert first.startswith("<BASE>\n术语表：Arasaka -> 荒坂\n") and first.endswith("原文段落：\nAlpha paragraph.")
+    assert second.startswith("<BASE>\n") and "<BASE>" not in second[len("<BASE>"):]
+    batch = service.create_batch_prompt([(1, "A"), (2, "B")], {})
+    assert batch.startswith("<BASE>\n") and batch.endswith('<segment id="2">\nB\n</segment>')
+
+    monkeypatch.setenv("PROMPT_LAYOUT", "legacy")
+    assert LLMService(provider="mock").create_prompt("Alpha paragraph.", {}) == "\n原文段落：\nAlpha paragraph.<BASE>"
+
+
+class _UsageProvider:
+    """按顺序返回不同平台风格的 usage。"""
+
+    def __init__(self, usages):
+        self.usages = list(usages)
+
+    def generate_completion(self, prompt, system_prompt):
+        record_openai_usage(self.usages.pop(0))
+        return '{"translation": "ok", "new_terms": []}', 100
+
+
+def test_cached_tokens_recorded_across_provider_usage_formats(monkeypatch):
+    usages = [
+        # OpenAI / 硅基流动
+        SimpleNamespace(prompt_tokens=100, completion_tokens=10, prompt_tokens_details=SimpleNamespace(cached_tokens=64)),
+        # DeepSeek
+        {"prompt_tokens": 100, "completion_tokens": 10, "prompt_cache_hit_tokens": 0, "prompt_cache_miss_tokens": 100},
+        # Kimi
+        {"prompt_tokens": 100, "completion_tokens": 10, "cached_tokens": 36},
+        # 不报告缓存字段的平台
+        {"prompt_tokens": 100, "completion_tokens": 10},
+    ]
+    monkeypatch.setenv("PROMPT_CACHE_PRICE_RATIO", "0.5")
+    service = LLMService(provider="mock")
+    service.Linkedprovider = _UsageProvider(usages)
+    for _ in range(4):
+        service.call_ai_model_api("prompt")
+
+    report = service.prompt_cache.report()
+    assert report["requests"] == 4 and report["unreported"] == 1
+    assert report["prompt_tokens"] == 300 and report["cached_tokens"] == 100
+    assert report["hit_requests"] == 2 and report["hit_rate"] == pytest.approx(0.3333, abs=1e-4)
+    assert report["billable_tokens_saved"] == 50
+
+
+def _hit_rate(monkeypatch, layout):
+    monkeypatch.setenv("PROMPT_LAYOUT", layout)
+    monkeypatch.setenv("BASE_PROMPT", "Follow the template strictly and return JSON only. " * 20)
+    monkeypatch.setattr(api_tool, "_provider_registry", {})
+    service = LLMService(provider="mock")
+
+    async def run():
+        for i in range(10):
+            terms = {f"Term{i}": f"术语{i}"}
+            await service.call_ai_model_api_async(service.create_prompt(f"Paragraph {i} body.", terms))
+
+    asyncio.run(run())
+    return service.prompt_cache.report()["hit_rate"]
+
+
+def test_cache_friendly_layout_raises_simulated_hit_rate(monkeypatch):
+    monkeypatch.setenv("MOCK_CACHE_BLOCK", "64")
+    legacy = _hit_rate(monkeypatch, "legacy")
+    cache = _hit_rate(monkeypatch, "cache")
+    assert cache > 0.6 and cache > legacy + 0.2
+
+
+class _FakeGeminiClient:
+    def __init__(self, create_error=None):
+        self.created = []
+        self.configs = []
+        self.create_error = create_error
+        self.caches = SimpleNamespace(create=self._create)
+        self.models = SimpleNamespace(generate_content=self._generate)
+
+    def _create(self, model, config):
+        if self.create_error:
+            raise self.create_error
+        self.created.append(config)
+        return SimpleNamespace(name=f"cachedContents/{len(self.created)}")
+
+    def _generate(self, model, contents, config):
+        self.configs.append(config)
+        usage = SimpleNamespace(prompt_token_count=500, candidates_token_count=20, total_token_count=520,
+                                cached_content_token_count=400 if config.cached_content else None)
+        return SimpleNamespace(text='{"translation": "ok", "new_terms": []}', usage_metadata=usage)
+
+
+def test_gemini_context_cache_handle_reused_and_falls_back(monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    monkeypatch.setenv("GEMINI_CONTEXT_CACHE", "true")
+    provider = GeminiProvider()
+    provider.client = _FakeGeminiClient()
+    monkeypatch.setitem(api_tool._provider_registry, ("gemini",) + GeminiProvider.settings(), provider)
+    service = LLMService(provider="gemini")
+
+    service.call_ai_model_api("first")
+    service.call_ai_model_api("second")
+    assert len(provider.client.created) == 1 and provider.client.created[0].system_instruction == SYSTEM
+    assert all(c.cached_content == "cachedContents/1" and c.system_instruction is None for c in provider.client.configs)
+    assert service.prompt_cache.report()["cached_tokens"] == 800
+
+    # 创建失败（如提示词过短）时退回普通请求，且 TTL 内不再重复尝试
+    provider._context_caches.clear()
+    provider.client = _FakeGeminiClient(create_error=RuntimeError("too few tokens"))
+    service.call_ai_model_api("third")
+    service.call_ai_model_api("fourth")
+    assert [c.system_instruction for c in provider.client.configs] == [SYSTEM, SYSTEM]
+    assert all(c.cached_content is None for c in provider.client.configs)
+
+
+def test_gpt_request_carries_prompt_cache_key_through_sdk(monkeypatch):
+    import json
+
+    import httpx
+    from openai import OpenAI
+
+    from modules.api_tool import GPTProvider, prompt_cache_key
+
+    sent = []
+
+    def handler(request):
+        sent.append(json.loads(request.content))
+        return httpx.Response(200, json={
+            "id": "c1", "object": "chat.completion", "created": 0, "model": "gpt",
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": '{"translation": "ok", "new_terms": []}'}}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+        })
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    provider = GPTProvider()
+    # 真实 SDK 构造请求，只替换传输层
+    provider.client = OpenAI(api_key="test-key", base_url="https://api.openai.test/v1",
+                             http_client=httpx.Client(transport=httpx.MockTransport(handler)))
+
+    assert provider.generate_completion("prompt", SYSTEM) == ('{"translation": "ok", "new_terms": []}', 15)
+    assert sent[0]["prompt_cache_key"] == prompt_cache_key(SYSTEM)
+    # openai==1.82.0 的 create() 没有 prompt_cache_key 参数，不能作为顶层关键字传入
+    assert "prompt_cache_key" not in provider._request("prompt", SYSTEM)
+    body = provider.batch_request_body("prompt", SYSTEM)
+    assert body["prompt_cache_key"] == prompt_cache_key(SYSTEM) and "extra_body" not in body
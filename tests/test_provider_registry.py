@@ -0,0 +1,44 @@
+import pytest
+
+from modules.api_tool import LLMService, get_provider, KimiProvider
+
+
+@pytest.fixture(autouse=True)
+def keys(monkeypatch):
+    monkeypatch.setenv('KIMI_API_KEY', 'key-a')
+    monkeypatch.setenv('DEEPSEEK_API_KEY', 'key-a')
+    monkeypatch.setenv('DEEPSEEK_BASE_URL', 'http://localhost:1/v1')
+
+
+def test_services_share_provider_clients():
+    a = LLMService(provider="kimi")
+    b = LLMService(provider="kimi")
+    assert a.Linkedprovider is b.Linkedprovider
+    assert isinstance(a.Linkedprovider, KimiProvider)
+    b.provider = "deepseek"
+    assert b.Linkedprovider is get_provider("deepseek")
+    b.provider = "kimi"
+    assert b.Linkedprovider is a.Linkedprovider
+
+
+def test_registry_key_includes_credentials_and_model(monkeypatch):
+    first = get_provider("kimi")
+    monkeypatch.setenv('KIMI_API_KEY', 'key-b')
+    second = get_provider("kimi")
+    assert second is not first
+    monkeypatch.setenv('KIMI_MODEL', 'other-model')
+    third = get_provider("kimi")
+    assert third is not second and third.model == 'other-model'
+
+
+def test_client_uses_tuned_pool(monkeypatch):
+    monkeypatch.setenv('HTTP_MAX_CONNECTIONS', '7')
+    monkeypatch.setenv('KIMI_API_KEY', 'key-pool')
+    provider = get_provider("kimi")
+    pool = provider.client._client._transport._pool
+    assert pool._max_connections == 7
+
+
+def test_unknown_provider_rejected():
+    with pytest.raises(ValueError):
+        get_provider("nope")
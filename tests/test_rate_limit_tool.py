@@ -0,0 +1,101 @@
+import asyncio
+import time
+
+import pytest
+
+from modules.rate_limit_tool import RateLimiter, get_rate_limiter
+
+
+def test_disabled_limiter_never_waits():
+    limiter = RateLimiter(0, 0)
+    assert not limiter.enabled
+    start = time.monotonic()
+    for _ in range(100):
+        limiter.acquire_sync(10_000)
+    assert time.monotonic() - start < 0.1
+
+
+def test_rpm_bucket_spaces_requests_precisely():
+    # 600 RPM：10 次/秒，桶容量 600，前 600 次不等待；清空后按 0.1s 间隔放行
+    limiter = RateLimiter(rpm=600)
+    limiter._requests.level = 0
+
+    async def run():
+        start = time.monotonic()
+        await asyncio.gather(*(limiter.acquire() for _ in range(3)))
+        return time.monotonic() - start
+
+    elapsed = asyncio.run(run())
+    assert 0.25 <= elapsed < 0.5
+
+
+def test_tpm_reservation_reconciled_with_usage():
+    limiter = RateLimiter(tpm=6000, burst=1)
+    reservation = limiter.acquire_sync(1000)
+    assert limiter._tokens.level == pytest.approx(5000, abs=5)
+    reservation.settle(200)
+    assert limiter._tokens.level == pytest.approx(5800, abs=5)
+    limiter.acquire_sync(100).settle(1100)
+    assert limiter._tokens.level == pytest.approx(4700, abs=5)
+
+
+def test_oversized_request_capped_to_bucket():
+    limiter = RateLimiter(tpm=600, burst=1)
+    reservation = limiter.acquire_sync(10_000)
+    assert reservation.tokens == 600
+    reservation.settle(600)
+    assert limiter._tokens.level == pytest.approx(0, abs=5)
+
+
+def test_first_minute_limited_to_burst():
+    # 600 RPM、突发 10%：启动时只立即放行 60 次，之后按 0.1s 间隔放行，不会在第一分钟放出两倍配额
+    limiter = RateLimiter(rpm=600, burst=0.1)
+    assert limiter._requests.capacity == 60
+
+    async def run():
+        start = time.monotonic()
+        await asyncio.gather(*(limiter.acquire() for _ in range(62)))
+        return time.monotonic() - start
+
+    assert 0.15 <= asyncio.run(run()) < 0.4
+    # 容量至少为 1，低配额时首个请求不必等待
+    assert RateLimiter(rpm=5)._requests.capacity == 1
+
+
+def test_cancelled_waiter_refunds_reservation():
+    limiter = RateLimiter(rpm=60)
+    limiter._requests.level = 0
+
+    async def run():
+        task = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert limiter._requests.level == pytest.approx(0, abs=0.1)
+
+
+def test_limiters_shared_per_provider():
+    assert get_rate_limiter("kimi", 10, 100) is get_rate_limiter("kimi", 10, 100)
+    assert get_rate_limiter("kimi", 10, 100) is not get_rate_limiter("gpt", 10, 100)
+
+
+def test_llm_service_reconciles_actual_usage(monkeypatch):
+    from modules.api_tool import LLMService
+
+    class FakeProvider:
+        def generate_completion(self, prompt, system_prompt):
+            return '{"translation": "译文", "new_terms": []}', 321
+
+    monkeypatch.setenv('KIMI_API_KEY', 'test-key')
+    monkeypatch.setenv('Requests_Per_Minute', '0')
+    monkeypatch.setenv('Tokens_Per_Minute', '6000')
+    service = LLMService(provider="kimi")
+    service.Linkedprovider = FakeProvider()
+    limiter = service.rate_limiter
+    before = limiter._tokens.level
+    asyncio.run(service.call_ai_model_api_async("Hello world"))
+    service.repair_json("{bad json")
+    assert before - limiter._tokens.level == pytest.approx(642, abs=20)
@@ -0,0 +1,118 @@
+import asyncio
+import json
+
+import pytest
+
+import modules.api_tool as api_tool
+from modules.api_tool import LLMProvider, LLMService, PROVIDERS, RouterProvider
+from modules.translation_core import TranslationCore
+
+VALID = json.dumps({"translation": "译文", "new_terms": []}, ensure_ascii=False)
+
+
+class FakeProvider(LLMProvider):
+    fail = False
+    calls = 0
+
+    def generate_completion(self, prompt, system_prompt):
+        type(self).calls += 1
+        if type(self).fail:
+            raise RuntimeError(f"{type(self).__name__} down")
+        return VALID, 10
+
+
+class FakeA(FakeProvider):
+    pass
+
+
+class FakeB(FakeProvider):
+    pass
+
+
+@pytest.fixture(autouse=True)
+def members(monkeypatch):
+    monkeypatch.setattr(api_tool, "_provider_registry", {})
+    monkeypatch.setitem(PROVIDERS, "fake_a", FakeA)
+    monkeypatch.setitem(PROVIDERS, "fake_b", FakeB)
+    monkeypatch.setenv("ROUTER_PROVIDERS", "fake_a:2,fake_b")
+    monkeypatch.setenv("Requests_Per_Minute", "0")
+    monkeypatch.setenv("Tokens_Per_Minute", "0")
+    for cls in (FakeA, FakeB):
+        monkeypatch.setattr(cls, "fail", False)
+        monkeypatch.setattr(cls, "calls", 0)
+
+
+def test_router_parses_members_and_rejects_unknown(monkeypatch):
+    router = RouterProvider()
+    assert router.members == [("fake_a", 2.0), ("fake_b", 1.0)]
+    assert router._ranked() == ["fake_a", "fake_b"]
+    monkeypatch.setenv("ROUTER_PROVIDERS", "fake_a,nope")
+    with pytest.raises(ValueError):
+        RouterProvider()
+
+
+def test_router_fails_over_and_cools_down_failed_member():
+    FakeA.fail = True
+    router = RouterProvider()
+    content, tokens = asyncio.run(router.generate_completion_async("p", "s"))
+    assert content == VALID and tokens == 10
+    assert (FakeA.calls, FakeB.calls) == (1, 1)
+    # 出错的平台进入冷却，下一次直接选健康平台
+    assert router._ranked() == ["fake_b", "fake_a"]
+    router.generate_completion("p", "s")
+    assert (FakeA.calls, FakeB.calls) == (1, 2)
+    report = router.report()
+    assert report["fake_a"]["errors"] == 1 and report["fake_b"]["requests"] == 2
+
+
+def test_router_raises_when_every_member_fails():
+    FakeA.fail = FakeB.fail = True
+    with pytest.raises(RuntimeError):
+        RouterProvider().generate_completion("p", "s")
+
+
+def test_router_prefers_member_with_rate_budget(monkeypatch):
+    monkeypatch.setenv("FAKE_A_RPM", "1")
+    router = RouterProvider()
+    router.generate_completion("p", "s")
+    # fake_a 的 1 RPM 已用完，余量降到 0，即使权重更高也让给 fake_b
+    assert router._ranked()[0] == "fake_b"
+
+
+def test_translation_result_records_routed_provider(monkeypatch):
+    FakeA.fail = True
+    service = LLMService(provider="router")
+    assert not service.rate_limiter.enabled
+    result = asyncio.run(TranslationCore(service).execute_translation_step({"content": "Hello"}, {}, {}))
+    assert result.success and result.provider == "fake_b"
+
+
+class Hanging(FakeProvider):
+    async def generate_completion_async(self, prompt, system_prompt):
+        await asyncio.Event().wait()
+
+
+def test_cancelled_and_failed_members_release_in_flight_and_reservation(monkeypatch):
+    monkeypatch.setitem(PROVIDERS, "fake_a", Hanging)
+    monkeypatch.setenv("FAKE_A_TPM", "100000")
+    router = RouterProvider()
+    limiter = api_tool.provider_rate_limiter("fake_a")
+
+    async def cancel_routed_call():
+        task = asyncio.create_task(router.generate_completion_async("p" * 400, "s"))
+        await asyncio.sleep(0.05)
+        assert router._stats["fake_a"].in_flight == 1 and limiter.headroom() < 1.0
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_routed_call())
+    st = router._stats["fake_a"]
+    # 被取消不算失败，也不计入延迟；预约的 token 退还
+    assert st.in_flight == 0 and st.errors == 0 and st.latency is None
+    assert limiter.headroom() == pytest.approx(1.0, abs=1e-3)
+
+    monkeypatch.setattr(Hanging, "fail", True)
+    router.generate_completion("p" * 400, "s")
+    assert st.in_flight == 0 and st.errors == 1
+    assert limiter.headroom() == pytest.approx(1.0, abs=1e-3)
@@ -0,0 +1,141 @@
+import asyncio
+import json
+
+import openai
+import pytest
+
+import modules.api_tool as api_tool
+from modules.api_tool import LLMService, repair_translation_response
+from modules.concurrency_tool import THROTTLED, SERVER_ERROR, classify_error
+from modules.simulation_tool import (
+    MockOpenAIServer,
+    SimulatedAPIError,
+    SimulationProfile,
+    TranslationSimulator,
+)
+
+PROMPTS = [f"<BASE>\n\n原文段落：\nParagraph number {i}." for i in range(200)]
+
+
+@pytest.fixture(autouse=True)
+def env(monkeypatch):
+    monkeypatch.setattr(api_tool, "_provider_registry", {})
+    monkeypatch.setenv("BASE_PROMPT", "<BASE>")
+    monkeypatch.setenv("SYSTEM_PROMPT", "<SYSTEM>")
+    monkeypatch.setenv("Requests_Per_Minute", "0")
+    monkeypatch.setenv("Tokens_Per_Minute", "0")
+    monkeypatch.setenv("MOCK_LATENCY", "0")
+
+
+def _outcomes(simulator):
+    outcomes = []
+    for prompt in PROMPTS:
+        try:
+            reply = simulator.plan("<SYSTEM>", prompt)
+            outcomes.append((reply.fault, reply.content, round(reply.latency, 6)))
+        except SimulatedAPIError as e:
+            outcomes.append((e.status_code, None, None))
+    return outcomes
+
+
+def test_seeded_runs_are_reproducible_and_rates_respected():
+    profile = SimulationProfile(seed=7, latency=1.0, rate_429=0.1, rate_5xx=0.1, rate_malformed=0.2, rate_truncated=0.1)
+    first = _outcomes(TranslationSimulator(profile))
+    assert first == _outcomes(TranslationSimulator(profile))
+    assert first != _outcomes(TranslationSimulator(SimulationProfile(**dict(vars(profile), seed=8))))
+    faults = [o[0] for o in first]
+    assert 5 <= faults.count(429) <= 40 and 5 <= sum(f in (500, 502, 503) for f in faults) <= 40
+    assert 0.1 < faults.count("malformed") / len(faults) < 0.3
+
+
+def test_faults_look_like_real_model_output():
+    simulator = TranslationSimulator(SimulationProfile(seed=1, latency=0, rate_malformed=1.0))
+    for prompt in PROMPTS[:20]:
+        reply = simulator.plan("", prompt)
+        # 注入的 JSON 毛病都能被本地修复
+        assert repair_translation_response(reply.content)["translation"] == prompt.split("原文段落：\n")[1]
+    truncated = TranslationSimulator(SimulationProfile(latency=0, rate_truncated=1.0)).plan("", PROMPTS[0])
+    assert truncated.finish_reason == "length" and not truncated.content.endswith("}")
+    assert truncated.prompt_tokens > 0 and truncated.completion_tokens > 0
+
+
+def test_throughput_caps_raise_classifiable_429():
+    simulator = TranslationSimulator(SimulationProfile(latency=0, rpm=2))
+    simulator.complete("", PROMPTS[0])
+    simulator.complete("", PROMPTS[1])
+    with pytest.raises(SimulatedAPIError) as excinfo:
+        simulator.complete("", PROMPTS[2])
+    kind, retry_after = classify_error(excinfo.value)
+    assert kind == THROTTLED and 0 < retry_after <= 60
+    assert classify_error(SimulatedAPIError(503, "down"))[0] == SERVER_ERROR
+
+
+def test_latency_distribution_and_output_throughput():
+    lognormal = TranslationSimulator(SimulationProfile(seed=3, latency=2.0, latency_sigma=0.5))
+    mean = sum(lognormal.plan("", p).latency for p in PROMPTS) / len(PROMPTS)
+    assert 1.6 < mean < 2.4
+    slow = TranslationSimulator(SimulationProfile(latency_dist="fixed", latency=0.5, output_tps=10)).plan("", PROMPTS[0])
+    assert slow.latency == pytest.approx(0.5 + slow.completion_tokens / 10)
+
+
+def test_mock_provider_runs_the_pipeline_with_faults(monkeypatch, tmp_path):
+    from main import run_translation_loop
+    from modules.read_tool import read_and_process_structured_paragraphs_to_json
+    from modules.translation_core import TranslationCore
+
+    monkeypatch.setenv("MOCK_SEED", "11")
+    monkeypatch.setenv("MOCK_RATE_5XX", "0.15")
+    monkeypatch.setenv("MOCK_RATE_MALFORMED", "0.3")
+    monkeypatch.setenv("MOCK_RATE_TRUNCATED", "0.05")
+    monkeypatch.setenv("MOCK_RETRY_AFTER", "0")
+    monkeypatch.setattr(asyncio, "sleep", _fast_sleep)
+    md = tmp_path / "doc.md"
+    md.write_text("\n\n".join(f"# S{i}\n\nSection {i} body text." for i in range(1, 9)), encoding="utf-8")
+    json_path = read_and_process_structured_paragraphs_to_json(str(md), max_chunk_size=600, min_chunk_size=0)
+    with open(json_path, encoding="utf-8") as f:
+        paragraphs = json.load(f)["text_info"]
+    service = LLMService(provider="mock")
+    output = tmp_path / "out.md"
+
+    total = asyncio.run(run_translation_loop(paragraphs, TranslationCore(service, translation_cache=None), {}, [],
+                                             str(output), True, json_path))
+
+    with open(json_path, encoding="utf-8") as f:
+        data = json.load(f)
+    assert all(item["status"] == "completed" for item in data["text_info"])
+    text = output.read_text(encoding="utf-8")
+    assert [text.index(f"Section {i} body") for i in range(1, 9)] == sorted(text.index(f"Section {i} body") for i in range(1, 9))
+    stats = service.Linkedprovider.simulator.stats
+    assert total > 0 and stats["malformed"] > 0 and stats["requests"] >= len(data["text_info"])
+
+
+_real_sleep = asyncio.sleep
+
+
+async def _fast_sleep(delay, *args, **kwargs):
+    return await _real_sleep(0, *args, **kwargs)
+
+
+def test_openai_compatible_server_serves_chat_stream_and_errors(monkeypatch):
+    simulator = TranslationSimulator(SimulationProfile(seed=2, latency=0))
+    with MockOpenAIServer(simulator) as server:
+        monkeypatch.setenv("DEEPSEEK_BASE_URL", server.base_url)
+        monkeypatch.setenv("DEEPSEEK_API_KEY", "test-key")
+        monkeypatch.setenv("KIMI_BASE_URL", server.base_url)
+        monkeypatch.setenv("KIMI_API_KEY", "test-key")
+        deepseek = LLMService(provider="deepseek")
+
+        result, tokens = deepseek.call_ai_model_api(PROMPTS[0])
+        assert result["translation"] == "Paragraph number 0." and tokens > 0
+        partial = []
+        streamed, stream_tokens = asyncio.run(deepseek.call_ai_model_api_stream_async(PROMPTS[1], partial.append))
+        assert streamed["translation"] == "".join(partial) == "Paragraph number 1." and stream_tokens > 0
+        # Kimi 的 partial 前缀由服务端去掉、客户端补回
+        kimi_result, _ = LLMService(provider="kimi").call_ai_model_api(PROMPTS[2])
+        assert kimi_result["translation"] == "Paragraph number 2."
+
+        simulator.profile.rate_429 = 1.0
+        client = openai.OpenAI(api_key="x", base_url=server.base_url, max_retries=0)
+        with pytest.raises(openai.RateLimitError) as excinfo:
+            client.chat.completions.create(model="m", messages=[{"role": "user", "content": "hi"}])
+        assert classify_error(excinfo.value) == (THROTTLED, 1.0)
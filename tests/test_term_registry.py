@@ -0,0 +1,48 @@
+import pytest
+
+from modules.csv_process_tool import GlossaryMatcher, TermRegistry
+
+
+@pytest.fixture(autouse=True)
+def set_aho_engine(monkeypatch):
+    monkeypatch.setenv('CSV_MATCH_ENGINE', 'aho')
+    monkeypatch.setenv('CSV_MATCH_FUZZY', '0')
+
+
+def test_registry_matches_base_and_delta():
+    registry = TermRegistry({"Night City": "夜之城"})
+    registry.add_terms([{"term": "Arasaka", "translation": "荒坂"}])
+    assert registry.match("Arasaka owns Night City.") == {"Night City": "夜之城", "Arasaka": "荒坂"}
+
+
+def test_delta_has_priority_over_base():
+    registry = TermRegistry({"Night City": "夜之城", "outlaw": "法外之徒"})
+    registry.add_terms({"night city": "夜城"})
+    assert registry.get("outlaw") == "法外之徒"
+    assert "night city" in registry
+    assert registry.match("Welcome to Night City, outlaw.") == {"night city": "夜城", "outlaw": "法外之徒"}
+
+    registry.add_terms({"outlaw": "亡命徒"})
+    assert registry.get("outlaw") == "亡命徒"
+    assert registry.match("An outlaw.") == {"outlaw": "亡命徒"}
+
+
+def test_base_layer_is_shared_not_copied():
+    base = GlossaryMatcher({"priority": "优先级"})
+    registry = TermRegistry(base)
+    registry.add_terms({"backlog": "待办"})
+    assert registry.base is base
+    assert "backlog" not in base.terms_dict
+
+
+def test_delta_index_rebuilt_only_on_change():
+    registry = TermRegistry({"priority": "优先级"})
+    registry.add_terms({"backlog": "待办"})
+    registry.match("the backlog")
+    delta_matcher = registry._delta_matcher
+    assert registry.add_terms([{"term": "backlog", "translation": "待办"}]) == 0
+    registry.match("the backlog")
+    assert registry._delta_matcher is delta_matcher
+    assert registry.add_terms([{"term": "sprint", "translation": "冲刺"}]) == 1
+    assert registry.match("the sprint backlog") == {"sprint": "冲刺", "backlog": "待办"}
+    assert registry._delta_matcher is not delta_matcher
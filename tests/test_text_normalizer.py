@@ -0,0 +1,49 @@
+import os
+
+import pytest
+
+from modules.csv_process_tool import TextNormalizer, get_text_normalizer, preprocess_text, check_normalizer_parity
+
+
+def test_tokenize_keeps_words_and_splits_clitics():
+    normalizer = TextNormalizer()
+    assert normalizer.tokenize("The board-game's rules don't change, priority_is 3.14.") == [
+        "The", "board-game", "'s", "rules", "do", "n't", "change", ",", "priority_is", "3.14", ".",
+    ]
+
+
+def test_normalize_lowercases_and_skips_capitalized_tokens():
+    normalizer = TextNormalizer()
+    out = normalizer.normalize("Outlaws gathered in the Hall.")
+    assert out.split()[0] == "outlaws"
+    assert out.endswith("hall .")
+
+
+def test_lemma_cache_reused(monkeypatch):
+    normalizer = TextNormalizer(cache_size=4)
+    normalizer.normalize("games games games")
+    info = normalizer.cache_info()
+    assert info.misses == 1
+    assert info.hits == 2
+
+
+def test_normalizer_is_process_singleton():
+    assert get_text_normalizer() is get_text_normalizer()
+
+
+def test_preprocess_text_nltk_mode(monkeypatch):
+    monkeypatch.setenv('CSV_MATCH_NORMALIZER', 'nltk')
+    assert preprocess_text("Priority") == "priority"
+
+
+def test_parity_on_sample_corpus():
+    nltk = pytest.importorskip("nltk")
+    try:
+        nltk.data.find('tokenizers/punkt')
+    except LookupError:
+        pytest.skip("punkt not available")
+    path = os.path.join(os.path.dirname(__file__), '..', 'test_prompts', 'test_samples.md')
+    with open(path, encoding='utf-8') as f:
+        paragraphs = [p for p in f.read().split('\n\n') if p.strip()]
+    report = check_normalizer_parity(paragraphs)
+    assert report['parity'] >= 0.99, report['samples'][:3]
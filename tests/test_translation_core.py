@@ -85,3 +85,30 @@ async def test_rewrite_with_glossary(mock_llm_service):
     args = mock_llm_service.rewrite_with_glossary.call_args
     # args[0] is (translation, notes, corrections)
     assert args[0][2] == {"foo": "baz"}
+
+@pytest.mark.asyncio
+async def test_hedged_request_records_backup_provider(mock_llm_service):
+    import time
+    from modules.concurrency_tool import RequestHedger
+
+    def slow_call(prompt):
+        time.sleep(0.3)
+        return ({"translation": "SLOW", "notes": "", "new_terms": []}, 100)
+
+    mock_llm_service.call_ai_model_api.side_effect = slow_call
+    backup = MagicMock()
+    backup.provider_name = "deepseek"
+    backup.system_prompt = ""
+    backup.call_ai_model_api.return_value = ({"translation": "FAST", "notes": "", "new_terms": []}, 80)
+    hedger = RequestHedger(budget=1.0, min_samples=1)
+    hedger.record_latency(0.01)
+    hedger.requests = 1
+
+    core = TranslationCore(mock_llm_service, request_hedger=hedger, hedge_service=backup)
+    result = await core.execute_translation_step({"content": "text", "meta_data": {}}, {}, {})
+
+    assert result.content == "FAST" and result.provider == "deepseek"
+    # 对冲请求的用量计入 hedge 阶段，被取消的主请求按输入估算计入 translate
+    assert result.usage["hedge"]["total_tokens"] == 80 and result.usage["translate"]["total_tokens"] > 0
+    assert result.tokens == 80 + result.usage["translate"]["total_tokens"]
+    assert hedger.hedge_wins == 1 and hedger.extra_tokens > 0
@@ -0,0 +1,126 @@
+import asyncio
+import csv
+
+import pytest
+
+import modules.api_tool as api_tool
+from modules.api_tool import LLMService
+from modules.translation_core import RepairPolicy, TranslationCore
+from modules.usage_tool import UsageLedger, UsageRecord, split_usage, usage_totals
+
+SEGMENT = {"content": "text", "meta_data": {}}
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    real_sleep = asyncio.sleep
+
+    async def sleep(delay, *args, **kwargs):
+        return await real_sleep(0, *args, **kwargs)
+
+    monkeypatch.setattr(asyncio, "sleep", sleep)
+
+
+class _FlakyService:
+    """第一次调用抛错，第二次返回本地修复不了的无效 JSON，LLM 修复后成功。"""
+
+    provider_name = "fake"
+    structured = True
+
+    def __init__(self, fail_repair=False):
+        self.calls = 0
+        self.fail_repair = fail_repair
+
+    def create_prompt(self, text, terms):
+        return text
+
+    def call_ai_model_api(self, prompt):
+        self.calls += 1
+        if self.calls == 1:
+            raise ConnectionError("reset")
+        return {"error": "invalid json", "origin_text": "not json at all"}, 30
+
+    def repair_json(self, text):
+        if self.fail_repair:
+            return {"error": "still invalid", "origin_text": text}, 7
+        return {"translation": "T", "notes": "", "new_terms": []}, 5
+
+
+def test_tokens_broken_down_by_stage():
+    core = TranslationCore(_FlakyService(), translation_cache=None, stage_timeouts={}, segment_timeout=0)
+
+    result = asyncio.run(core.execute_translation_step(SEGMENT, {}, {}, repair_policy=RepairPolicy.RETRY_MAX_3))
+
+    assert result.success and result.content == "T"
+    assert set(result.usage) == {"retry", "local_repair", "llm_repair"}
+    assert result.usage["retry"]["total_tokens"] == 30 and result.usage["llm_repair"]["total_tokens"] == 5
+    assert result.usage["local_repair"] == dict(result.usage["local_repair"], calls=1, total_tokens=0)
+    assert result.tokens == 35 and result.repair_tokens == 5
+    assert core.run_usage == result.usage
+
+
+def test_failed_segment_still_reports_spent_tokens():
+    core = TranslationCore(_FlakyService(fail_repair=True), translation_cache=None, stage_timeouts={}, segment_timeout=0)
+
+    result = asyncio.run(core.execute_translation_step(SEGMENT, {}, {}, repair_policy=RepairPolicy.RETRY_MAX_3,
+                                                       max_api_retries=3))
+
+    assert not result.success
+    # 两次翻译重试各 30，每次修复 3 轮各 7
+    assert result.usage["retry"]["total_tokens"] == 60 and result.usage["llm_repair"]["total_tokens"] == 42
+    assert result.tokens == 102 and usage_totals(core.run_usage)["total_tokens"] == 102
+
+
+def test_llm_service_records_prompt_and_completion(monkeypatch):
+    monkeypatch.setattr(api_tool, "_provider_registry", {})
+    monkeypatch.setenv("BASE_PROMPT", "<BASE>")
+    monkeypatch.setenv("SYSTEM_PROMPT", "<SYSTEM>")
+    monkeypatch.setenv("Requests_Per_Minute", "0")
+    monkeypatch.setenv("Tokens_Per_Minute", "0")
+    monkeypatch.setenv("MOCK_LATENCY", "0")
+    core = TranslationCore(LLMService(provider="mock"), translation_cache=None, stage_timeouts={}, segment_timeout=0)
+
+    result = asyncio.run(core.execute_translation_step({"content": "Hello there.", "meta_data": {}}, {}, {}))
+
+    entry = result.usage["translate"]
+    assert result.success and entry["calls"] == 1
+    assert entry["prompt_tokens"] > 0 and entry["completion_tokens"] > 0
+    assert entry["prompt_tokens"] + entry["completion_tokens"] == entry["total_tokens"] == result.tokens
+
+
+def test_split_usage_preserves_totals():
+    ledger = UsageLedger()
+    ledger.add(UsageRecord(stage="translate", prompt_tokens=101, completion_tokens=50, total_tokens=151, latency=1.0))
+    ledger.add(UsageRecord(stage="retry", prompt_tokens=33, total_tokens=33, latency=0.5))
+    usage = ledger.by_stage()
+
+    parts = split_usage(usage, [3, 1, 7])
+
+    for stage, entry in usage.items():
+        for field in ("calls", "prompt_tokens", "completion_tokens", "total_tokens"):
+            assert sum(part[stage][field] for part in parts) == entry[field]
+        assert sum(part[stage]["latency_s"] for part in parts) == pytest.approx(entry["latency_s"])
+    assert parts[2]["translate"]["total_tokens"] > parts[0]["translate"]["total_tokens"] > parts[1]["translate"]["total_tokens"]
+
+
+def test_counting_row_has_stage_columns(tmp_path, monkeypatch):
+    from main import UserConfig, finalize_process
+
+    monkeypatch.chdir(tmp_path)
+    source, output = tmp_path / "in.md", tmp_path / "out.md"
+    source.write_text("Hello", encoding="utf-8")
+    output.write_text("你好", encoding="utf-8")
+    config = UserConfig(input_md_file=str(source), output_md_file=str(output), blank_csv_path=str(tmp_path / "terms.csv"))
+    usage = {
+        "translate": {"calls": 2, "prompt_tokens": 80, "completion_tokens": 20, "cached_tokens": 40, "total_tokens": 100, "latency_s": 1.0},
+        "local_repair": {"calls": 3, "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0, "total_tokens": 0, "latency_s": 0.0},
+        "hedge": {"calls": 1, "prompt_tokens": 10, "completion_tokens": 0, "cached_tokens": 0, "total_tokens": 10, "latency_s": 0.2},
+    }
+
+    finalize_process(config, 110, 0, None, [], usage=usage)
+
+    with open(tmp_path / "counting_table.csv", encoding="utf-8") as f:
+        row = next(csv.DictReader(f))
+    assert row["Tokens"] == "110" and row["Prompt tokens"] == "90" and row["Completion tokens"] == "20"
+    assert row["Cached prompt tokens"] == "40" and row["Translate tokens"] == "100" and row["Retry tokens"] == "0"
+    assert row["Local repairs"] == "3" and row["Hedge tokens"] == "10"